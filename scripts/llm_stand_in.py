@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Local stand-in LLM server for load testing and benchmarks
+Speaks the parts of the Ollama and OpenAI-compatible HTTP APIs the app
+uses, with configurable latency, streaming rate, model residency and error
+injection, so the full ModelManager query path runs without OpenAI or a
+real Ollama. Standard library only; deterministic for a given --seed and
+request order.
+
+Usage:
+    python scripts/llm_stand_in.py --port 11435 --ttft-ms 300 --tokens-per-second 40 --error-rate 0.02
+
+    # Point the app (or scripts/load_test.py) at it
+    export OLLAMA_HOST=http://127.0.0.1:11435
+    export OPENAI_BASE_URL=http://127.0.0.1:11435/v1 OPENAI_API_KEY=stand-in
+"""
+
+import re
+import sys
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MODELS = "llama3:latest,llama2:latest,gpt-3.5-turbo,gpt-4"
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+VOCABULARY_SIZE = 32000
+OPENAI_CACHE_MIN_TOKENS = 1024  # OpenAI caches prompt prefixes of at least this many tokens...
+OPENAI_CACHE_BLOCK_TOKENS = 128  # ...in blocks of this size
+
+def tokenize(text):
+    """Word-level stand-in for a tokenizer"""
+    return TOKEN_PATTERN.findall(text or "")
+
+def token_ids(tokens):
+    return [int(hashlib.md5(token.encode("utf-8")).hexdigest()[:8], 16) % VOCABULARY_SIZE for token in tokens]
+
+def parse_duration(value, default):
+    """Seconds from an Ollama keep_alive value: number of seconds or "30s" / "5m" / "1h"; negative = forever"""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?)(ms|s|m|h)?", str(value).strip())
+    if not match:
+        return default
+    number, unit = float(match.group(1)), match.group(2) or "s"
+    return number * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+
+def timestamp(offset_seconds=0.0):
+    return (datetime.now(timezone.utc) + timedelta(seconds=offset_seconds)).isoformat()
+
+class StandIn:
+    """
+    Behaviour shared by all request handlers
+    
+    Args:
+        options: Parsed command line options
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.models = [model for model in options.models.split(",") if model]
+        self._random = random.Random(options.seed)
+        self._lock = threading.Lock()
+        self._ollama_slots = threading.BoundedSemaphore(max(1, options.ollama_parallel))
+        self._resident = {}  # Ollama model -> (expires_at, num_ctx)
+        self._openai_prompts = {}  # OpenAI model -> recent prompt token lists, for prefix caching
+        self.stats = {"requests": 0, "errors_injected": 0, "dropped": 0, "model_loads": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+
+    def count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def draw(self):
+        """Fault and latency decisions for one request, from the seeded generator"""
+        with self._lock:
+            fault = self._random.random()
+            gauss = self._random.gauss(0, 1)
+        options = self.options
+        if fault < options.error_rate:
+            return "error", 0.0
+        if fault < options.error_rate + options.drop_rate:
+            return "drop", 0.0
+        # Log-normal time to first token around the configured median
+        return None, options.ttft_ms / 1000 * math.exp(options.ttft_sigma * gauss)
+
+    def answer_tokens(self, prompt_tokens, limit):
+        """Deterministic answer drawn from the prompt's words, so it reads like it cites the context"""
+        count = max(1, min(self.options.completion_tokens, limit or self.options.completion_tokens))
+        words = [token for token in prompt_tokens if token.isalpha()] or ["stand", "in", "answer"]
+        seed = int(hashlib.md5(" ".join(prompt_tokens).encode("utf-8")).hexdigest()[:8], 16)
+        picker = random.Random(seed)
+        return [picker.choice(words) for _ in range(count)]
+
+    def prompt_eval_seconds(self, uncached_tokens):
+        if self.options.prompt_tokens_per_second <= 0:
+            return 0.0
+        return uncached_tokens / self.options.prompt_tokens_per_second
+
+    def load_ollama_model(self, model, num_ctx, keep_alive):
+        """Seconds spent loading the model: none if it is resident with the same num_ctx"""
+        now = time.time()
+        with self._lock:
+            expires_at, loaded_ctx = self._resident.get(model, (0, None))
+            resident = (expires_at < 0 or expires_at > now) and loaded_ctx == num_ctx
+            ttl = parse_duration(keep_alive, 300)
+            self._resident[model] = (-1 if ttl < 0 else now + ttl, num_ctx)
+            if not resident:
+                self.stats["model_loads"] += 1
+        return 0.0 if resident else self.options.load_ms / 1000
+
+    def resident_models(self):
+        now = time.time()
+        with self._lock:
+            return {model: expires_at for model, (expires_at, _) in self._resident.items()
+                    if expires_at < 0 or expires_at > now}
+
+    def openai_cached_tokens(self, model, ids):
+        """Prompt tokens OpenAI would serve from its prefix cache for this request"""
+        with self._lock:
+            seen = self._openai_prompts.setdefault(model, [])
+            longest = 0
+            for previous in seen:
+                common = 0
+                for a, b in zip(previous, ids):
+                    if a != b:
+                        break
+                    common += 1
+                longest = max(longest, common)
+            seen.append(ids)
+            del seen[:-self.options.cache_entries]
+        if longest < OPENAI_CACHE_MIN_TOKENS:
+            return 0
+        return longest // OPENAI_CACHE_BLOCK_TOKENS * OPENAI_CACHE_BLOCK_TOKENS
+
+class Handler(BaseHTTPRequestHandler):
+    """HTTP endpoints of the Ollama and OpenAI APIs, backed by the shared StandIn"""
+    
+    protocol_version = "HTTP/1.1"
+    stand_in = None
+
+    def log_message(self, format, *args):
+        if self.stand_in.options.verbose:
+            super().log_message(format, *args)
+
+    # ----- plumbing -----
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def start_stream(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, data):
+        data = data.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def drop(self):
+        """Cut the connection mid-body, like a reset upstream"""
+        self.stand_in.count("dropped")
+        self.close_connection = True
+        self.wfile.flush()
+
+    def inject_error(self, ollama):
+        options = self.stand_in.options
+        self.stand_in.count("errors_injected")
+        headers = {}
+        if options.error_status in (429, 503) and options.retry_after is not None:
+            headers["Retry-After"] = str(options.retry_after)
+        message = f"stand-in injected error {options.error_status}"
+        if ollama:
+            self.send_json(options.error_status, {"error": message}, headers)
+        else:
+            self.send_json(options.error_status, {"error": {"message": message, "type": "stand_in_error",
+                                                            "code": str(options.error_status)}}, headers)
+
+    # ----- routing -----
+
+    def do_GET(self):
+        self.stand_in.count("requests")
+        routes = {
+            "/": lambda: self.send_text("Ollama is running"),
+            "/api/tags": self.ollama_tags,
+            "/api/ps": self.ollama_ps,
+            "/api/version": lambda: self.send_json(200, {"version": "0.0.0-stand-in"}),
+            "/v1/models": self.openai_models,
+            "/stand-in/stats": lambda: self.send_json(200, self.stand_in.stats)
+        }
+        routes.get(self.path.split("?")[0], self.not_found)()
+
+    def do_POST(self):
+        self.stand_in.count("requests")
+        routes = {
+            "/api/generate": self.ollama_generate,
+            "/api/pull": self.ollama_pull,
+            "/v1/chat/completions": self.openai_chat
+        }
+        routes.get(self.path.split("?")[0], self.not_found)()
+
+    def send_text(self, text):
+        data = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def not_found(self):
+        self.send_json(404, {"error": f"{self.path} is not emulated"})
+
+    # ----- Ollama -----
+
+    def ollama_tags(self):
+        self.send_json(200, {"models": [
+            {"name": model, "model": model, "modified_at": timestamp(), "size": 4_700_000_000,
+             "digest": hashlib.sha256(model.encode()).hexdigest(), "details": {"format": "gguf"}}
+            for model in self.stand_in.models if not model.startswith("gpt-")
+        ]})
+
+    def ollama_ps(self):
+        models = []
+        for model, expires_at in self.stand_in.resident_models().items():
+            expires = "0001-01-01T00:00:00Z" if expires_at < 0 else timestamp(expires_at - time.time())
+            models.append({"name": model, "model": model, "size": 5_000_000_000, "size_vram": 0,
+                           "digest": hashlib.sha256(model.encode()).hexdigest(), "expires_at": expires,
+                           "details": {"format": "gguf"}})
+        self.send_json(200, {"models": models})
+
+    def ollama_pull(self):
+        body = self.read_json()
+        model = body.get("model") or body.get("name")
+        total = 4_700_000_000
+        updates = [{"status": "pulling manifest"}]
+        updates += [{"status": f"pulling {model}", "digest": "sha256:stand-in", "total": total,
+                     "completed": total * step // 4} for step in range(1, 5)]
+        updates.append({"status": "success"})
+        if body.get("stream", True):
+            self.start_stream("application/x-ndjson")
+            for update in updates:
+                time.sleep(self.stand_in.options.load_ms / 1000 / len(updates))
+                self.write_chunk(json.dumps(update) + "\n")
+            self.end_stream()
+        else:
+            self.send_json(200, updates[-1])
+        if model and model not in self.stand_in.models:
+            self.stand_in.models.append(model)
+
+    def ollama_generate(self):
+        body = self.read_json()
+        model = body.get("model", "")
+        if model not in self.stand_in.models:
+            self.send_json(404, {"error": f"model '{model}' not found, try pulling it first"})
+            return
+        
+        options = body.get("options") or {}
+        fault, ttft = self.stand_in.draw()
+        if fault == "error":
+            self.inject_error(ollama=True)
+            return
+        
+        # One generation at a time per slot, like OLLAMA_NUM_PARALLEL
+        with self.stand_in._ollama_slots:
+            started = time.perf_counter()
+            load = self.stand_in.load_ollama_model(model, options.get("num_ctx"), body.get("keep_alive"))
+            time.sleep(load)
+            
+            context = list(body.get("context") or [])
+            prompt_tokens = tokenize(body.get("prompt", ""))
+            if not context and body.get("system"):
+                prompt_tokens = tokenize(body["system"]) + prompt_tokens
+            
+            # An empty prompt only loads the model
+            if not body.get("prompt"):
+                final = {"model": model, "created_at": timestamp(), "response": "", "done": True,
+                         "done_reason": "load", "load_duration": int(load * 1e9)}
+                self.respond_ollama(body, [], final)
+                return
+            
+            prompt_eval = self.stand_in.prompt_eval_seconds(len(prompt_tokens))
+            time.sleep(ttft + prompt_eval)
+            answer = self.stand_in.answer_tokens(prompt_tokens, options.get("num_predict"))
+            self.stand_in.count("prompt_tokens", len(prompt_tokens))
+            self.stand_in.count("completion_tokens", len(answer))
+            self.stand_in.count("cached_tokens", len(context))
+            
+            final = {
+                "model": model, "created_at": timestamp(), "response": "", "done": True, "done_reason": "stop",
+                "context": context + token_ids(prompt_tokens) + token_ids(answer),
+                "total_duration": 0, "load_duration": int(load * 1e9),
+                "prompt_eval_count": len(prompt_tokens), "prompt_eval_duration": int((ttft + prompt_eval) * 1e9),
+                "eval_count": len(answer), "eval_duration": int(len(answer) / self.stand_in.options.tokens_per_second * 1e9)
+            }
+            self.respond_ollama(body, answer, final, fault == "drop", started)
+
+    def respond_ollama(self, body, answer, final, drop=False, started=None):
+        interval = 1 / self.stand_in.options.tokens_per_second
+        if not body.get("stream", True):
+            time.sleep(interval * len(answer))
+            if started is not None:
+                final["total_duration"] = int((time.perf_counter() - started) * 1e9)
+            self.send_json(200, dict(final, response=" ".join(answer)))
+            return
+        
+        self.start_stream("application/x-ndjson")
+        for i, token in enumerate(answer):
+            self.write_chunk(json.dumps({"model": final["model"], "created_at": timestamp(),
+                                         "response": ("" if i == 0 else " ") + token, "done": False}) + "\n")
+            if drop and i == len(answer) // 2:
+                self.drop()
+                return
+            time.sleep(interval)
+        if started is not None:
+            final["total_duration"] = int((time.perf_counter() - started) * 1e9)
+        self.write_chunk(json.dumps(final) + "\n")
+        self.end_stream()
+
+    # ----- OpenAI -----
+
+    def openai_models(self):
+        self.send_json(200, {"object": "list", "data": [
+            {"id": model, "object": "model", "created": 0, "owned_by": "stand-in"} for model in self.stand_in.models
+        ]})
+
+    def openai_chat(self):
+        body = self.read_json()
+        model = body.get("model", "")
+        fault, ttft = self.stand_in.draw()
+        if fault == "error":
+            self.inject_error(ollama=False)
+            return
+        
+        prompt_tokens = []
+        for message in body.get("messages", []):
+            prompt_tokens += [f"<{message.get('role')}>"] + tokenize(message.get("content") or "")
+        cached = self.stand_in.openai_cached_tokens(model, token_ids(prompt_tokens))
+        time.sleep(ttft + self.stand_in.prompt_eval_seconds(len(prompt_tokens) - cached))
+        answer = self.stand_in.answer_tokens(prompt_tokens, body.get("max_tokens") or body.get("max_completion_tokens"))
+        self.stand_in.count("prompt_tokens", len(prompt_tokens))
+        self.stand_in.count("completion_tokens", len(answer))
+        self.stand_in.count("cached_tokens", cached)
+        
+        completion_id = f"chatcmpl-{hashlib.md5(json.dumps(body).encode()).hexdigest()[:24]}"
+        usage = {"prompt_tokens": len(prompt_tokens), "completion_tokens": len(answer),
+                 "total_tokens": len(prompt_tokens) + len(answer),
+                 "prompt_tokens_details": {"cached_tokens": cached}}
+        interval = 1 / self.stand_in.options.tokens_per_second
+        
+        if not body.get("stream"):
+            time.sleep(interval * len(answer))
+            self.send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(answer)},
+                             "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+        
+        def event(choices, **extra):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": choices, **extra}
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        
+        self.start_stream("text/event-stream")
+        event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for i, token in enumerate(answer):
+            event([{"index": 0, "delta": {"content": ("" if i == 0 else " ") + token}, "finish_reason": None}])
+            if fault == "drop" and i == len(answer) // 2:
+                self.drop()
+                return
+            time.sleep(interval)
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            event([], usage=usage)
+        self.write_chunk("data: [DONE]\n\n")
+        self.end_stream()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Stand-in Ollama and OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--models", default=DEFAULT_MODELS, help="comma-separated model names to serve")
+    parser.add_argument("--ttft-ms", type=float, default=300, help="median time to first token")
+    parser.add_argument("--ttft-sigma", type=float, default=0.5, help="log-normal spread of the TTFT (0 = fixed)")
+    parser.add_argument("--tokens-per-second", type=float, default=40, help="streaming rate of answer tokens")
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=2000,
+                        help="prompt evaluation rate for uncached tokens (0 = free)")
+    parser.add_argument("--completion-tokens", type=int, default=64, help="answer length, capped by num_predict/max_tokens")
+    parser.add_argument("--load-ms", type=float, default=2000, help="Ollama model load time when not resident")
+    parser.add_argument("--ollama-parallel", type=int, default=1, help="concurrent Ollama generations, like OLLAMA_NUM_PARALLEL")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of generations answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429/503 errors (whole seconds, per HTTP)")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of streams cut off halfway")
+    parser.add_argument("--cache-entries", type=int, default=64, help="recent prompts per model considered for prefix caching")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the latency and fault draws")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    return parser.parse_args(argv)
+
+def make_server(options):
+    """HTTP server bound to options.host/port; call serve_forever() on it"""
+    handler = type("StandInHandler", (Handler,), {"stand_in": StandIn(options)})
+    return ThreadingHTTPServer((options.host, options.port), handler)
+
+def main(argv=None):
+    options = parse_args(argv)
+    server = make_server(options)
+    host, port = server.server_address[:2]
+    print(f"🧪 LLM stand-in listening on http://{host}:{port}")
+    print(f"   OLLAMA_HOST=http://{host}:{port}")
+    print(f"   OPENAI_BASE_URL=http://{host}:{port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    sys.exit(main())
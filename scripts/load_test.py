@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Load test of the ModelManager query path
+Sends concurrent generations from several chat sessions through routing,
+provider scheduling, retries and circuit breakers, and reports latency
+percentiles, throughput and errors. Meant to run against
+scripts/llm_stand_in.py, so results are reproducible on any machine.
+
+Usage:
+    python scripts/llm_stand_in.py --port 11435 --seed 1 &
+    python scripts/load_test.py --stand-in http://127.0.0.1:11435 --model "Llama 3" --sessions 4 --requests 40
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+CONTEXT = (
+    "The quarterly report lists revenue of 4.2 million, up 12 percent on the previous quarter. "
+    "Operating costs rose 5 percent, mainly from hiring in the support team. "
+) * 8
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the ModelManager query path")
+    parser.add_argument("--stand-in", help="stand-in base URL; sets OLLAMA_HOST and OPENAI_BASE_URL")
+    parser.add_argument("--model", default="Llama 3", help="ModelManager model name")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent chat sessions")
+    parser.add_argument("--requests", type=int, default=40, help="requests in total, spread over the sessions")
+    parser.add_argument("--chat", action="store_true", help="send each session's requests as turns of one conversation")
+    parser.add_argument("--duplicates", action="store_true", help="every session asks the same questions (exercises coalescing)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+def percentiles(values):
+    import numpy as np
+
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    return {f"p{q}": round(float(np.percentile(values, q)), 3) for q in (50, 95, 99)}
+
+def run_session(manager, session, args, count):
+    """Send one session's requests in order; returns their usage records (None for failures)"""
+    from src.core.conversation import ConversationSession
+
+    conversation = ConversationSession() if args.chat else None
+    results = []
+    for i in range(count):
+        question = f"Question {i}: what does the report say about revenue and costs?"
+        if not args.duplicates:
+            question = f"[session {session}] {question}"
+        if conversation is not None:
+            result = manager.generate_conversation(conversation, question, [(f"chunk-{i}", CONTEXT)])
+        else:
+            result = manager.generate(question, CONTEXT)
+        results.append(result["usage"])
+    return results
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.stand_in:
+        # Must be set before the app's configuration is imported
+        base = args.stand_in.rstrip("/")
+        os.environ["OLLAMA_HOST"] = base
+        os.environ["OPENAI_BASE_URL"] = f"{base}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "stand-in")
+
+    from src.core.model_manager import ModelManager
+    from src.core.model_router import get_model_router
+    from src.core.provider_scheduler import get_provider_scheduler
+    from src.core.resilience import get_breaker_status
+
+    managers = []
+    for _ in range(args.sessions):
+        manager = ModelManager()
+        if not manager.set_model(args.model, os.getenv("OPENAI_API_KEY")):
+            print(f"❌ Could not select {args.model}")
+            return 1
+        managers.append(manager)
+
+    per_session = [args.requests // args.sessions + (1 if i < args.requests % args.sessions else 0)
+                   for i in range(args.sessions)]
+    print(f"🚀 {args.requests} requests from {args.sessions} sessions to {args.model}...", file=sys.stderr)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        futures = [pool.submit(run_session, manager, i, args, count)
+                   for i, (manager, count) in enumerate(zip(managers, per_session))]
+        usages = [usage for future in futures for usage in future.result()]
+    elapsed = time.perf_counter() - started
+
+    ok = [usage for usage in usages if usage]
+    report = {
+        "model": args.model,
+        "requests": len(usages),
+        "errors": len(usages) - len(ok),
+        "fallbacks": sum(1 for usage in ok if usage.get("fallback")),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else None,
+        "completion_tokens_per_s": round(sum(usage.get("completion_tokens") or 0 for usage in ok) / elapsed, 1) if elapsed else None,
+        "total_s": percentiles([usage["total_s"] for usage in ok]),
+        "ttft_s": percentiles([usage["ttft_s"] for usage in ok if usage.get("ttft_s") is not None]),
+        "cached_tokens": sum(usage.get("cached_tokens") or 0 for usage in ok),
+        "scheduling": get_provider_scheduler().get_stats(),
+        "routing": get_model_router().get_stats(),
+        "circuit_breakers": get_breaker_status()
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"✅ {len(ok)}/{report['requests']} succeeded in {report['elapsed_s']}s "
+              f"({report['throughput_rps']} req/s, {report['completion_tokens_per_s']} tokens/s)")
+        print(f"   Total latency: {report['total_s']}")
+        print(f"   Time to first token: {report['ttft_s']}")
+        print(f"   Errors: {report['errors']}, fallbacks: {report['fallbacks']}, cached prompt tokens: {report['cached_tokens']}")
+        for provider, stats in report["scheduling"].items():
+            print(f"   Queue {provider}: wait p95 {stats['wait_p95_s']}s, coalesced {stats['coalesced']}, timeouts {stats['timeouts']}")
+        for target, stats in report["routing"].items():
+            print(f"   Route {target}: p95 {stats['p95_s']}s, error rate {stats['error_rate']}")
+        for provider, status in report["circuit_breakers"].items():
+            print(f"   Breaker {provider}: {status['state']} (opened {status['times_opened']}x)")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
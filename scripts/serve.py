@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Container entry point for the RAG PDF Chat Application
+Starts the warm-up in the Streamlit server process, so the loaded models
+are the ones the app uses, then serves the app. The readiness file is
+written once warm-up finishes.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+os.chdir(PROJECT_ROOT)
+
+def main():
+    """Warm up in the background and run the Streamlit server"""
+    from streamlit.web import cli as streamlit_cli
+    from src.config.config import WARMUP_ENABLED
+    from src.core.warmup import clear_ready, mark_ready, start_warmup
+    
+    clear_ready()
+    if WARMUP_ENABLED:
+        start_warmup()
+    else:
+        mark_ready({"ready": True, "steps": {}, "warm_up": "disabled"})
+    
+    # Same process as the warm-up; extra arguments and STREAMLIT_* variables go to `streamlit run`
+    sys.argv = ["streamlit", "run", str(PROJECT_ROOT / "src" / "app.py")] + sys.argv[1:]
+    streamlit_cli.main()
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,19 @@
 import streamlit as st
 import os
+import sys
 import time
 from typing import Dict, Any
 import logging
 
+# Streamlit runs this file as a script, so make the project root importable for the src package
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
 # Import our custom modules
-from .utils.pdf_uploader import PDFUploader
-from .core.rag_system import RAGSystem
-from .config.config import UPLOAD_FOLDER
+from src.core.rag_system import RAGSystem
+from src.core.conversation import ConversationSession
+from src.config.config import CHUNKING_STRATEGY, DEFAULT_TENANT, TENANT_HEADER
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,15 +27,37 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+def resolve_tenant() -> str:
+    """Tenant of the current session, from the header set by the authenticating proxy"""
+    # st.context is only available on Streamlit >= 1.37
+    context = getattr(st, "context", None)
+    headers = getattr(context, "headers", None) or {}
+    return headers.get(TENANT_HEADER) or DEFAULT_TENANT
+
+def format_usage(usage) -> str:
+    """One-line summary of an answer's model, tokens, timing and cost"""
+    parts = [usage["model"], f"{usage['prompt_tokens'] or 0:,} → {usage['completion_tokens'] or 0:,} tokens"]
+    if usage.get("ttft_s") is not None:
+        parts.append(f"first token {usage['ttft_s']:.2f}s")
+    parts.append(f"{usage.get('total_s', usage['latency_s']):.2f}s")
+    if usage.get("cost_usd"):
+        parts.append(f"${usage['cost_usd']:.4f}")
+    return " · ".join(parts)
+
 # Initialize session state
+if "tenant_id" not in st.session_state:
+    st.session_state.tenant_id = resolve_tenant()
+
 if "rag_system" not in st.session_state:
-    st.session_state.rag_system = RAGSystem()
+    st.session_state.rag_system = RAGSystem(tenant_id=st.session_state.tenant_id)
 
 if "uploaded_files" not in st.session_state:
     st.session_state.uploaded_files = {}
 
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if "conversation" not in st.session_state:
+    st.session_state.conversation = ConversationSession()
 
 def inject_custom_css():
     """Inject custom CSS for portfolio-style design"""
@@ -302,11 +330,11 @@ def main():
         available_models = rag_system.get_available_models()
         
         # Filter models based on availability
+        model_status = rag_system.get_model_status()
         model_options = []
         for model_name, model_info in available_models.items():
             if model_info["provider"] == "ollama":
                 # Check if Ollama is available
-                model_status = rag_system.get_model_status()
                 if model_status.get("ollama_available", False):
                     model_options.append(model_name)
             else:
@@ -335,8 +363,12 @@ def main():
                 if st.button("Set Model", type="primary"):
                     with st.spinner("Setting up model..."):
                         success = rag_system.set_model(selected_model, api_key)
+                        pulls = rag_system.get_model_status()["ollama_pulls"]
+                        pull = pulls.get(available_models[selected_model]["model"])
                         if success:
                             st.success("Model set successfully!")
+                        elif pull and pull["status"] not in ("success", "error"):
+                            st.info("Model is downloading. Set it again once the download finishes.")
                         else:
                             st.error("Failed to set model. Check your configuration.")
             
@@ -353,6 +385,27 @@ def main():
             model_status = rag_system.get_model_status()
             if model_status["current_model"]:
                 st.info(f"**Current Model:** {model_status['current_model']}")
+                if model_status["current_provider"] == "ollama":
+                    model_id = available_models[model_status["current_model"]]["model"]
+                    expires_at = model_status["ollama_resident"].get(model_id)
+                    if expires_at:
+                        st.caption(f"Loaded in memory until {expires_at[:19].replace('T', ' ')}")
+                    else:
+                        st.caption("Not loaded; the next answer loads it first")
+                
+                session_usage = rag_system.usage.summary()
+                if session_usage["requests"]:
+                    st.caption(f"This session: {session_usage['requests']} answers, "
+                               f"{session_usage['total_tokens']:,} tokens, ${session_usage['cost_usd']:.4f}, "
+                               f"p95 {session_usage['latency_p95_s']:.1f}s")
+            
+            # Background model downloads
+            for model_id, pull in model_status["ollama_pulls"].items():
+                if pull["status"] == "error":
+                    st.error(f"Download of {model_id} failed: {pull['error']}")
+                elif pull["status"] != "success":
+                    fraction = pull["completed"] / pull["total"] if pull["total"] else 0.0
+                    st.progress(fraction, text=f"Downloading {model_id}: {pull['status']}")
         else:
             st.warning("No models available. Please check your configuration.")
         
@@ -368,17 +421,26 @@ def main():
         )
         
         if uploaded_file is not None:
+            chunking_options = ["semantic", "fixed"]
+            chunking_strategy = st.selectbox(
+                "Chunking strategy",
+                options=chunking_options,
+                index=chunking_options.index(CHUNKING_STRATEGY),
+                help="Semantic splits on headings, paragraphs and list items within the embedding model's token limit; fixed uses character windows"
+            )
+            
             if st.button("Process Document", type="primary"):
                 with st.spinner("Processing document..."):
                     # Upload file
-                    uploader = PDFUploader(UPLOAD_FOLDER)
+                    uploader = st.session_state.rag_system.uploader
                     file_info = uploader.upload_pdf(uploaded_file)
                     
                     if file_info:
                         # Process document with RAG system
                         success = st.session_state.rag_system.process_document(
                             file_info["id"], 
-                            file_info["file_path"]
+                            file_info["file_path"],
+                            chunking_strategy=chunking_strategy
                         )
                         
                         if success:
@@ -387,6 +449,7 @@ def main():
                             
                             # Clear chat history when new document is processed
                             st.session_state.chat_history = []
+                            st.session_state.conversation.clear()
                         else:
                             st.error("❌ Failed to process document. Please try again.")
                     else:
@@ -406,6 +469,12 @@ def main():
                         st.write(f"**Pages:** {summary['total_pages']}")
                         st.write(f"**Chunks:** {summary['total_chunks']}")
                         st.write(f"**Content Types:** {summary['content_types']}")
+                        if summary.get("ingest_timings"):
+                            st.write(f"**Ingest time:** {summary['ingest_timings']['total_s']:.1f}s")
+                        if summary.get("usage", {}).get("answers"):
+                            usage = summary["usage"]
+                            st.write(f"**LLM usage:** {usage['prompt_tokens'] + usage['completion_tokens']:,} tokens"
+                                     f" over {usage['answers']:g} answers (${usage['cost_usd']:.4f})")
                     
                     if st.button(f"🗑️ Delete", key=f"delete_{file_id}"):
                         if st.session_state.rag_system.delete_document(file_id):
@@ -473,14 +542,18 @@ def main():
     if len(st.session_state.uploaded_files) > 1:
         file_options = {f"{info['original_name']}": file_id 
                        for file_id, info in st.session_state.uploaded_files.items()}
-        selected_file = st.selectbox(
-            "Select document to query:",
+        selected_files = st.multiselect(
+            "Select documents to query:",
             options=list(file_options.keys()),
-            help="Choose which document to ask questions about"
+            default=list(file_options.keys())[:1],
+            help="Choose which documents to ask questions about; answers draw on all selected documents"
         )
-        selected_file_id = file_options[selected_file]
+        selected_file_ids = [file_options[name] for name in selected_files]
+        if not selected_file_ids:
+            st.warning("Select at least one document to chat with.")
+            return
     else:
-        selected_file_id = list(st.session_state.uploaded_files.keys())[0]
+        selected_file_ids = list(st.session_state.uploaded_files.keys())[:1]
         selected_file_name = list(st.session_state.uploaded_files.values())[0]['original_name']
         st.info(f"📄 Chatting with: **{selected_file_name}**")
     
@@ -496,12 +569,22 @@ def main():
             else:
                 with st.chat_message("assistant"):
                     st.write(message["content"])
+                    if message.get("usage"):
+                        st.caption(format_usage(message["usage"]))
                     
                     # Show sources if available
                     if "sources" in message and message["sources"]:
                         with st.expander("📚 Sources"):
                             for j, source in enumerate(message["sources"]):
                                 st.write(f"**Source {j+1}:** Page {source['page']}, Type: {source['type']}")
+                                
+                                # Tables are loaded from the table store only when requested
+                                if source.get("table_id") and st.checkbox("Show table", key=f"table_{i}_{j}"):
+                                    table = st.session_state.rag_system.get_table(source["table_id"])
+                                    if table:
+                                        st.dataframe(table["data"], use_container_width=True)
+                                    else:
+                                        st.warning("Table data is no longer available.")
     
     # Chat input
     user_input = st.chat_input("Ask a question about your document...")
@@ -520,17 +603,23 @@ def main():
         
         # Generate response
         with st.spinner("🤔 Thinking..."):
+            # The pinned context belongs to the documents it was retrieved from
+            if st.session_state.get("conversation_file_ids") != selected_file_ids:
+                st.session_state.conversation.clear()
+                st.session_state.conversation_file_ids = selected_file_ids
             response = st.session_state.rag_system.search_and_answer(
                 user_input, 
-                selected_file_id, 
-                top_k=5
+                file_ids=selected_file_ids, 
+                top_k=5,
+                conversation=st.session_state.conversation
             )
         
         # Add assistant response to chat history
         st.session_state.chat_history.append({
             "role": "assistant",
             "content": response["answer"],
-            "sources": response["sources"]
+            "sources": response["sources"],
+            "usage": response.get("usage")
         })
         
         # Display assistant response
@@ -555,6 +644,7 @@ def main():
     if st.session_state.chat_history:
         if st.button("🗑️ Clear Chat History"):
             st.session_state.chat_history = []
+            st.session_state.conversation.clear()
             st.rerun()
 
 def show_help():
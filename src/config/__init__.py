@@ -2,6 +2,6 @@
 Configuration management for the RAG PDF Chat Application.
 """
 
-from .config import Config
+from . import config
 
-__all__ = ['Config']
+__all__ = ['config']
@@ -5,15 +5,132 @@ load_dotenv()
 
 # OpenAI Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Alternative OpenAI-compatible endpoint, e.g. scripts/llm_stand_in.py for load tests
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
 
 # File Storage Configuration
 UPLOAD_FOLDER = "data/uploads"
 EMBEDDINGS_FOLDER = "data/embeddings"
+TABLES_FOLDER = os.path.join(EMBEDDINGS_FOLDER, "tables")
+UPLOAD_CHUNK_BYTES = 1024 * 1024  # uploads are copied, hashed and validated in chunks of this size
+UPLOAD_INDEX_NAME = "uploads.sqlite3"  # per-tenant index of the hash-sharded upload store
+
+# Tenant Configuration
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+TENANT_HEADER = "X-Tenant-ID"  # set by the authenticating reverse proxy
+TENANT_MAX_DOCUMENTS = 500  # oldest documents are evicted beyond this
+TENANT_MAX_CHUNKS = 250000  # oldest documents are evicted beyond this
+TENANT_MAX_UPLOAD_MB = 5120  # oldest uploads are evicted beyond this
+TENANT_MAX_CONCURRENT_INGESTS = 2  # per tenant, so bulk ingests queue instead of saturating the host
+INGEST_MAX_CONCURRENT = 4  # across all tenants; waiting ingests get slots round-robin by tenant
+INGEST_QUEUE_TIMEOUT_SECONDS = 1800.0  # an ingest still waiting for a slot after this fails
 
 # Model Configuration
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
+# Chunking Configuration
+# "semantic" packs headings/paragraphs/list items under a tokenizer-exact budget,
+# "fixed" uses CHUNK_SIZE/CHUNK_OVERLAP character windows. "fixed" stays the default so
+# existing indexes keep one strategy; re-index every document after switching to "semantic"
+CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "fixed")
+CHUNK_MAX_TOKENS = 256  # capped at the embedding model's max sequence length
+TABLE_ROW_GROUP_SIZE = 50  # table rows per chunk group; the header is repeated in each group
+
+# Table Detection Configuration
+# "auto" runs table extraction only on pages with ruling lines, "always" on every page,
+# "diagnose" on every page while reporting the detector's precision and recall
+TABLE_DETECTION_MODE = "auto"
+TABLE_DETECTOR_MIN_RULINGS = 3  # minimum distinct crossing horizontal and vertical ruling positions (a grid, not a box)
+
+# OCR Configuration
+OCR_DPI = 300  # render resolution for pages without a usable text layer
+OCR_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # processes rendering and OCR'ing scanned pages
+OCR_MIN_TEXT_CHARS = 20  # pages with less extracted text are treated as scanned
+OCR_MIN_READABLE_RATIO = 0.7  # below this share of readable characters the text layer is garbage
+OCR_MIN_IMAGE_PIXELS = 40000  # embedded images smaller than this (about 200x200) are not OCR'd
+OCR_MIN_INK_RATIO = 0.002  # rendered pages with fewer pixels off the background colour are blank and not OCR'd
+
+# Deduplication Configuration
+DEDUP_ENABLED = True
+DEDUP_THRESHOLD = 0.8  # estimated Jaccard similarity above which chunks are merged
+DEDUP_NUM_PERM = 64  # MinHash permutations per signature
+DEDUP_SHINGLE_SIZE = 3  # words per shingle
+
+# Retrieval Configuration
+# Re-rank results with maximal marginal relevance; off by default so existing deployments keep their ranking
+SEARCH_DIVERSIFY = os.getenv("SEARCH_DIVERSIFY", "false").lower() == "true"
+MMR_LAMBDA = 0.5  # 1.0 = pure relevance, 0.0 = pure diversity
+MMR_FETCH_MULTIPLIER = 4  # candidates fetched per requested result before re-ranking
+
 # Vector Database Configuration
-COLLECTION_NAME = "pdf_documents"
+COLLECTION_NAME = "pdf_documents"  # prefix of the per-document shard collections
+SEARCH_MAX_WORKERS = 8  # shards queried in parallel by a multi-document search
+REGISTRY_DB_NAME = "registry.sqlite3"  # per-tenant document registry with maintained counters
+WRITE_BATCH_BYTES = 8 * 1024 * 1024  # approximate vectors + text + metadata per vector store write
+WRITE_QUEUE_DEPTH = 2  # embedded batches waiting to be written before embedding pauses
+WRITE_MAX_RETRIES = 3  # retries per batch write; upserts with fixed IDs make them safe
+WRITE_RETRY_BACKOFF = 0.5  # seconds, doubled after each failed attempt
+
+# Garbage Collection Configuration
+GC_ENABLED = True  # reconcile uploads, shards, registry and tables in the background
+GC_INTERVAL_SECONDS = 3600
+GC_GRACE_SECONDS = 3600  # uploads, shards and tables younger than this are never collected
+
+# Warm-up Configuration
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+READY_FILE = os.getenv("READY_FILE", "data/.ready")  # written once warm-up finishes; checked by HEALTHCHECK
+WARMUP_OLLAMA_MODEL = os.getenv("WARMUP_OLLAMA_MODEL", "llama3:latest")  # "" skips the Ollama warm-up
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # how long Ollama keeps the model resident
+
+# Ollama Configuration
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_NUM_CTX_BUCKETS = (2048, 4096, 8192)  # context sizes; changing num_ctx reloads the model, so few and sticky
+OLLAMA_NUM_PREDICT = 1000  # max answer tokens, reserved in the context window
+OLLAMA_CHARS_PER_TOKEN = 3.5  # conservative prompt length estimate for sizing num_ctx
+OLLAMA_NUM_THREAD = int(os.getenv("OLLAMA_NUM_THREAD", "0"))  # 0 = one per available core
+
+# Conversation Configuration
+# Transcript size (system prompt, pinned context, turns) at which a chat starts over;
+# sized to fit the largest Ollama context bucket with room for the answer
+CONVERSATION_MAX_CHARS = 24000
+QUERY_REWRITE_MODE = "heuristic"  # how follow-ups become standalone queries: "heuristic", "llm" or "off"
+PAGE_FILTER_MAX_PAGES = 20  # "pages 3-8" style ranges wider than this are not used as filters
+WORKING_SET_MAX_CHUNKS = 64  # recently retrieved chunks (with vectors) kept per chat
+WORKING_SET_MIN_SIMILARITY = 0.5  # follow-ups are answered from the working set only if every chunk is this close to the question as asked
+
+# Model Routing Configuration
+ROUTER_FALLBACK_MODEL = "Llama 3"  # local model used when the selected provider is failing or slow ("" disables)
+ROUTER_WINDOW = 50  # recent calls per provider/model the latency percentiles and error rate are computed over
+ROUTER_MIN_SAMPLES = 5  # calls needed before a provider/model can be judged unhealthy
+ROUTER_MAX_ERROR_RATE = 0.5  # above this, requests go to the fallback first
+ROUTER_MAX_P95_SECONDS = 30.0  # above this p95, requests go to the fallback first
+ROUTER_PROBE_SECONDS = 60.0  # an unhealthy provider still gets one request after this long, to notice recovery
+ROUTER_HEDGE_ENABLED = os.getenv("ROUTER_HEDGE_ENABLED", "false").lower() == "true"
+ROUTER_HEDGE_MIN_SECONDS = 5.0  # the fallback is hedged after max(this, primary p95) without an answer
+
+# Provider Scheduling Configuration
+# Concurrent requests per provider across all sessions; more wait in a queue that is fair across sessions
+SCHEDULER_MAX_CONCURRENCY = {
+    "ollama": int(os.getenv("OLLAMA_MAX_CONCURRENCY", "1")),  # match the server's OLLAMA_NUM_PARALLEL
+    "openai": int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+}
+SCHEDULER_QUEUE_TIMEOUT_SECONDS = 120.0  # a request still queued after this fails (and may fall back)
+SCHEDULER_WAIT_WINDOW = 200  # recent queue waits per provider the wait percentiles are computed over
+
+# Resilience Configuration
+LLM_MAX_RETRIES = 2  # retries of a transient LLM failure (429, 5xx, connection reset) per provider
+LLM_RETRY_BASE_SECONDS = 0.5  # backoff before the first retry, doubled per attempt, with full jitter
+LLM_RETRY_MAX_SECONDS = 8.0  # cap of one backoff, unless the provider's Retry-After asks for longer
+LLM_DEADLINE_SECONDS = 300.0  # total time for one answer, across queueing, retries and fallback
+BREAKER_FAILURE_THRESHOLD = 5  # consecutive transient failures that open a provider's circuit
+BREAKER_RESET_SECONDS = 30.0  # an open circuit lets one trial request through after this long
+
+# Usage Accounting Configuration
+# USD per million (prompt, completion) tokens; local models cost nothing, unknown models are not priced
+MODEL_PRICING = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4": (30.00, 60.00)
+}
+USAGE_LATENCY_WINDOW = 500  # recent generations the per-session TTFT and latency percentiles cover
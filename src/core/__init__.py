@@ -6,11 +6,30 @@ This package contains the main components:
 - ModelManager: Multi-model management (OpenAI, Ollama)
 - EmbeddingSystem: Vector embeddings and similarity search
 - PDFParser: PDF processing and content extraction
+
+Components are imported on first access, so importing the package does not
+pull in torch, Chroma, PyMuPDF or the LLM clients.
 """
 
-from .rag_system import RAGSystem
-from .model_manager import ModelManager
-from .embedding_system import EmbeddingSystem
-from .pdf_parser import PDFParser
+import importlib
+
+_LAZY_IMPORTS = {
+    'RAGSystem': '.rag_system',
+    'ModelManager': '.model_manager',
+    'EmbeddingSystem': '.embedding_system',
+    'PDFParser': '.pdf_parser'
+}
 
 __all__ = ['RAGSystem', 'ModelManager', 'EmbeddingSystem', 'PDFParser']
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        value = getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,383 @@
+"""
+Chunking strategies for turning parsed PDF content into embedding chunks
+Supports fixed character windows and layout-aware, token-budgeted chunks
+"""
+
+import re
+import logging
+from typing import List, Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bullets and enumerations that mark the start of a list item
+LIST_ITEM_PATTERN = re.compile(r"^\s*(?:[-•*▪‣◦–]|\(?\d{1,3}[.)]|\(?[a-zA-Z][.)])\s+")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+TOKEN_ESTIMATE_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def approximate_token_count(text: str) -> int:
+    """Rough word-piece estimate used when no tokenizer is supplied"""
+    return len(TOKEN_ESTIMATE_PATTERN.findall(text))
+
+
+def split_text(text: str, chunk_size: int, overlap: int) -> List[str]:
+    """Split text into overlapping character windows"""
+    if len(text) <= chunk_size:
+        return [text]
+
+    chunks = []
+    start = 0
+
+    while start < len(text):
+        end = start + chunk_size
+
+        # Try to break at sentence boundary
+        if end < len(text):
+            # Look for sentence endings
+            for i in range(end, max(start + chunk_size // 2, end - 100), -1):
+                if text[i] in '.!?':
+                    end = i + 1
+                    break
+        # If no sentence boundary found, look for word boundary
+        if end < len(text):
+            for i in range(end, max(start + chunk_size // 2, end - 50), -1):
+                if text[i] == ' ':
+                    end = i
+                    break
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+
+        start = end - overlap
+        if start >= len(text):
+            break
+
+    return chunks
+
+
+class ChunkingStrategy:
+    """Base class for chunking strategies"""
+
+    name = "base"
+
+    def chunk(self, parsed_content: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Split parsed content into chunks for embedding
+
+        Args:
+            parsed_content: Parsed PDF content from PDFParser.parse_pdf
+
+        Returns:
+            list: List of content chunks
+        """
+        raise NotImplementedError
+
+    def _image_chunk(self, img_item: Dict[str, Any], chunk_text: str, index: int) -> Dict[str, Any]:
+        return {
+            "type": "image_ocr",
+            "content": chunk_text,
+            "page": img_item["page"],
+            "chunk_index": index,
+            "image_info": {
+                "width": img_item["width"],
+                "height": img_item["height"]
+            }
+        }
+
+    def _row_groups(self, table_item: Dict[str, Any]) -> List[str]:
+        """Table text split into row groups, each starting with the header line"""
+        return table_item.get("row_groups") or [table_item["text_representation"]]
+
+    def _table_chunk(self, table_item: Dict[str, Any], chunk_text: str, index: int) -> Dict[str, Any]:
+        return {
+            "type": "table",
+            "content": chunk_text,
+            "page": table_item["page"],
+            "chunk_index": index,
+            "table_index": table_item["table_index"],
+            "table_data": table_item["data"],
+            "columns": table_item["columns"]
+        }
+
+
+class FixedSizeChunker(ChunkingStrategy):
+    """Character windows with overlap, breaking at sentence or word boundaries"""
+
+    name = "fixed"
+
+    def __init__(self, chunk_size: int = 1000, overlap: int = 200):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+
+    def chunk(self, parsed_content: Dict[str, Any]) -> List[Dict[str, Any]]:
+        chunks = []
+
+        # Process text content
+        for text_item in parsed_content["text_content"]:
+            for i, chunk_text in enumerate(split_text(text_item["text"], self.chunk_size, self.overlap)):
+                chunks.append({
+                    "type": "text",
+                    "content": chunk_text,
+                    "page": text_item["page"],
+                    "chunk_index": i,
+                    "source": text_item["source"]
+                })
+
+        # Process tables one row group at a time so every chunk keeps the header
+        for table_item in parsed_content["tables"]:
+            table_chunks = [
+                chunk_text
+                for group in self._row_groups(table_item)
+                for chunk_text in split_text(group, self.chunk_size, self.overlap)
+            ]
+            for i, chunk_text in enumerate(table_chunks):
+                chunks.append(self._table_chunk(table_item, chunk_text, i))
+
+        # Process images with OCR text
+        for img_item in parsed_content["images"]:
+            if img_item.get("has_text", False):
+                for i, chunk_text in enumerate(split_text(img_item["ocr_text"], self.chunk_size, self.overlap)):
+                    chunks.append(self._image_chunk(img_item, chunk_text, i))
+
+        return chunks
+
+
+class SemanticChunker(ChunkingStrategy):
+    """
+    Layout-aware chunking under an exact token budget
+
+    Headings, paragraphs and list items from the PyMuPDF layout blocks are
+    packed into chunks that never exceed ``max_tokens`` as counted by the
+    embedding model's own tokenizer, so nothing is truncated at encode time.
+    Each chunk is prefixed with the heading of the section it belongs to.
+    """
+
+    name = "semantic"
+
+    def __init__(self, max_tokens: int = 256, token_counter: Optional[Callable[[str], int]] = None):
+        self.max_tokens = max_tokens
+        if token_counter is None:
+            logger.warning("No tokenizer supplied to SemanticChunker, using approximate token counts")
+            token_counter = approximate_token_count
+        self.count_tokens = token_counter
+
+    def chunk(self, parsed_content: Dict[str, Any]) -> List[Dict[str, Any]]:
+        chunks = []
+
+        # Pages with layout blocks are chunked from the blocks, the rest from plain page text
+        blocks_by_page: Dict[int, List[Dict[str, Any]]] = {}
+        for block in parsed_content.get("layout_blocks", []):
+            blocks_by_page.setdefault(block["page"], []).append(block)
+
+        for text_item in parsed_content["text_content"]:
+            if text_item["page"] not in blocks_by_page:
+                blocks_by_page[text_item["page"]] = [
+                    {"page": text_item["page"], "kind": self._classify(paragraph), "text": paragraph}
+                    for paragraph in re.split(r"\n\s*\n", text_item["text"]) if paragraph.strip()
+                ]
+
+        heading = None
+        pending: List[str] = []
+        pages = sorted(blocks_by_page)
+        for page in pages:
+            page_chunks, heading, pending = self._pack_blocks(blocks_by_page[page], heading, pending)
+            if pending and page == pages[-1]:
+                # Headings at the very end with no body after them still get embedded
+                page_chunks += [(piece, heading) for piece in self._split_words("\n\n".join(pending))]
+            for i, (chunk_text, section) in enumerate(page_chunks):
+                chunk = {
+                    "type": "text",
+                    "content": chunk_text,
+                    "page": page,
+                    "chunk_index": i,
+                    "source": "layout"
+                }
+                if section:
+                    chunk["section"] = section
+                chunks.append(chunk)
+
+        # Tables: pack rows under the budget, repeating the header line in every chunk
+        for table_item in parsed_content["tables"]:
+            table_chunks = []
+            for group in self._row_groups(table_item):
+                lines = group.split("\n")
+                table_chunks.extend(self._pack_lines(lines[1:], prefix=lines[0]))
+            for i, chunk_text in enumerate(table_chunks):
+                chunks.append(self._table_chunk(table_item, chunk_text, i))
+
+        # Images with OCR text: pack OCR paragraphs
+        for img_item in parsed_content["images"]:
+            if img_item.get("has_text", False):
+                paragraphs = [p for p in re.split(r"\n\s*\n", img_item["ocr_text"]) if p.strip()]
+                for i, chunk_text in enumerate(self._pack_lines(paragraphs, separator="\n\n")):
+                    chunks.append(self._image_chunk(img_item, chunk_text, i))
+
+        return chunks
+
+    def _classify(self, text: str) -> str:
+        """Classify a plain-text paragraph when no layout information is available"""
+        if LIST_ITEM_PATTERN.match(text):
+            return "list_item"
+        return "paragraph"
+
+    def _pack_blocks(self, blocks: List[Dict[str, Any]], heading: Optional[str], pending: List[str]):
+        """
+        Pack a page's blocks into (chunk_text, section) pairs
+
+        Headings that no body text has followed yet are pending: they lead
+        the next chunk, even on a later page, so every heading's text is
+        embedded. Otherwise a chunk is led by the current section heading.
+
+        Returns:
+            tuple: The page's chunks, the current heading and the still pending headings
+        """
+        packed = []
+        parts: List[str] = []
+        used = 0
+
+        def flush():
+            nonlocal parts, used
+            if parts:
+                packed.append(("\n\n".join(parts), heading))
+            parts, used = [], 0
+
+        def open_chunk():
+            nonlocal parts, used, pending
+            lead = pending or ([heading] if heading else [])
+            lead_text = "\n\n".join(lead)
+            lead_tokens = self.count_tokens(lead_text) if lead else 0
+            if lead and lead_tokens >= self.max_tokens // 2:
+                # Too long to lead a chunk; headings not embedded yet get chunks of their own
+                if pending:
+                    packed.extend((piece, heading) for piece in self._split_words(lead_text))
+                lead, lead_tokens = [], 0
+            pending = []
+            parts, used = list(lead), lead_tokens
+
+        for block in blocks:
+            text = block["text"].strip()
+            if not text:
+                continue
+
+            if block["kind"] == "heading":
+                flush()
+                heading = text
+                pending = pending + [text]
+                continue
+
+            tokens = self.count_tokens(text)
+            if parts and used + tokens > self.max_tokens:
+                flush()
+            if not parts:
+                open_chunk()
+            if used + tokens <= self.max_tokens:
+                parts.append(text)
+                used += tokens
+                continue
+
+            # A single block larger than the budget: split it into sentences, then words
+            for piece in self._pack_lines(SENTENCE_PATTERN.split(text), separator=" ",
+                                          prefix="\n\n".join(parts) if parts else None):
+                packed.append((piece, heading))
+            parts, used = [], 0
+
+        flush()
+
+        page_chunks = []
+        for text, section in packed:
+            if self._fits(text):
+                page_chunks.append((text, section))
+            else:
+                page_chunks.extend((piece, section) for piece in self._split_words(text))
+
+        return page_chunks, heading, pending
+
+    def _pack_lines(self, lines: List[str], separator: str = "\n", prefix: Optional[str] = None) -> List[str]:
+        """Greedily pack lines under the token budget, starting every chunk with ``prefix``"""
+        prefix_tokens = self.count_tokens(prefix) if prefix else 0
+        if prefix_tokens >= self.max_tokens // 2:
+            prefix, prefix_tokens = None, 0
+
+        packed = []
+        parts: List[str] = []
+        used = prefix_tokens
+
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            tokens = self.count_tokens(line)
+            if parts and used + tokens > self.max_tokens:
+                packed.append(self._join(prefix, parts, separator))
+                parts, used = [], prefix_tokens
+            if used + tokens > self.max_tokens:
+                # Line alone exceeds what is left of the budget
+                for piece in self._split_words(line, self.max_tokens - prefix_tokens):
+                    packed.append(self._join(prefix, [piece], separator))
+                continue
+            parts.append(line)
+            used += tokens
+
+        if parts:
+            packed.append(self._join(prefix, parts, separator))
+        elif not packed and prefix:
+            packed.append(prefix)
+
+        return packed
+
+    def _join(self, prefix: Optional[str], parts: List[str], separator: str) -> str:
+        body = separator.join(parts)
+        return f"{prefix}\n{body}" if prefix else body
+
+    def _fits(self, text: str) -> bool:
+        # Summed per-block counts are exact for whitespace pre-tokenizers such as
+        # MiniLM's WordPiece; re-count the joined text to stay exact for any tokenizer.
+        return self.count_tokens(text) <= self.max_tokens
+
+    def _split_words(self, text: str, budget: Optional[int] = None) -> List[str]:
+        """Last-resort split on word boundaries under the token budget"""
+        budget = budget or self.max_tokens
+        pieces = []
+        words: List[str] = []
+        used = 0
+
+        for word in text.split():
+            tokens = self.count_tokens(word)
+            if words and used + tokens > budget:
+                pieces.append(" ".join(words))
+                words, used = [], 0
+            words.append(word)
+            used += tokens
+
+        if words:
+            pieces.append(" ".join(words))
+
+        return pieces
+
+
+CHUNKING_STRATEGIES = {
+    FixedSizeChunker.name: FixedSizeChunker,
+    SemanticChunker.name: SemanticChunker
+}
+
+
+def get_chunking_strategy(name: str, **kwargs) -> ChunkingStrategy:
+    """
+    Build a chunking strategy by name
+
+    Args:
+        name: Strategy name ("fixed" or "semantic")
+        **kwargs: Strategy options (chunk_size/overlap for fixed,
+            max_tokens/token_counter for semantic)
+
+    Returns:
+        ChunkingStrategy instance
+    """
+    if name not in CHUNKING_STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy: {name}. Available: {list(CHUNKING_STRATEGIES)}")
+
+    strategy_cls = CHUNKING_STRATEGIES[name]
+    if strategy_cls is FixedSizeChunker:
+        return FixedSizeChunker(kwargs.get("chunk_size", 1000), kwargs.get("overlap", 200))
+    return SemanticChunker(kwargs.get("max_tokens", 256), kwargs.get("token_counter"))
@@ -0,0 +1,274 @@
+"""
+Conversation sessions with a stable prompt prefix
+Each turn is appended to the previous ones instead of rebuilding the
+prompt, so providers can reuse the work done for earlier turns: Ollama
+through its returned context tokens, OpenAI through prefix caching.
+Follow-up questions are condensed into standalone retrieval queries and
+may be answered from the chat's working set of recently retrieved chunks.
+"""
+
+import re
+import logging
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from ..config.config import (
+    CONVERSATION_MAX_CHARS, QUERY_REWRITE_MODE, PAGE_FILTER_MAX_PAGES,
+    WORKING_SET_MAX_CHUNKS, WORKING_SET_MIN_SIMILARITY
+)
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = (
+    "You are a helpful assistant that answers questions based on provided document context. "
+    "If the answer cannot be found in the context, please say so."
+)
+
+PAGE_PATTERN = re.compile(r"\bpages?\s+(\d+)(?:\s*(?:-|–|to|and|&)\s*(\d+))?", re.IGNORECASE)
+FOLLOW_UP_PATTERN = re.compile(
+    r"^\s*(and|but|also|so|then|what about|how about|what else)\b"
+    r"|\b(it|its|they|them|their|this|that|these|those|he|she|his|her|above|previous)\b",
+    re.IGNORECASE
+)
+
+
+def page_filter(question: str) -> Optional[List[int]]:
+    """Pages a question explicitly refers to ("page 12", "pages 3-5"), or None"""
+    pages = set()
+    for match in PAGE_PATTERN.finditer(question):
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) else first
+        if first > last:
+            first, last = last, first
+        if last - first + 1 > PAGE_FILTER_MAX_PAGES:
+            continue
+        pages.update(range(first, last + 1))
+    return sorted(pages) or None
+
+
+def is_follow_up(question: str) -> bool:
+    """Whether a question probably depends on the previous one: it opens with a connective or refers back with a pronoun"""
+    return bool(FOLLOW_UP_PATTERN.search(question))
+
+
+def condense_query(anchor_query: str, question: str) -> str:
+    """Standalone retrieval query for a follow-up: the question it follows up on, plus the new one"""
+    return f"{anchor_query} {question}"
+
+
+class WorkingSet:
+    """
+    Recently retrieved chunks of a chat, with their vectors
+
+    Follow-ups usually ask about what was just retrieved, so they can be
+    ranked against this set in memory instead of querying the vector store.
+
+    Args:
+        max_chunks: Chunks kept; the least recently retrieved are dropped first
+    """
+
+    def __init__(self, max_chunks: int = WORKING_SET_MAX_CHUNKS):
+        self.max_chunks = max_chunks
+        self._chunks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def add(self, chunks: List[Dict[str, Any]]) -> None:
+        """Remember retrieved chunks that carry an "embedding"; the vector is kept, not returned"""
+        for chunk in chunks:
+            embedding = chunk.pop("embedding", None)
+            if embedding is None or "id" not in chunk:
+                continue
+            self._chunks[chunk["id"]] = {"chunk": chunk, "embedding": np.asarray(embedding, dtype=np.float32)}
+            self._chunks.move_to_end(chunk["id"])
+        while len(self._chunks) > self.max_chunks:
+            self._chunks.popitem(last=False)
+
+    def search(self, query_embedding: np.ndarray, top_k: int, pages: Optional[List[int]] = None,
+               file_ids: Optional[List[str]] = None,
+               min_similarity: float = WORKING_SET_MIN_SIMILARITY) -> Optional[List[Dict[str, Any]]]:
+        """
+        Best chunks for a query, if the working set can answer it on its own
+
+        Args:
+            query_embedding: Query vector
+            top_k: Number of chunks wanted
+            pages: Optional pages the chunks must come from
+            file_ids: Optional documents the chunks must come from
+            min_similarity: Cosine similarity every returned chunk must reach
+
+        Returns:
+            list: top_k chunks in the search result format, or None if fewer
+            than top_k chunks are close enough
+        """
+        entries = [
+            entry for entry in self._chunks.values()
+            if (pages is None or entry["chunk"]["metadata"].get("page") in pages)
+            and (file_ids is None or entry["chunk"]["metadata"].get("file_id") in file_ids)
+        ]
+        if len(entries) < top_k:
+            return None
+
+        vectors = np.stack([entry["embedding"] for entry in entries])
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        query = query_embedding / max(np.linalg.norm(query_embedding), 1e-12)
+        similarity = vectors @ query
+
+        order = np.argsort(-similarity)[:top_k]
+        if similarity[order[-1]] < min_similarity:
+            return None
+
+        for i in order:
+            self._chunks.move_to_end(entries[i]["chunk"]["id"])
+        return [dict(entries[i]["chunk"], distance=float(1 - similarity[i])) for i in order]
+
+    def clear(self) -> None:
+        self._chunks.clear()
+
+
+class ConversationSession:
+    """
+    Append-only transcript of a chat about a set of documents
+
+    The prompt is laid out as the system prompt followed by the earlier
+    turns, each carrying only the retrieved chunks that were not already
+    in the conversation. Chunks stay pinned once sent, so follow-up
+    questions add a short suffix and the prefix never changes. When the
+    transcript outgrows the budget it is started over.
+
+    The session also remembers the questions asked, to turn follow-ups
+    into standalone retrieval queries, and a working set of the chunks
+    retrieved for them.
+
+    Args:
+        system_prompt: Instructions placed at the very start of the prompt
+        max_chars: Transcript size at which the conversation starts over
+    """
+
+    def __init__(self, system_prompt: str = SYSTEM_PROMPT, max_chars: int = CONVERSATION_MAX_CHARS):
+        self.system_prompt = system_prompt
+        self.max_chars = max_chars
+        self.turns: List[Dict[str, str]] = []
+        self.resets = 0
+        self.ollama_model: Optional[str] = None
+        self.ollama_context: Optional[List[int]] = None
+        self.queries: List[Dict[str, str]] = []
+        self.working_set = WorkingSet()
+        self.working_set_hits = 0
+        self._pinned: set = set()
+
+    def standalone_query(self, question: str,
+                         rewrite: Optional[Callable[[List[Dict[str, str]], str], Optional[str]]] = None,
+                         mode: str = QUERY_REWRITE_MODE) -> Tuple[str, bool]:
+        """
+        Retrieval query for a question asked in this conversation
+
+        Args:
+            question: The question as asked
+            rewrite: Function (previous queries, question) -> standalone query
+                or None, used in "llm" mode
+            mode: "heuristic", "llm" or "off"
+
+        Returns:
+            tuple: The standalone query and whether the question was a follow-up
+        """
+        if mode == "off" or not self.queries or not is_follow_up(question):
+            return question, False
+
+        if mode == "llm" and rewrite is not None:
+            rewritten = rewrite(self.queries, question)
+            if rewritten:
+                return rewritten, True
+
+        # Condense against the last standalone question, so chains of follow-ups do not pile up
+        anchor = next((query["standalone"] for query in reversed(self.queries) if not query["follow_up"]),
+                      self.queries[-1]["question"])
+        return condense_query(anchor, question), True
+
+    def remember_query(self, question: str, standalone: str, follow_up: bool = False) -> None:
+        """Record a question and the standalone query it was retrieved with"""
+        self.queries.append({"question": question, "standalone": standalone, "follow_up": follow_up})
+
+    def unseen(self, blocks: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """The (chunk ID, text) context blocks not yet sent in this conversation"""
+        return [(chunk_id, text) for chunk_id, text in blocks if chunk_id not in self._pinned]
+
+    def user_message(self, question: str, blocks: List[Tuple[str, str]]) -> str:
+        """One turn's user message: the newly retrieved context, then the question"""
+        if not blocks:
+            return f"Question: {question}"
+        context = "\n\n".join(text for _, text in blocks)
+        return f"Context:\n{context}\n\nQuestion: {question}"
+
+    def size(self) -> int:
+        """Characters in the transcript, including the system prompt"""
+        return len(self.system_prompt) + sum(len(turn["user"]) + len(turn["assistant"]) for turn in self.turns)
+
+    def fits(self, message: str) -> bool:
+        """Whether one more user message fits the budget"""
+        return self.size() + len(message) <= self.max_chars
+
+    def openai_messages(self, message: str) -> List[Dict[str, str]]:
+        """Chat messages for the next turn; everything before the last one is the previous request's prefix"""
+        messages = [{"role": "system", "content": self.system_prompt}]
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn["user"]})
+            messages.append({"role": "assistant", "content": turn["assistant"]})
+        messages.append({"role": "user", "content": message})
+        return messages
+
+    def transcript_prompt(self, message: str) -> str:
+        """The whole transcript and the next message as one prompt, for a model without cached context"""
+        parts = [f"User: {turn['user']}\n\nAssistant: {turn['assistant']}" for turn in self.turns]
+        parts.append(f"User: {message}")
+        return "\n\n".join(parts)
+
+    def record(self, chunk_ids: List[str], message: str, answer: str,
+               ollama_model: Optional[str] = None, ollama_context: Optional[List[int]] = None) -> None:
+        """
+        Append a completed turn
+
+        Args:
+            chunk_ids: IDs of the context blocks sent with this turn
+            message: The user message that was sent
+            answer: The model's answer
+            ollama_model: Ollama model that answered, if any
+            ollama_context: Context tokens Ollama returned, encoding the whole transcript
+        """
+        self.turns.append({"user": message, "assistant": answer})
+        self._pinned.update(chunk_ids)
+        if ollama_model is not None:
+            self.ollama_model = ollama_model
+            self.ollama_context = ollama_context
+        else:
+            # The Ollama tokens no longer cover the whole transcript
+            self.ollama_model = None
+            self.ollama_context = None
+
+    def clear(self) -> None:
+        """Forget everything: transcript, asked questions and working set"""
+        self.reset()
+        self.queries = []
+        self.working_set.clear()
+
+    def reset(self) -> None:
+        """Start the conversation over with an empty transcript (questions and working set are kept)"""
+        if self.turns:
+            self.resets += 1
+            logger.info(f"Conversation restarted after {len(self.turns)} turns ({self.size()} characters)")
+        self.turns = []
+        self._pinned = set()
+        self.ollama_model = None
+        self.ollama_context = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Turn count, transcript size, pinned chunks, restarts and working set use"""
+        return {
+            "turns": len(self.turns),
+            "chars": self.size(),
+            "pinned_chunks": len(self._pinned),
+            "resets": self.resets,
+            "working_set_chunks": len(self.working_set),
+            "working_set_hits": self.working_set_hits
+        }
@@ -0,0 +1,126 @@
+"""
+Near-duplicate chunk elimination at ingest time
+Uses MinHash signatures over word shingles with LSH banding
+"""
+
+import re
+import zlib
+import logging
+import numpy as np
+from typing import List, Dict, Any, Tuple
+from ..config.config import DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_SHINGLE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Tables are kept as-is: their chunks reference stored table data
+DEDUP_TYPES = ("text", "image_ocr")
+
+MERSENNE_PRIME = (1 << 31) - 1
+WORD_PATTERN = re.compile(r"\w+")
+
+class ChunkDeduplicator:
+    """Drops chunks whose text is a near-duplicate of an earlier chunk"""
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, num_perm: int = DEDUP_NUM_PERM,
+                 shingle_size: int = DEDUP_SHINGLE_SIZE, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+
+        # Products of 31-bit values stay below 2**62, so uint64 arithmetic never overflows
+        rng = np.random.RandomState(seed)
+        self.perm_a = rng.randint(1, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self.perm_b = rng.randint(0, MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self.bands, self.rows = self._choose_bands(threshold, num_perm)
+
+    def deduplicate(self, chunks: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Remove near-duplicate chunks, keeping the first occurrence
+
+        Args:
+            chunks: Content chunks in ingest order
+
+        Returns:
+            tuple: (kept chunks, stats). Kept chunks that absorbed duplicates
+            list them under "merged_sources".
+        """
+        kept = []
+        kept_signatures: List[np.ndarray] = []
+        buckets: Dict[Tuple[int, bytes], List[int]] = {}
+
+        for chunk in chunks:
+            signature = self._signature(chunk["content"]) if chunk["type"] in DEDUP_TYPES else None
+            if signature is None:
+                kept.append(chunk)
+                kept_signatures.append(None)
+                continue
+
+            band_keys = [
+                (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)
+            ]
+
+            duplicate_of = self._find_duplicate(signature, band_keys, buckets, kept_signatures)
+            if duplicate_of is not None:
+                kept[duplicate_of].setdefault("merged_sources", []).append({
+                    "page": chunk.get("page", 0),
+                    "type": chunk["type"],
+                    "source": chunk.get("source", "unknown")
+                })
+                continue
+
+            for key in band_keys:
+                buckets.setdefault(key, []).append(len(kept))
+            kept.append(chunk)
+            kept_signatures.append(signature)
+
+        removed = len(chunks) - len(kept)
+        stats = {
+            "input_chunks": len(chunks),
+            "output_chunks": len(kept),
+            "removed": removed,
+            "reduction_pct": round(100.0 * removed / len(chunks), 1) if chunks else 0.0
+        }
+        logger.info(f"Deduplication removed {removed} of {len(chunks)} chunks "
+                    f"({stats['reduction_pct']}% smaller index)")
+        return kept, stats
+
+    def _find_duplicate(self, signature, band_keys, buckets, kept_signatures):
+        """Index of an earlier kept chunk at or above the similarity threshold, if any"""
+        checked = set()
+        for key in band_keys:
+            for index in buckets.get(key, ()):
+                if index in checked:
+                    continue
+                checked.add(index)
+                if np.mean(kept_signatures[index] == signature) >= self.threshold:
+                    return index
+        return None
+
+    def _signature(self, text: str):
+        """MinHash signature of the text's word shingles, or None for empty text"""
+        words = WORD_PATTERN.findall(text.lower())
+        if not words:
+            return None
+
+        size = min(self.shingle_size, len(words))
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) & MERSENNE_PRIME for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+
+        permuted = (self.perm_a[:, None] * hashes[None, :] + self.perm_b[:, None]) % MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def _choose_bands(self, threshold: float, num_perm: int) -> Tuple[int, int]:
+        """Pick LSH bands/rows whose candidate threshold sits just below the similarity threshold"""
+        best = (num_perm, 1)
+        for rows in range(1, num_perm + 1):
+            if num_perm % rows:
+                continue
+            bands = num_perm // rows
+            if (1.0 / bands) ** (1.0 / rows) <= threshold * 0.9:
+                best = (bands, rows)
+        return best
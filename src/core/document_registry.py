@@ -0,0 +1,238 @@
+"""
+Document registry with maintained counters
+Keeps per-document chunk, page and type counts, running totals and
+document summary manifests in SQLite, so statistics and summaries never
+scan the vector store
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+from ..config.config import REGISTRY_DB_NAME
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    file_id TEXT PRIMARY KEY,
+    chunks INTEGER NOT NULL,
+    pages INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS document_types (
+    file_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    chunks INTEGER NOT NULL,
+    PRIMARY KEY (file_id, type)
+);
+CREATE TABLE IF NOT EXISTS manifests (
+    file_id TEXT PRIMARY KEY,
+    manifest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS totals (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS document_usage (
+    file_id TEXT PRIMARY KEY,
+    answers REAL NOT NULL,
+    prompt_tokens REAL NOT NULL,
+    completion_tokens REAL NOT NULL,
+    cost_usd REAL NOT NULL
+);
+"""
+
+
+class DocumentRegistry:
+    """Per-document counters and collection totals, updated on store and delete"""
+
+    def __init__(self, directory: str, filename: str = REGISTRY_DB_NAME):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, filename)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def is_empty(self) -> bool:
+        """True if no document has been registered"""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM documents LIMIT 1").fetchone() is None
+
+    def record_document(self, file_id: str, chunks: List[Dict[str, Any]],
+                        created_at: Optional[float] = None) -> None:
+        """
+        Register a document's counters, replacing any previous entry
+
+        Args:
+            file_id: Document file ID
+            chunks: Chunk metadata (only "type" and "page" are read)
+            created_at: Ingest timestamp (defaults to now)
+        """
+        type_counts: Dict[str, int] = {}
+        pages = set()
+        for chunk in chunks:
+            chunk_type = chunk.get("type", "unknown")
+            type_counts[chunk_type] = type_counts.get(chunk_type, 0) + 1
+            if chunk.get("page"):
+                pages.add(chunk["page"])
+
+        with self._lock, self._conn:
+            self._remove(file_id)
+            self._conn.execute(
+                "INSERT INTO documents (file_id, chunks, pages, created_at) VALUES (?, ?, ?, ?)",
+                (file_id, len(chunks), len(pages), created_at or time.time())
+            )
+            self._conn.executemany(
+                "INSERT INTO document_types (file_id, type, chunks) VALUES (?, ?, ?)",
+                [(file_id, chunk_type, count) for chunk_type, count in type_counts.items()]
+            )
+            self._add_total("documents", 1)
+            self._add_total("chunks", len(chunks))
+            self._add_total("pages", len(pages))
+            for chunk_type, count in type_counts.items():
+                self._add_total(f"type:{chunk_type}", count)
+
+    def remove_document(self, file_id: str) -> None:
+        """Drop a document's counters and usage and subtract them from the totals"""
+        with self._lock, self._conn:
+            self._remove(file_id)
+            self._conn.execute("DELETE FROM document_usage WHERE file_id = ?", (file_id,))
+
+    def record_usage(self, shares: Dict[str, float], usage: Dict[str, Any]) -> None:
+        """
+        Attribute one answer's LLM usage to the documents its context came from
+
+        Args:
+            shares: File ID -> fraction of the answer's context taken from it
+            usage: Usage record of the generation
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO document_usage (file_id, answers, prompt_tokens, completion_tokens, cost_usd) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT(file_id) DO UPDATE SET "
+                "answers = answers + excluded.answers, "
+                "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                "completion_tokens = completion_tokens + excluded.completion_tokens, "
+                "cost_usd = cost_usd + excluded.cost_usd",
+                [
+                    (file_id, share, share * (usage.get("prompt_tokens") or 0),
+                     share * (usage.get("completion_tokens") or 0), share * (usage.get("cost_usd") or 0))
+                    for file_id, share in shares.items()
+                ]
+            )
+
+    def get_usage(self, file_id: str) -> Dict[str, Any]:
+        """LLM usage attributed to a document (answers are fractional when context was shared)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answers, prompt_tokens, completion_tokens, cost_usd FROM document_usage WHERE file_id = ?",
+                (file_id,)
+            ).fetchone()
+        answers, prompt_tokens, completion_tokens, cost_usd = row or (0, 0, 0, 0)
+        return {
+            "answers": round(answers, 2),
+            "prompt_tokens": int(round(prompt_tokens)),
+            "completion_tokens": int(round(completion_tokens)),
+            "cost_usd": round(cost_usd, 6)
+        }
+
+    def put_manifest(self, file_id: str, manifest: Dict[str, Any]) -> None:
+        """Store a document's precomputed summary manifest"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO manifests (file_id, manifest) VALUES (?, ?)",
+                (file_id, json.dumps(manifest))
+            )
+
+    def get_manifest(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """A document's summary manifest, or None if none was stored"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT manifest FROM manifests WHERE file_id = ?", (file_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def clear(self) -> None:
+        """Remove every document and reset the totals"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.execute("DELETE FROM document_types")
+            self._conn.execute("DELETE FROM manifests")
+            self._conn.execute("DELETE FROM totals")
+            self._conn.execute("DELETE FROM document_usage")
+
+    def get_document(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Counters of one document, or None if it is not registered"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunks, pages, created_at FROM documents WHERE file_id = ?", (file_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            types = self._conn.execute(
+                "SELECT type, chunks FROM document_types WHERE file_id = ?", (file_id,)
+            ).fetchall()
+
+        return {
+            "file_id": file_id,
+            "chunks": row[0],
+            "pages": row[1],
+            "created_at": row[2],
+            "content_types": dict(types)
+        }
+
+    def list_documents(self) -> List[Dict[str, Any]]:
+        """All registered documents with their chunk counts and ingest times, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_id, chunks, created_at FROM documents ORDER BY created_at"
+            ).fetchall()
+        return [{"file_id": row[0], "chunks": row[1], "created_at": row[2]} for row in rows]
+
+    def totals(self) -> Dict[str, Any]:
+        """Collection totals, read from the maintained counters"""
+        with self._lock:
+            rows = dict(self._conn.execute("SELECT name, value FROM totals").fetchall())
+
+        return {
+            "total_chunks": rows.get("chunks", 0),
+            "unique_documents": rows.get("documents", 0),
+            "total_pages": rows.get("pages", 0),
+            "content_types": {
+                name[len("type:"):]: value
+                for name, value in rows.items()
+                if name.startswith("type:") and value
+            }
+        }
+
+    def _remove(self, file_id: str) -> None:
+        self._conn.execute("DELETE FROM manifests WHERE file_id = ?", (file_id,))
+        row = self._conn.execute(
+            "SELECT chunks, pages FROM documents WHERE file_id = ?", (file_id,)
+        ).fetchone()
+        if row is None:
+            return
+
+        for chunk_type, count in self._conn.execute(
+            "SELECT type, chunks FROM document_types WHERE file_id = ?", (file_id,)
+        ).fetchall():
+            self._add_total(f"type:{chunk_type}", -count)
+        self._add_total("documents", -1)
+        self._add_total("chunks", -row[0])
+        self._add_total("pages", -row[1])
+
+        self._conn.execute("DELETE FROM documents WHERE file_id = ?", (file_id,))
+        self._conn.execute("DELETE FROM document_types WHERE file_id = ?", (file_id,))
+
+    def _add_total(self, name: str, delta: int) -> None:
+        self._conn.execute(
+            "INSERT INTO totals (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, delta)
+        )
@@ -1,33 +1,352 @@
-import chromadb
-from chromadb.config import Settings
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import json
 import os
-from typing import List, Dict, Any
+import re
+import hashlib
+import heapq
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 import logging
-from ..config.config import EMBEDDING_MODEL, COLLECTION_NAME, EMBEDDINGS_FOLDER
+from ..config.config import (
+    EMBEDDING_MODEL, COLLECTION_NAME, EMBEDDINGS_FOLDER, CHUNK_MAX_TOKENS,
+    SEARCH_DIVERSIFY, MMR_LAMBDA, MMR_FETCH_MULTIPLIER, SEARCH_MAX_WORKERS, DEFAULT_TENANT,
+    WRITE_BATCH_BYTES, WRITE_QUEUE_DEPTH, WRITE_MAX_RETRIES, WRITE_RETRY_BACKOFF
+)
+from .table_store import TableStore
+from .document_registry import DocumentRegistry
+from .tenancy import QuotaExceededError, TenantQuota, tenant_directory
+from .resilience import backoff_delay
 
 logger = logging.getLogger(__name__)
 
+# Chroma collection names: 3-63 characters from [a-zA-Z0-9._-], starting and ending alphanumeric
+SHARD_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9._-]{1,61}[a-zA-Z0-9]$")
+SHARD_PREFIX = f"{COLLECTION_NAME}_"
+HASHED_SHARD_PREFIX = f"{COLLECTION_NAME}."
+# Re-ingests are written here first and only replace the live shard once complete
+STAGING_SHARD_PREFIX = f"{COLLECTION_NAME}-staging."
+# Written once a tenant's store has been checked for a legacy collection and unregistered shards
+LEGACY_CHECKED_MARKER = ".legacy_checked"
+
+_models: Dict[str, Any] = {}
+_models_lock = threading.Lock()
+
+
+def load_embedding_model(model_name: str = EMBEDDING_MODEL):
+    """
+    Load a SentenceTransformer once per process
+    
+    sentence-transformers (and torch) are imported here rather than at
+    module import, and every EmbeddingSystem shares the loaded weights.
+    """
+    with _models_lock:
+        if model_name not in _models:
+            from sentence_transformers import SentenceTransformer
+            started = time.perf_counter()
+            _models[model_name] = SentenceTransformer(model_name)
+            logger.info(f"Loaded embedding model {model_name} in {time.perf_counter() - started:.1f}s")
+        return _models[model_name]
+
+
+def chunk_ids(file_id: str, start: int, end: int) -> List[str]:
+    """IDs of a document's chunks in [start, end); chunk i is always <file_id>_chunk_<i>"""
+    return [f"{file_id}_chunk_{i}" for i in range(start, end)]
+
+
+def maximal_marginal_relevance(query_embedding: np.ndarray, candidate_embeddings: np.ndarray,
+                               k: int, lambda_mult: float = 0.5) -> List[int]:
+    """
+    Pick k diverse, relevant candidates with maximal marginal relevance
+
+    Args:
+        query_embedding: Query vector
+        candidate_embeddings: Candidate vectors, one per row
+        k: Number of candidates to select
+        lambda_mult: 1.0 ranks purely by relevance, 0.0 purely by diversity
+
+    Returns:
+        Indices of the selected candidates, in selection order
+    """
+    if len(candidate_embeddings) == 0:
+        return []
+
+    candidates = candidate_embeddings / np.maximum(np.linalg.norm(candidate_embeddings, axis=1, keepdims=True), 1e-12)
+    query = query_embedding / max(np.linalg.norm(query_embedding), 1e-12)
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        # Track each candidate's highest similarity to anything already selected
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+
+    return selected
+
+
 class EmbeddingSystem:
-    def __init__(self, persist_directory=EMBEDDINGS_FOLDER):
-        self.persist_directory = persist_directory
-        self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+    """
+    Embeddings and vector search over per-document shards
+    
+    Every document lives in its own Chroma collection, so a per-document
+    query only touches that document's HNSW index, a multi-document query
+    scatters to the chosen shards and merges their top-k, and deleting a
+    document drops its collection.
+    
+    Each tenant has its own Chroma database and table store under the
+    persist directory, so searches and stats never touch another tenant's
+    data, and its own document/chunk quota enforced by evicting its
+    oldest documents.
+    """
+    
+    def __init__(self, persist_directory=EMBEDDINGS_FOLDER, tenant_id: str = DEFAULT_TENANT,
+                 quota: Optional[TenantQuota] = None):
+        self.tenant_id = tenant_id
+        self.persist_directory = tenant_directory(persist_directory, tenant_id)
+        self.quota = quota or TenantQuota()
+        self.table_store = TableStore(os.path.join(self.persist_directory, "tables"))
+        self.registry = DocumentRegistry(self.persist_directory)
         
-        # Initialize ChromaDB
-        self.client = chromadb.PersistentClient(
-            path=persist_directory,
-            settings=Settings(anonymized_telemetry=False)
-        )
+        # The model and the Chroma client load on first use; stats and summaries only need the registry
+        self._client = None
+        self._client_lock = threading.RLock()
+        self._shards = {}
+        self._ndarray_writes = True
+        
+        # A store written before the registry existed is opened now so it can be registered;
+        # that check runs once per store, so a tenant without documents does not open Chroma here
+        self._legacy_marker = os.path.join(self.persist_directory, LEGACY_CHECKED_MARKER)
+        if (not os.path.exists(self._legacy_marker) and self.registry.is_empty()
+                and os.path.exists(os.path.join(self.persist_directory, "chroma.sqlite3"))):
+            self.client
+        
+        logger.info(f"Embedding system initialized with model: {EMBEDDING_MODEL} for tenant '{tenant_id}'")
+    
+    @property
+    def embedding_model(self):
+        """Shared SentenceTransformer, loaded on first use"""
+        return load_embedding_model(EMBEDDING_MODEL)
+    
+    @property
+    def client(self):
+        """Chroma client for the tenant's store, opened on first use"""
+        with self._client_lock:
+            if self._client is None:
+                import chromadb
+                from chromadb.config import Settings
+                
+                self._client = chromadb.PersistentClient(
+                    path=self.persist_directory,
+                    settings=Settings(anonymized_telemetry=False)
+                )
+                if not os.path.exists(self._legacy_marker):
+                    self._check_legacy_store()
+            return self._client
+    
+    def _shard_name(self, file_id: str) -> str:
+        """Collection name of a document's shard"""
+        name = f"{SHARD_PREFIX}{file_id}"
+        if SHARD_NAME_PATTERN.match(name):
+            return name
+        # IDs that are not valid collection names are hashed; the shard metadata keeps the real ID
+        return f"{HASHED_SHARD_PREFIX}{hashlib.sha1(file_id.encode('utf-8')).hexdigest()}"
+    
+    def _get_shard(self, file_id: str, create: bool = False):
+        """
+        Collection holding a document's chunks, or None if it does not exist
         
-        # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name=COLLECTION_NAME,
-            metadata={"hnsw:space": "cosine"}
+        Handles are cached, but another instance (GC, quota eviction, another
+        session) may drop the collection behind this one's back: writes always
+        re-resolve the collection, and readers call _evict_shard on failure.
+        """
+        name = self._shard_name(file_id)
+        if create:
+            self._shards[name] = self.client.get_or_create_collection(
+                name=name,
+                metadata={"hnsw:space": "cosine", "file_id": file_id, "created_at": time.time()}
+            )
+        elif name not in self._shards:
+            try:
+                self._shards[name] = self.client.get_collection(name=name)
+            except Exception:
+                return None
+        return self._shards[name]
+    
+    def _staging_shard_name(self, file_id: str) -> str:
+        """Collection name a re-ingest of a document is written to before it replaces the shard"""
+        return f"{STAGING_SHARD_PREFIX}{hashlib.sha1(file_id.encode('utf-8')).hexdigest()}"
+    
+    def _create_staging_shard(self, file_id: str):
+        """Empty staging collection for a re-ingest; left over from a crashed attempt, it is started over"""
+        name = self._staging_shard_name(file_id)
+        self._drop_collection(name)
+        return self.client.create_collection(
+            name=name,
+            metadata={"hnsw:space": "cosine", "file_id": file_id, "created_at": time.time()}
         )
+    
+    def _swap_in_staging_shard(self, file_id: str, staging) -> None:
+        """Replace a document's live shard with its fully written staging shard"""
+        name = self._shard_name(file_id)
+        self._evict_shard(file_id)
+        self._drop_collection(name)
+        staging.modify(name=name)
+        self._shards[name] = staging
+    
+    def drop_staging_shards(self, older_than: float) -> int:
+        """
+        Drop staging shards left by re-ingests that crashed before swapping them in
+        
+        Args:
+            older_than: Only staging shards created before this timestamp are dropped
+            
+        Returns:
+            int: Number of staging shards dropped
+        """
+        dropped = 0
+        for collection in self.client.list_collections():
+            name = getattr(collection, "name", collection)
+            if not name.startswith(STAGING_SHARD_PREFIX):
+                continue
+            if (self.client.get_collection(name=name).metadata or {}).get("created_at", 0) < older_than:
+                self._drop_collection(name)
+                dropped += 1
+        return dropped
+    
+    def _drop_collection(self, name: str) -> None:
+        """Delete a collection if it exists"""
+        try:
+            self.client.delete_collection(name)
+        except Exception:
+            pass
+    
+    def _evict_shard(self, file_id: str) -> None:
+        """Forget a cached shard handle so the next _get_shard looks the collection up again"""
+        self._shards.pop(self._shard_name(file_id), None)
+    
+    def _list_shard_file_ids(self) -> List[str]:
+        """File IDs of all documents that have a shard"""
+        file_ids = []
+        for collection in self.client.list_collections():
+            # Newer Chroma versions return names, older ones Collection objects
+            name = getattr(collection, "name", collection)
+            if name.startswith(SHARD_PREFIX):
+                file_ids.append(name[len(SHARD_PREFIX):])
+            elif name.startswith(HASHED_SHARD_PREFIX):
+                file_ids.append(self.client.get_collection(name=name).metadata["file_id"])
+        return file_ids
+    
+    def list_shards(self) -> List[Dict[str, Any]]:
+        """File IDs and creation times of all document shards"""
+        shards = []
+        for file_id in self._list_shard_file_ids():
+            shard = self._get_shard(file_id)
+            if shard is not None:
+                shards.append({"file_id": file_id, "created_at": (shard.metadata or {}).get("created_at", 0)})
+        return shards
+    
+    def _check_legacy_store(self) -> None:
+        """Migrate and register data written by earlier versions, then mark the store as checked"""
+        migrated = self._migrate_legacy_collection()
+        if self.registry.is_empty():
+            self._rebuild_registry()
+        if migrated:
+            with open(self._legacy_marker, "w") as f:
+                f.write(str(time.time()))
+    
+    def _migrate_legacy_collection(self) -> bool:
+        """
+        Move chunks from the former single collection into per-document shards
+        
+        Returns:
+            bool: False if a legacy collection exists and could not be migrated
+        """
+        names = [getattr(collection, "name", collection) for collection in self.client.list_collections()]
+        if COLLECTION_NAME not in names:
+            return True
+        
+        try:
+            legacy = self.client.get_collection(name=COLLECTION_NAME)
+            file_ids = {metadata.get("file_id") for metadata in legacy.get(include=["metadatas"])["metadatas"]}
+            
+            for file_id in filter(None, file_ids):
+                results = legacy.get(where={"file_id": file_id},
+                                     include=["embeddings", "documents", "metadatas"])
+                self._get_shard(file_id, create=True).add(
+                    ids=results["ids"],
+                    embeddings=results["embeddings"],
+                    documents=results["documents"],
+                    metadatas=results["metadatas"]
+                )
+            
+            self.client.delete_collection(COLLECTION_NAME)
+            logger.info(f"Migrated {len(file_ids)} documents from '{COLLECTION_NAME}' into per-document shards")
+            return True
+        except Exception as e:
+            logger.error(f"Error migrating legacy collection: {str(e)}")
+            return False
+    
+    def _rebuild_registry(self) -> None:
+        """Register shards that predate the registry (reads chunk metadata once)"""
+        for file_id in self._list_shard_file_ids():
+            try:
+                shard = self._get_shard(file_id)
+                metadatas = shard.get(include=["metadatas"])["metadatas"]
+                self.registry.record_document(file_id, metadatas, (shard.metadata or {}).get("created_at", 0))
+            except Exception as e:
+                logger.error(f"Error registering document {file_id}: {str(e)}")
+    
+    def fits_quota(self, incoming_chunks: int) -> bool:
+        """
+        Whether a document of this size fits in the tenant's quota, evicting older documents if needed
+        
+        Args:
+            incoming_chunks: Chunk count of the document about to be stored
+            
+        Returns:
+            bool: False if the document alone exceeds the quota
+        """
+        try:
+            self.quota.plan_eviction([], incoming_chunks)
+            return True
+        except QuotaExceededError as e:
+            logger.error(str(e))
+            return False
+    
+    def enforce_quota(self, stored_file_id: str) -> bool:
+        """
+        Evict the tenant's oldest documents until a just-stored document fits in the quota
+        
+        Runs after the store commits, so a failed ingest never evicts anything.
         
-        logger.info(f"Embedding system initialized with model: {EMBEDDING_MODEL}")
+        Args:
+            stored_file_id: The document that was just stored; never evicted
+            
+        Returns:
+            bool: False if eviction failed
+        """
+        try:
+            documents = self.registry.list_documents()
+            stored = next((document for document in documents if document["file_id"] == stored_file_id), None)
+            others = [document for document in documents if document["file_id"] != stored_file_id]
+            for file_id in self.quota.plan_eviction(others, stored["chunks"] if stored else 0):
+                logger.info(f"Evicting document {file_id} to stay within tenant '{self.tenant_id}' quota")
+                self.delete_document(file_id)
+            
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error enforcing quota for tenant '{self.tenant_id}': {str(e)}")
+            return False
     
     def generate_embeddings(self, texts: List[str]) -> np.ndarray:
         """
@@ -47,6 +366,16 @@ class EmbeddingSystem:
             logger.error(f"Error generating embeddings: {str(e)}")
             raise
     
+    def count_tokens(self, text: str) -> int:
+        """Count tokens exactly as the embedding model's tokenizer sees them (without special tokens)"""
+        return len(self.embedding_model.tokenizer.encode(text, add_special_tokens=False))
+    
+    @property
+    def max_tokens(self) -> int:
+        """Largest chunk, in tokens, that the embedding model encodes without truncation"""
+        special_tokens = self.embedding_model.tokenizer.num_special_tokens_to_add(pair=False)
+        return min(CHUNK_MAX_TOKENS, self.embedding_model.max_seq_length - special_tokens)
+    
     def store_document_chunks(self, file_id: str, chunks: List[Dict[str, Any]]) -> bool:
         """
         Store document chunks with embeddings in ChromaDB
@@ -58,16 +387,17 @@ class EmbeddingSystem:
         Returns:
             bool: Success status
         """
+        previous = None
+        new_tables = []
         try:
             # Extract texts for embedding
             texts = [chunk["content"] for chunk in chunks]
             
-            # Generate embeddings
-            embeddings = self.generate_embeddings(texts)
-            
             # Prepare data for ChromaDB
-            ids = [f"{file_id}_chunk_{i}" for i in range(len(chunks))]
+            ids = chunk_ids(file_id, 0, len(chunks))
+            previous = self.registry.get_document(file_id)
             metadatas = []
+            stored_tables = set()
             
             for i, chunk in enumerate(chunks):
                 metadata = {
@@ -77,87 +407,340 @@ class EmbeddingSystem:
                     "page": chunk.get("page", 0),
                     "source": chunk.get("source", "unknown")
                 }
+                if chunk.get("section"):
+                    metadata["section"] = chunk["section"]
+                if chunk.get("merged_sources"):
+                    metadata["merged_sources"] = json.dumps(chunk["merged_sources"])
                 
                 # Add type-specific metadata
                 if chunk["type"] == "table":
+                    # Table rows go to the side store once; chunks only reference them
+                    table_id = TableStore.make_table_id(file_id, chunk.get("page", 0), chunk.get("table_index", 0))
+                    if table_id not in stored_tables:
+                        if not self.table_store.exists(table_id):
+                            new_tables.append(table_id)
+                        self.table_store.put(table_id, chunk.get("table_data", []), chunk.get("columns", []))
+                        stored_tables.add(table_id)
+                    metadata["table_id"] = table_id
                     metadata["columns"] = json.dumps(chunk.get("columns", []))
-                    metadata["table_data"] = json.dumps(chunk.get("table_data", []))
                 elif chunk["type"] == "image_ocr":
                     metadata["image_info"] = json.dumps(chunk.get("image_info", {}))
                 
                 metadatas.append(metadata)
             
-            # Store in ChromaDB
-            self.collection.add(
-                embeddings=embeddings.tolist(),
-                documents=texts,
-                metadatas=metadatas,
-                ids=ids
-            )
+            # A re-ingest goes to a staging shard, so the stored version stays searchable and
+            # intact until the new one is complete; a first ingest writes the shard directly
+            shard = self._create_staging_shard(file_id) if previous else self._get_shard(file_id, create=True)
+            
+            # Embed and write in byte-budgeted batches; the writer thread stores batch N
+            # while batch N+1 is embedded, and a bounded queue stalls embedding when writes lag
+            batches = self._plan_write_batches(texts, metadatas, shard)
+            pending = queue.Queue(maxsize=WRITE_QUEUE_DEPTH)
+            errors = []
+            
+            def write_batches():
+                while True:
+                    item = pending.get()
+                    if item is None:
+                        return
+                    if errors:
+                        continue
+                    start, end, embeddings = item
+                    try:
+                        self._write_batch(shard, ids[start:end], embeddings, texts[start:end], metadatas[start:end])
+                    except Exception as e:
+                        errors.append(e)
+            
+            writer = threading.Thread(target=write_batches, name=f"chunk-writer-{file_id}", daemon=True)
+            writer.start()
+            try:
+                for start, end in batches:
+                    if errors:
+                        break
+                    pending.put((start, end, self.generate_embeddings(texts[start:end])))
+            finally:
+                pending.put(None)
+                writer.join()
+            
+            if errors:
+                raise errors[0]
+            
+            if previous:
+                self._swap_in_staging_shard(file_id, shard)
+            
+            self.registry.record_document(file_id, metadatas, (shard.metadata or {}).get("created_at"))
             
             logger.info(f"Stored {len(chunks)} chunks for file {file_id}")
             return True
             
         except Exception as e:
             logger.error(f"Error storing document chunks: {str(e)}")
+            # Roll back only what this attempt wrote, so a partially written document is never
+            # searchable and a failed re-ingest leaves the stored version as it was
+            if previous:
+                self._drop_collection(self._staging_shard_name(file_id))
+                for table_id in new_tables:
+                    self.table_store.delete(table_id)
+            else:
+                self.delete_document(file_id)
             return False
     
-    def search_similar_chunks(self, query: str, file_id: str = None, top_k: int = 5) -> List[Dict[str, Any]]:
+    def _plan_write_batches(self, texts: List[str], metadatas: List[Dict[str, Any]], shard) -> List[tuple]:
+        """Split chunk indices into [start, end) batches that stay under the write byte budget"""
+        vector_bytes = 4 * self.embedding_model.get_sentence_embedding_dimension()
+        max_batch = self.client.get_max_batch_size() if hasattr(self.client, "get_max_batch_size") else 5000
+        
+        batches = []
+        start, used = 0, 0
+        for i, (text, metadata) in enumerate(zip(texts, metadatas)):
+            size = vector_bytes + len(text.encode("utf-8")) + len(json.dumps(metadata))
+            if i > start and (used + size > WRITE_BATCH_BYTES or i - start >= max_batch):
+                batches.append((start, i))
+                start, used = i, 0
+            used += size
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        
+        return batches
+    
+    def _write_batch(self, shard, ids: List[str], embeddings: np.ndarray,
+                     documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """
+        Upsert one batch, retrying with backoff; IDs are deterministic so retries are idempotent
+        
+        Raises:
+            Exception: The last write error once the retries are used up
+        """
+        def upsert():
+            shard.upsert(
+                # Chroma accepts ndarrays directly; older clients need plain lists
+                embeddings=embeddings if self._ndarray_writes else embeddings.tolist(),
+                documents=documents,
+                metadatas=metadatas,
+                ids=ids
+            )
+        
+        for attempt in range(WRITE_MAX_RETRIES + 1):
+            try:
+                try:
+                    upsert()
+                except (TypeError, ValueError) as e:
+                    if not self._ndarray_writes:
+                        raise
+                    # Same attempt with lists, so the fallback never uses up a retry
+                    logger.warning(f"Vector store rejected ndarray embeddings, falling back to lists: {str(e)}")
+                    self._ndarray_writes = False
+                    upsert()
+                return
+            except (TypeError, ValueError):
+                # Rejected as lists too: the batch itself is invalid, retrying will not help
+                raise
+            except Exception as e:
+                if attempt == WRITE_MAX_RETRIES:
+                    raise
+                # Jittered, so writers that failed together do not retry together
+                delay = backoff_delay(attempt, base=WRITE_RETRY_BACKOFF, cap=WRITE_RETRY_BACKOFF * 2 ** WRITE_MAX_RETRIES)
+                logger.warning(f"Batch write failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+        
+        # Only reachable without a single attempt; a batch must never pass as stored unwritten
+        raise RuntimeError(f"Batch of {len(ids)} chunks was not written")
+    
+    def search_similar_chunks(self, query: str, file_id: str = None, top_k: int = 5,
+                              diversify: bool = SEARCH_DIVERSIFY, mmr_lambda: float = MMR_LAMBDA,
+                              file_ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+                              query_embedding: Optional[np.ndarray] = None,
+                              keep_embeddings: bool = False) -> List[Dict[str, Any]]:
         """
         Search for similar chunks based on query
         
         Args:
             query: Search query
-            file_id: Optional file ID to limit search
+            file_id: Optional file ID to limit search to one document
             top_k: Number of top results to return
+            diversify: Re-rank an over-fetched candidate set with maximal marginal relevance
+            mmr_lambda: Trade-off between relevance (1.0) and diversity (0.0) when diversifying
+            file_ids: Optional list of file IDs to search across (ignored if file_id is given)
+            where: Optional Chroma metadata filter, e.g. {"page": 12}
+            query_embedding: Precomputed embedding of the query
+            keep_embeddings: Return each chunk's vector under "embedding"
             
         Returns:
             List of similar chunks with metadata
         """
         try:
             # Generate query embedding
-            query_embedding = self.generate_embeddings([query])[0]
+            if query_embedding is None:
+                query_embedding = self.generate_embeddings([query])[0]
             
-            # Prepare where clause for filtering
-            where_clause = {}
             if file_id:
-                where_clause["file_id"] = file_id
+                targets = [file_id]
+            elif file_ids is not None:
+                targets = list(file_ids)
+            else:
+                targets = self._list_shard_file_ids()
+            
+            shards = [(target, shard) for target, shard in ((target, self._get_shard(target)) for target in targets)
+                      if shard is not None]
+            if not shards:
+                return []
             
-            # Search in ChromaDB
-            results = self.collection.query(
-                query_embeddings=[query_embedding.tolist()],
-                n_results=top_k,
-                where=where_clause if where_clause else None
+            n_results = top_k * MMR_FETCH_MULTIPLIER if diversify else top_k
+            include = ["documents", "metadatas", "distances"]
+            if diversify or keep_embeddings:
+                include.append("embeddings")
+            
+            # Scatter the query to every shard, then gather the best candidates overall
+            def query_shard(target_and_shard):
+                return self._query_shard_safely(*target_and_shard, query_embedding, n_results, include, where)
+            
+            if len(shards) == 1:
+                shard_results = [query_shard(shards[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=min(SEARCH_MAX_WORKERS, len(shards))) as pool:
+                    shard_results = list(pool.map(query_shard, shards))
+            
+            candidates = heapq.nsmallest(
+                n_results,
+                (candidate for results in shard_results for candidate in results),
+                key=lambda candidate: candidate["distance"]
             )
             
-            # Format results
-            similar_chunks = []
-            if results["documents"] and results["documents"][0]:
-                for i in range(len(results["documents"][0])):
-                    chunk_data = {
-                        "content": results["documents"][0][i],
-                        "metadata": results["metadatas"][0][i],
-                        "distance": results["distances"][0][i] if results["distances"] else 0,
-                        "id": results["ids"][0][i]
-                    }
-                    
-                    # Parse JSON metadata
-                    if "columns" in chunk_data["metadata"]:
-                        chunk_data["metadata"]["columns"] = json.loads(chunk_data["metadata"]["columns"])
-                    if "table_data" in chunk_data["metadata"]:
-                        chunk_data["metadata"]["table_data"] = json.loads(chunk_data["metadata"]["table_data"])
-                    if "image_info" in chunk_data["metadata"]:
-                        chunk_data["metadata"]["image_info"] = json.loads(chunk_data["metadata"]["image_info"])
-                    
-                    similar_chunks.append(chunk_data)
+            if diversify and candidates:
+                embeddings = [c["embedding"] if keep_embeddings else c.pop("embedding") for c in candidates]
+                order = maximal_marginal_relevance(query_embedding, np.asarray(embeddings), top_k, mmr_lambda)
+                similar_chunks = [candidates[i] for i in order]
+            else:
+                similar_chunks = candidates[:top_k]
             
-            logger.info(f"Found {len(similar_chunks)} similar chunks for query")
+            logger.info(f"Found {len(similar_chunks)} similar chunks for query across {len(shards)} documents")
             return similar_chunks
             
         except Exception as e:
             logger.error(f"Error searching similar chunks: {str(e)}")
             return []
     
+    def check_search(self) -> int:
+        """
+        Query every shard once, raising on the first failure instead of skipping the shard
+        
+        Unlike search_similar_chunks, which degrades to fewer or no results,
+        this tells whether vector search actually works (used by warm-up).
+        
+        Returns:
+            int: Number of shards queried; 0 when the tenant has no documents
+        """
+        query_embedding = self.generate_embeddings(["warm-up"])[0]
+        file_ids = self._list_shard_file_ids()
+        for file_id in file_ids:
+            shard = self._get_shard(file_id)
+            if shard is None:
+                raise RuntimeError(f"Shard of document {file_id} could not be opened")
+            self._query_shard(shard, query_embedding, 1, ["documents", "metadatas", "distances"])
+        return len(file_ids)
+    
+    def _query_shard_safely(self, file_id: str, shard, query_embedding: np.ndarray, n_results: int,
+                            include: List[str], where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Top candidates from one shard; a failing shard yields no candidates instead of failing the search
+        
+        A cached handle whose collection was dropped elsewhere is looked up
+        once more before the shard is skipped.
+        """
+        try:
+            return self._query_shard(shard, query_embedding, n_results, include, where)
+        except Exception as e:
+            self._evict_shard(file_id)
+            shard = self._get_shard(file_id)
+            if shard is None:
+                logger.info(f"Shard of document {file_id} no longer exists, skipping it")
+                return []
+            try:
+                return self._query_shard(shard, query_embedding, n_results, include, where)
+            except Exception as retry_error:
+                self._evict_shard(file_id)
+                logger.warning(f"Skipping shard of document {file_id} in search: {str(retry_error)} (first: {str(e)})")
+                return []
+    
+    def _query_shard(self, shard, query_embedding: np.ndarray, n_results: int, include: List[str],
+                     where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Top candidates from a single shard"""
+        results = shard.query(
+            query_embeddings=[query_embedding.tolist()],
+            n_results=max(1, min(n_results, shard.count())),
+            where=where,
+            include=include
+        )
+        
+        candidates = []
+        if results["documents"] and results["documents"][0]:
+            for i in range(len(results["documents"][0])):
+                candidate = {
+                    "content": results["documents"][0][i],
+                    "metadata": results["metadatas"][0][i],
+                    "distance": results["distances"][0][i] if results["distances"] else 0,
+                    "id": results["ids"][0][i]
+                }
+                if "embeddings" in include:
+                    candidate["embedding"] = results["embeddings"][0][i]
+                
+                self._parse_metadata(candidate["metadata"])
+                
+                candidates.append(candidate)
+        
+        return candidates
+    
+    def _parse_metadata(self, metadata: Dict[str, Any]) -> None:
+        """Decode JSON-encoded metadata fields in place"""
+        if "columns" in metadata:
+            metadata["columns"] = json.loads(metadata["columns"])
+        if "image_info" in metadata:
+            metadata["image_info"] = json.loads(metadata["image_info"])
+        if "merged_sources" in metadata:
+            metadata["merged_sources"] = json.loads(metadata["merged_sources"])
+        # Chunks stored before the table side store carry the table inline
+        if "table_data" in metadata:
+            metadata["table_data"] = json.loads(metadata["table_data"])
+    
+    def get_table(self, table_id: str) -> Dict[str, Any]:
+        """
+        Load a table from the side store
+        
+        Args:
+            table_id: Table ID from chunk metadata
+            
+        Returns:
+            dict with "columns" and "data", or None if not found
+        """
+        return self.table_store.get(table_id)
+    
+    def get_document_manifest(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Precomputed summary of a document, merged with its registry counters
+        
+        Args:
+            file_id: Document file ID
+            
+        Returns:
+            dict with pages, chunk counts by type, samples, ingest report and LLM usage, or None
+        """
+        document = self.registry.get_document(file_id)
+        if document is None:
+            return None
+        
+        manifest = self.registry.get_manifest(file_id) or {}
+        manifest.update({
+            "total_chunks": document["chunks"],
+            "total_pages": document["pages"],
+            "content_types": document["content_types"],
+            "usage": self.registry.get_usage(file_id)
+        })
+        return manifest
+    
+    def save_document_manifest(self, file_id: str, manifest: Dict[str, Any]) -> None:
+        """Store a document's summary manifest (samples, ingest timings, dedup stats)"""
+        self.registry.put_manifest(file_id, manifest)
+    
     def get_document_chunks(self, file_id: str) -> List[Dict[str, Any]]:
         """
         Get all chunks for a specific document
@@ -169,9 +752,11 @@ class EmbeddingSystem:
             List of document chunks
         """
         try:
-            results = self.collection.get(
-                where={"file_id": file_id}
-            )
+            shard = self._get_shard(file_id)
+            if shard is None:
+                return []
+            
+            results = shard.get()
             
             chunks = []
             if results["documents"]:
@@ -182,19 +767,14 @@ class EmbeddingSystem:
                         "id": results["ids"][i]
                     }
                     
-                    # Parse JSON metadata
-                    if "columns" in chunk_data["metadata"]:
-                        chunk_data["metadata"]["columns"] = json.loads(chunk_data["metadata"]["columns"])
-                    if "table_data" in chunk_data["metadata"]:
-                        chunk_data["metadata"]["table_data"] = json.loads(chunk_data["metadata"]["table_data"])
-                    if "image_info" in chunk_data["metadata"]:
-                        chunk_data["metadata"]["image_info"] = json.loads(chunk_data["metadata"]["image_info"])
+                    self._parse_metadata(chunk_data["metadata"])
                     
                     chunks.append(chunk_data)
             
             return chunks
             
         except Exception as e:
+            self._evict_shard(file_id)
             logger.error(f"Error getting document chunks: {str(e)}")
             return []
     
@@ -209,14 +789,16 @@ class EmbeddingSystem:
             bool: Success status
         """
         try:
-            # Get all chunk IDs for the document
-            results = self.collection.get(
-                where={"file_id": file_id}
-            )
+            # Dropping the shard removes every chunk without reading them first;
+            # looked up afresh, the cached handle may be stale
+            self._evict_shard(file_id)
+            if self._get_shard(file_id) is not None:
+                self.client.delete_collection(self._shard_name(file_id))
+                logger.info(f"Dropped shard for file {file_id}")
+            self._evict_shard(file_id)
             
-            if results["ids"]:
-                self.collection.delete(ids=results["ids"])
-                logger.info(f"Deleted {len(results['ids'])} chunks for file {file_id}")
+            self.table_store.delete_document(file_id)
+            self.registry.remove_document(file_id)
             
             return True
             
@@ -232,25 +814,12 @@ class EmbeddingSystem:
             Dictionary with collection statistics
         """
         try:
-            count = self.collection.count()
-            
-            # Get unique file IDs
-            results = self.collection.get()
-            file_ids = set()
-            if results["metadatas"]:
-                for metadata in results["metadatas"]:
-                    if "file_id" in metadata:
-                        file_ids.add(metadata["file_id"])
-            
-            return {
-                "total_chunks": count,
-                "unique_documents": len(file_ids),
-                "file_ids": list(file_ids)
-            }
+            # Maintained counters: constant time regardless of collection size
+            return self.registry.totals()
             
         except Exception as e:
             logger.error(f"Error getting collection stats: {str(e)}")
-            return {"total_chunks": 0, "unique_documents": 0, "file_ids": []}
+            return {"total_chunks": 0, "unique_documents": 0, "total_pages": 0, "content_types": {}}
     
     def clear_collection(self) -> bool:
         """
@@ -260,12 +829,13 @@ class EmbeddingSystem:
             bool: Success status
         """
         try:
-            # Delete the collection and recreate it
-            self.client.delete_collection(COLLECTION_NAME)
-            self.collection = self.client.create_collection(
-                name=COLLECTION_NAME,
-                metadata={"hnsw:space": "cosine"}
-            )
+            # Drop every document shard
+            for file_id in self._list_shard_file_ids():
+                self.client.delete_collection(self._shard_name(file_id))
+            self._shards = {}
+            
+            self.table_store.clear()
+            self.registry.clear()
             
             logger.info("Collection cleared successfully")
             return True
@@ -0,0 +1,144 @@
+"""
+Background garbage collection of orphaned document data
+Reconciles a tenant's uploaded PDFs, vector shards, document registry and
+table store, removing whatever no longer belongs to a live document
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional
+from ..config.config import GC_INTERVAL_SECONDS, GC_GRACE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_collectors: Dict[str, "GarbageCollector"] = {}
+_collectors_lock = threading.Lock()
+
+
+def directory_size(path: str) -> int:
+    """Total size in bytes of the files under a directory, skipping other tenants' folders"""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        if root == path and "tenants" in dirs:
+            dirs.remove("tenants")
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class GarbageCollector:
+    """
+    Reconciles uploads, vector shards, the registry and the table store
+
+    A document is live while it has a registry entry, whatever happens
+    to its uploaded PDF: upload retention and quota eviction never take
+    its vectors with them. Collected are PDFs that were never ingested,
+    shards the registry does not know, registry entries whose shard is
+    gone, staging shards of abandoned re-ingests, and tables of documents
+    that no longer exist. Items younger than the grace period are left
+    alone so in-flight uploads and ingests are never touched.
+    """
+
+    def __init__(self, embedding_system, uploader,
+                 interval: float = GC_INTERVAL_SECONDS, grace_period: float = GC_GRACE_SECONDS):
+        self.embedding_system = embedding_system
+        self.uploader = uploader
+        self.interval = interval
+        self.grace_period = grace_period
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def collect(self) -> Dict[str, Any]:
+        """
+        Run one reconciliation pass
+
+        Returns:
+            dict: Counts of removed items and reclaimed bytes
+        """
+        started = time.time()
+        cutoff = started - self.grace_period
+        report = {"orphan_uploads": 0, "orphan_documents": 0, "orphan_staging_shards": 0, "orphan_tables": 0,
+                  "reclaimed_bytes": 0}
+        index_bytes_before = directory_size(self.embedding_system.persist_directory)
+
+        try:
+            uploads = {record["file_id"]: record for record in self.uploader.index.list()}
+            registered = {doc["file_id"]: doc for doc in self.embedding_system.registry.list_documents()}
+            shards = {shard["file_id"]: shard for shard in self.embedding_system.list_shards()}
+
+            # Uploaded PDFs that never became a document
+            for file_id, record in uploads.items():
+                if file_id not in registered and file_id not in shards and record["uploaded_at"] < cutoff:
+                    if self.uploader.delete_file(file_id):
+                        report["reclaimed_bytes"] += record["size"]
+                    report["orphan_uploads"] += 1
+
+            # Leftovers of interrupted uploads
+            for entry in os.scandir(self.uploader.incoming_folder):
+                stat = entry.stat()
+                if entry.is_file() and stat.st_mtime < cutoff:
+                    os.remove(entry.path)
+                    report["reclaimed_bytes"] += stat.st_size
+
+            # Shards the registry never recorded, and registry entries whose shard is gone
+            for file_id in set(registered) ^ set(shards):
+                created_at = (registered.get(file_id) or shards.get(file_id))["created_at"]
+                if created_at < cutoff:
+                    self.embedding_system.delete_document(file_id)
+                    report["orphan_documents"] += 1
+
+            # Re-ingests that never finished
+            report["orphan_staging_shards"] = self.embedding_system.drop_staging_shards(cutoff)
+
+            # Tables left behind by documents that no longer exist
+            live = {doc["file_id"] for doc in self.embedding_system.registry.list_documents()}
+            for file_id, usage in self.embedding_system.table_store.list_documents().items():
+                if file_id not in live and usage["modified_at"] < cutoff:
+                    report["orphan_tables"] += self.embedding_system.table_store.delete_document(file_id)
+
+            report["reclaimed_bytes"] += max(0, index_bytes_before - directory_size(self.embedding_system.persist_directory))
+
+        except Exception as e:
+            logger.error(f"Error collecting garbage: {str(e)}")
+            report["error"] = str(e)
+
+        report["duration_s"] = round(time.time() - started, 3)
+        report["finished_at"] = time.time()
+        self.last_report = report
+        logger.info(f"Garbage collection for tenant '{self.uploader.tenant_id}': {report}")
+        return report
+
+    def start(self) -> None:
+        """Run collection passes in a daemon thread every ``interval`` seconds"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="garbage-collector", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread after its current pass"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.collect()
+
+
+def start_garbage_collector(tenant_id: str, embedding_system, uploader) -> GarbageCollector:
+    """Start the tenant's background collector once per process and return it"""
+    with _collectors_lock:
+        collector = _collectors.get(tenant_id)
+        if collector is None:
+            collector = GarbageCollector(embedding_system, uploader)
+            collector.start()
+            _collectors[tenant_id] = collector
+        return collector
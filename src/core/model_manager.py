@@ -4,14 +4,122 @@ Supports OpenAI GPT and Llama 3 via Ollama
 """
 
 import os
+import json
+import time
+import uuid
 import logging
+import threading
 import requests
-from typing import Optional, Dict, Any
-from openai import OpenAI
-import ollama
+from typing import Optional, Dict, Any, List, Tuple, Callable
+from ..config.config import (
+    OLLAMA_HOST, OLLAMA_KEEP_ALIVE, OLLAMA_NUM_CTX_BUCKETS, OLLAMA_NUM_PREDICT,
+    OLLAMA_CHARS_PER_TOKEN, OLLAMA_NUM_THREAD, ROUTER_FALLBACK_MODEL, LLM_DEADLINE_SECONDS, OPENAI_BASE_URL
+)
+from .model_router import get_model_router
+from .provider_scheduler import get_provider_scheduler, request_key
+from .resilience import Deadline, call_with_retries, get_breaker, get_breaker_status, remaining_time
+from .usage import UsageLedger, make_usage
 
 logger = logging.getLogger(__name__)
 
+# Local model state is per Ollama server, so it is shared by every session in the process
+_ollama_client = None
+_num_ctx: Dict[str, int] = {}
+_pulls: Dict[str, Dict[str, Any]] = {}
+_ollama_lock = threading.Lock()
+
+
+def ollama_url(path: str) -> str:
+    """URL of an Ollama API endpoint on the configured host"""
+    host = OLLAMA_HOST if "://" in OLLAMA_HOST else f"http://{OLLAMA_HOST}"
+    return f"{host.rstrip('/')}{path}"
+
+
+def ollama_client():
+    """Process-wide Ollama client for the configured host; the ollama package loads on first use"""
+    global _ollama_client
+    with _ollama_lock:
+        if _ollama_client is None:
+            import ollama
+            _ollama_client = ollama.Client(host=OLLAMA_HOST, timeout=LLM_DEADLINE_SECONDS)
+        return _ollama_client
+
+
+def ollama_num_thread() -> int:
+    """Inference threads: the configured count, else the cores this process may run on"""
+    if OLLAMA_NUM_THREAD > 0:
+        return OLLAMA_NUM_THREAD
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def ollama_options(model: str, prompt: str = "", num_predict: int = OLLAMA_NUM_PREDICT,
+                   context_tokens: int = 0) -> Dict[str, Any]:
+    """
+    Runner options sized to a request
+    
+    num_ctx is the smallest bucket that fits the prompt plus the answer,
+    but never smaller than the bucket the model was last run with: Ollama
+    reloads the model whenever num_ctx changes, so the size only grows.
+    
+    Args:
+        model: Ollama model name
+        prompt: Full prompt text
+        num_predict: Maximum answer tokens
+        context_tokens: Tokens of an earlier conversation the prompt continues
+        
+    Returns:
+        dict: num_ctx, num_thread and num_predict options
+    """
+    needed = context_tokens + int(len(prompt) / OLLAMA_CHARS_PER_TOKEN) + num_predict
+    bucket = next((size for size in OLLAMA_NUM_CTX_BUCKETS if size >= needed), OLLAMA_NUM_CTX_BUCKETS[-1])
+    with _ollama_lock:
+        num_ctx = max(bucket, _num_ctx.get(model, 0))
+        if num_ctx != _num_ctx.get(model):
+            logger.info(f"Ollama model {model} now runs with num_ctx={num_ctx}")
+        _num_ctx[model] = num_ctx
+    return {"num_ctx": num_ctx, "num_thread": ollama_num_thread(), "num_predict": num_predict}
+
+
+def pull_ollama_model(model: str) -> Dict[str, Any]:
+    """
+    Pull a model in a background thread, once per process
+    
+    Returns:
+        dict: The pull's progress ("status", "completed", "total", "error")
+    """
+    with _ollama_lock:
+        progress = _pulls.get(model)
+        if progress and progress["status"] not in ("success", "error"):
+            return progress
+        progress = {"status": "starting", "completed": 0, "total": 0, "error": None}
+        _pulls[model] = progress
+
+    def _pull():
+        try:
+            logger.info(f"Pulling model {model}...")
+            for update in ollama_client().pull(model, stream=True):
+                progress["status"] = update.status or progress["status"]
+                if update.total:
+                    progress["total"] = update.total
+                    progress["completed"] = update.completed or 0
+            progress["status"] = "success"
+            logger.info(f"Successfully pulled {model}")
+        except Exception as e:
+            logger.error(f"Failed to pull model {model}: {e}")
+            progress["status"] = "error"
+            progress["error"] = str(e)
+
+    threading.Thread(target=_pull, name=f"ollama-pull-{model}", daemon=True).start()
+    return progress
+
+
+def get_ollama_pulls() -> Dict[str, Dict[str, Any]]:
+    """Progress of the pulls started by this process"""
+    with _ollama_lock:
+        return {model: dict(progress) for model, progress in _pulls.items()}
+
 class ModelManager:
     """Manages different LLM models and providers"""
     
@@ -45,9 +153,20 @@ class ModelManager:
         
         self.current_model = None
         self.current_provider = None
-        self.openai_client = None
+        self.session_id = uuid.uuid4().hex  # for fair queueing against other sessions' requests
+        self.usage = UsageLedger()  # every generation of this session, answers, rewrites and tests alike
+        self._openai_client = None
         self.api_key = None
         
+    @property
+    def openai_client(self):
+        """OpenAI client for the configured API key; the openai package loads on first use"""
+        if self._openai_client is None and self.api_key:
+            from openai import OpenAI
+            # Retries are ours (see resilience), so the SDK's own are turned off
+            self._openai_client = OpenAI(api_key=self.api_key, base_url=OPENAI_BASE_URL, max_retries=0)
+        return self._openai_client
+        
     def get_available_models(self) -> Dict[str, Dict[str, Any]]:
         """Get list of available models"""
         return self.available_models
@@ -55,7 +174,7 @@ class ModelManager:
     def check_ollama_connection(self) -> bool:
         """Check if Ollama is running and accessible"""
         try:
-            response = requests.get("http://localhost:11434/api/tags", timeout=5)
+            response = requests.get(ollama_url("/api/tags"), timeout=5)
             return response.status_code == 200
         except Exception as e:
             logger.warning(f"Ollama connection check failed: {e}")
@@ -65,7 +184,7 @@ class ModelManager:
         """Get list of installed Ollama models"""
         try:
             if self.check_ollama_connection():
-                models = ollama.list()
+                models = ollama_client().list()
                 return [model.model for model in models.models]
             return []
         except Exception as e:
@@ -79,16 +198,14 @@ class ModelManager:
             return False
         
         model_info = self.available_models[model_name]
-        self.current_model = model_name
-        self.current_provider = model_info["provider"]
         
-        # Initialize provider
+        # Initialize provider; the previous model stays selected unless this one is usable
         if model_info["provider"] == "openai":
             if not api_key:
                 logger.error("OpenAI API key required")
                 return False
             self.api_key = api_key
-            self.openai_client = OpenAI(api_key=api_key)
+            self._openai_client = None
             logger.info(f"Initialized OpenAI with model: {model_info['model']}")
             
         elif model_info["provider"] == "ollama":
@@ -100,37 +217,191 @@ class ModelManager:
             installed_models = self.get_installed_ollama_models()
             if model_info["model"] not in installed_models:
                 logger.warning(f"Model {model_info['model']} not installed. Available models: {installed_models}")
-                # Try to pull the model
-                try:
-                    logger.info(f"Pulling model {model_info['model']}...")
-                    ollama.pull(model_info["model"])
-                    logger.info(f"Successfully pulled {model_info['model']}")
-                except Exception as e:
-                    logger.error(f"Failed to pull model {model_info['model']}: {e}")
-                    return False
+                # Pull in the background; the model can be set once the pull finishes
+                pull_ollama_model(model_info["model"])
+                return False
             
             logger.info(f"Initialized Ollama with model: {model_info['model']}")
         
+        self.current_model = model_name
+        self.current_provider = model_info["provider"]
         return True
     
     def generate_response(self, prompt: str, context: str = "") -> str:
         """Generate response using the current model"""
+        return self.generate(prompt, context)["text"]
+    
+    def generate(self, prompt: str, context: str = "") -> Dict[str, Any]:
+        """
+        Generate a response with the current model and report its usage
+        
+        Args:
+            prompt: User's question
+            context: Optional retrieved context
+            
+        Returns:
+            dict: "text" (the answer or an error message) and "usage" (token
+            counts, ttft_s, latency_s, total_s, model, cost_usd), None on failure
+        """
         if not self.current_model:
-            return "No model selected. Please select a model first."
+            return {"text": "No model selected. Please select a model first.", "usage": None}
         
-        full_prompt = self._format_prompt(prompt, context)
+        try:
+            return self._complete(self._format_prompt(prompt, context))
+                
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            return {"text": f"Error generating response: {str(e)}", "usage": None}
+    
+    def generate_conversation_response(self, conversation, question: str,
+                                       context_blocks: List[Tuple[str, str]]) -> str:
+        """Answer a question as the next turn of a conversation (see generate_conversation)"""
+        return self.generate_conversation(conversation, question, context_blocks)["text"]
+    
+    def generate_conversation(self, conversation, question: str,
+                              context_blocks: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """
+        Answer a question as the next turn of a conversation
+        
+        Only context blocks the conversation has not seen yet are sent, after
+        the unchanged transcript, so the provider can reuse its earlier work.
+        
+        Args:
+            conversation: ConversationSession of the chat
+            question: User's question
+            context_blocks: (chunk ID, formatted text) pairs retrieved for the question
+            
+        Returns:
+            dict: "text" and "usage", as for generate()
+        """
+        if not self.current_model:
+            return {"text": "No model selected. Please select a model first.", "usage": None}
+        
+        blocks = conversation.unseen(context_blocks)
+        message = conversation.user_message(question, blocks)
+        if not conversation.fits(message):
+            conversation.reset()
+            blocks = context_blocks
+            message = conversation.user_message(question, blocks)
         
+        def answer_turn(provider: str, model_id: str) -> Dict[str, Any]:
+            if provider == "openai":
+                return self._generate_openai_chat(conversation.openai_messages(message), model_id)
+            if provider == "ollama":
+                return self._generate_ollama_turn(model_id, conversation, message)
+            raise ValueError(f"Unknown provider: {provider}")
+        
+        started = time.perf_counter()
         try:
-            if self.current_provider == "openai":
-                return self._generate_openai_response(full_prompt)
-            elif self.current_provider == "ollama":
-                return self._generate_ollama_response(full_prompt)
-            else:
-                return "Unknown provider"
+            # The transcript determines the answer, so identical chats coalesce
+            payload = json.dumps(conversation.openai_messages(message))
+            result, provider, model_id = self._route(answer_turn, payload=payload)
+            conversation.record([chunk_id for chunk_id, _ in blocks], message, result["text"],
+                                ollama_model=model_id if provider == "ollama" else None,
+                                ollama_context=result.get("context"))
+            return self._account(result, started)
                 
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            return f"Error generating response: {str(e)}"
+            return {"text": f"Error generating response: {str(e)}", "usage": None}
+    
+    def _complete(self, prompt: str, fallback: bool = True) -> Dict[str, Any]:
+        """One-shot generation through the routed path, accounted like every other generation"""
+        started = time.perf_counter()
+        result, _, _ = self._route(lambda provider, model_id: self._generate_text(provider, model_id, prompt),
+                                   payload=prompt, fallback=fallback)
+        return self._account(result, started)
+    
+    def _account(self, result: Dict[str, Any], started: float) -> Dict[str, Any]:
+        """
+        Copy of a completion with total_s (queueing, retries and fallback included)
+        added to its usage, which is recorded in the session's usage ledger
+        """
+        usage = dict(result["usage"], total_s=round(time.perf_counter() - started, 3))
+        usage["fallback"] = usage["model"] != self.available_models[self.current_model]["model"]
+        self.usage.add(usage)
+        return {"text": result["text"], "usage": usage}
+    
+    def _targets(self, fallback: bool = True) -> List[Tuple[str, str]]:
+        """(provider, model) pairs to try: the selected model, then the local fallback"""
+        targets = [(self.current_provider, self.available_models[self.current_model]["model"])]
+        fallback_model = self.available_models.get(ROUTER_FALLBACK_MODEL) if fallback else None
+        if fallback_model and (fallback_model["provider"], fallback_model["model"]) not in targets:
+            targets.append((fallback_model["provider"], fallback_model["model"]))
+        return targets
+    
+    def _route(self, call: Callable[[str, str], Any], payload: str, fallback: bool = True) -> Tuple[Any, str, str]:
+        """
+        Run call(provider, model) through the process-wide router and provider scheduler
+        
+        Each provider attempt is retried on transient failures behind the
+        provider's circuit breaker, all within one deadline for the request.
+        
+        Args:
+            call: Function generating the answer with a given provider and model
+            payload: Full request text; identical payloads to the same model are sent once
+            fallback: Fall back to ROUTER_FALLBACK_MODEL if the selected model fails
+        
+        Returns:
+            tuple: The result, and the provider and model that produced it
+        """
+        scheduler = get_provider_scheduler()
+        deadline = Deadline(LLM_DEADLINE_SECONDS)
+        
+        def scheduled(provider: str, model_id: str) -> Any:
+            key = request_key(provider, model_id, payload)
+            return call_with_retries(
+                lambda: scheduler.run(provider, self.session_id, key, lambda: call(provider, model_id)),
+                deadline=deadline,
+                breaker=get_breaker(provider)
+            )
+        
+        result, target = get_model_router().route([
+            (f"{provider}:{model_id}", lambda provider=provider, model_id=model_id: scheduled(provider, model_id))
+            for provider, model_id in self._targets(fallback)
+        ], admission=True)
+        provider, model_id = target.split(":", 1)
+        if model_id != self.available_models[self.current_model]["model"]:
+            logger.info(f"Answered by fallback {target}")
+        return result, provider, model_id
+    
+    def _generate_text(self, provider: str, model_id: str, prompt: str) -> Dict[str, Any]:
+        """Generate a one-shot response with a specific provider and model, with its usage"""
+        if provider == "openai":
+            return self._openai_completion(self._one_shot_messages(prompt), model_id)
+        if provider == "ollama":
+            return self._ollama_completion(model_id, prompt)
+        raise ValueError(f"Unknown provider: {provider}")
+    
+    def rewrite_query(self, queries: List[Dict[str, str]], question: str) -> Optional[str]:
+        """
+        Condense a follow-up question and the questions before it into a standalone search query
+        
+        Args:
+            queries: Earlier questions of the conversation ("question" keys), oldest first
+            question: The follow-up question
+            
+        Returns:
+            str: The standalone query, or None if the model is unavailable
+        """
+        if not self.current_model:
+            return None
+        
+        history = "\n".join(f"- {query['question']}" for query in queries[-3:])
+        prompt = f"""Rewrite the follow-up question as a standalone search query, using the earlier questions for missing context. Reply with the query only.
+
+Earlier questions:
+{history}
+
+Follow-up question: {question}
+
+Standalone query:"""
+        try:
+            rewritten = self._complete(prompt)["text"]
+            return rewritten.strip().strip('"').splitlines()[0] if rewritten.strip() else None
+        except Exception as e:
+            logger.warning(f"Query rewrite failed, using the heuristic: {e}")
+            return None
     
     def _format_prompt(self, question: str, context: str) -> str:
         """Format the prompt for the model"""
@@ -146,48 +417,168 @@ Answer:"""
         else:
             return question
     
-    def _generate_openai_response(self, prompt: str) -> str:
-        """Generate response using OpenAI"""
+    def _one_shot_messages(self, prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": "You are a helpful assistant that answers questions based on provided context."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _generate_openai_response(self, prompt: str, model_id: Optional[str] = None) -> str:
+        """Generate response using OpenAI (the current model unless another is given)"""
+        model_id = model_id or self.available_models[self.current_model]["model"]
+        return self._openai_completion(self._one_shot_messages(prompt), model_id)["text"]
+    
+    def _generate_openai_chat(self, messages: List[Dict[str, str]], model_id: Optional[str] = None) -> Dict[str, Any]:
+        """Generate a chat completion for a full message list, with its usage"""
+        return self._openai_completion(messages, model_id or self.available_models[self.current_model]["model"])
+    
+    def _openai_completion(self, messages: List[Dict[str, str]], model_id: str) -> Dict[str, Any]:
+        """
+        Stream a chat completion, timing the first token
+        
+        Returns:
+            dict: "text" and "usage" (including prompt tokens served from OpenAI's prefix cache)
+        """
         try:
-            response = self.openai_client.chat.completions.create(
-                model=self.available_models[self.current_model]["model"],
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that answers questions based on provided context."},
-                    {"role": "user", "content": prompt}
-                ],
+            client = self.openai_client.with_options(timeout=remaining_time(LLM_DEADLINE_SECONDS))
+            started = time.perf_counter()
+            stream = client.chat.completions.create(
+                model=model_id,
+                messages=messages,
                 max_tokens=1000,
-                temperature=0.7
+                temperature=0.7,
+                stream=True,
+                stream_options={"include_usage": True}
             )
-            return response.choices[0].message.content.strip()
+            
+            parts = []
+            first_token_at = None
+            usage = None
+            finished = False
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(chunk.choices[0].delta.content)
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    finished = True
+                if chunk.usage:
+                    usage = chunk.usage
+            if not finished:
+                # A cut-off answer must not pass as complete; retried as a dropped connection
+                raise ConnectionError("OpenAI stream ended before the answer was complete")
+            
+            details = getattr(usage, "prompt_tokens_details", None)
+            return {
+                "text": "".join(parts).strip(),
+                "usage": make_usage(
+                    "openai", model_id, started, first_token_at,
+                    usage.prompt_tokens if usage else None,
+                    usage.completion_tokens if usage else None,
+                    cached_tokens=getattr(details, "cached_tokens", None)
+                )
+            }
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
             raise e
     
-    def _generate_ollama_response(self, prompt: str) -> str:
-        """Generate response using Ollama"""
+    def _generate_ollama_turn(self, model_name: str, conversation, message: str) -> Dict[str, Any]:
+        """
+        Continue a conversation from the context tokens of its previous turn
+        
+        Ollama skips evaluating the tokens it already holds, so only the new
+        message is processed. The system prompt is sent with the first turn only.
+        
+        Returns:
+            dict: "text", "usage" and "context", the tokens covering the whole conversation
+        """
+        # Tokens of another model are meaningless; without them the transcript is sent as text
+        context = conversation.ollama_context if conversation.ollama_model == model_name else None
+        prompt = message if context or not conversation.turns else conversation.transcript_prompt(message)
+        return self._ollama_completion(model_name, prompt, system=None if context else conversation.system_prompt,
+                                       context=context)
+    
+    def _generate_ollama_response(self, prompt: str, model_id: Optional[str] = None) -> str:
+        """Generate response using Ollama (the current model unless another is given)"""
+        return self._ollama_completion(model_id or self.available_models[self.current_model]["model"], prompt)["text"]
+    
+    def _ollama_completion(self, model_name: str, prompt: str, system: Optional[str] = None,
+                           context: Optional[List[int]] = None) -> Dict[str, Any]:
+        """
+        Stream an Ollama generation, timing the first token
+        
+        Returns:
+            dict: "text", "usage" (with model load and prompt evaluation time)
+            and "context" tokens for continuing the conversation
+        """
         try:
-            model_name = self.available_models[self.current_model]["model"]
-            response = ollama.generate(
+            started = time.perf_counter()
+            stream = ollama_client().generate(
                 model=model_name,
                 prompt=prompt,
+                system=system,
+                context=context,
                 options={
                     "temperature": 0.7,
-                    "num_predict": 1000
-                }
+                    **ollama_options(model_name, prompt, context_tokens=len(context or []))
+                },
+                keep_alive=OLLAMA_KEEP_ALIVE,
+                stream=True
             )
-            return response['response'].strip()
+            
+            parts = []
+            first_token_at = None
+            final = None
+            for chunk in stream:
+                if chunk.get('response'):
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(chunk['response'])
+                if chunk.get('done'):
+                    final = chunk
+            
+            if final is None:
+                raise ConnectionError("Ollama stream ended before the answer was complete")
+            return {
+                "text": "".join(parts).strip(),
+                "usage": make_usage(
+                    "ollama", model_name, started, first_token_at,
+                    final.get('prompt_eval_count'), final.get('eval_count'),
+                    cached_tokens=len(context) if context else None,
+                    load_s=round(final['load_duration'] / 1e9, 3) if final.get('load_duration') else None,
+                    prompt_eval_s=round(final['prompt_eval_duration'] / 1e9, 3) if final.get('prompt_eval_duration') else None
+                ),
+                "context": list(final.get('context') or [])
+            }
         except Exception as e:
             logger.error(f"Ollama API error: {e}")
             raise e
     
+    def get_resident_ollama_models(self) -> Dict[str, Any]:
+        """Models currently loaded in Ollama's memory, with the time each will be unloaded"""
+        try:
+            return {
+                model.model: model.expires_at.isoformat() if model.expires_at else None
+                for model in ollama_client().ps().models
+            }
+        except Exception as e:
+            logger.warning(f"Failed to get loaded Ollama models: {e}")
+            return {}
+    
     def get_model_status(self) -> Dict[str, Any]:
         """Get status of current model and available providers"""
+        ollama_available = self.check_ollama_connection()
         status = {
             "current_model": self.current_model,
             "current_provider": self.current_provider,
-            "openai_available": self.openai_client is not None,
-            "ollama_available": self.check_ollama_connection(),
-            "ollama_models": self.get_installed_ollama_models()
+            "openai_available": self.api_key is not None,
+            "ollama_available": ollama_available,
+            "ollama_models": self.get_installed_ollama_models(),
+            "ollama_resident": self.get_resident_ollama_models() if ollama_available else {},
+            "ollama_pulls": get_ollama_pulls(),
+            "routing": get_model_router().get_stats(),
+            "scheduling": get_provider_scheduler().get_stats(),
+            "circuit_breakers": get_breaker_status()
         }
         return status
     
@@ -197,7 +588,8 @@ Answer:"""
             return {"success": False, "message": "No model selected"}
         
         try:
-            test_response = self.generate_response("Hello, this is a test message.")
+            # No fallback: an answer from another model would hide a broken provider
+            test_response = self._complete("Hello, this is a test message.", fallback=False)["text"]
             return {
                 "success": True, 
                 "message": "Model connection successful",
@@ -0,0 +1,213 @@
+"""
+Latency-aware routing between LLM providers
+Tracks rolling latency percentiles and error rates per provider and model,
+routes around a failing or slow provider to a fallback model, and can hedge
+a slow request with a second one, taking whichever answers first
+"""
+
+import time
+import logging
+import threading
+import contextvars
+import numpy as np
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from ..config.config import (
+    ROUTER_WINDOW, ROUTER_MIN_SAMPLES, ROUTER_MAX_ERROR_RATE, ROUTER_MAX_P95_SECONDS,
+    ROUTER_PROBE_SECONDS, ROUTER_HEDGE_ENABLED, ROUTER_HEDGE_MIN_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+_router = None
+_router_lock = threading.Lock()
+_admission: contextvars.ContextVar = contextvars.ContextVar("admission", default=None)
+
+
+def mark_admitted() -> None:
+    """Tell the router the running call got its provider slot; with admission=True the hedge clock starts now"""
+    admitted = _admission.get()
+    if admitted is not None and not admitted.done():
+        admitted.set_result(time.monotonic())
+
+
+class ProviderStats:
+    """Rolling window of call outcomes for one provider and model"""
+
+    def __init__(self, window: int = ROUTER_WINDOW):
+        self._calls: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.last_call_at = 0.0
+
+    def record(self, latency: float, ok: bool) -> None:
+        with self._lock:
+            self._calls.append((latency, ok))
+            self.last_call_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Sample count, error rate and p50/p95 latency of successful calls"""
+        with self._lock:
+            calls = list(self._calls)
+        latencies = [latency for latency, ok in calls if ok]
+        return {
+            "samples": len(calls),
+            "error_rate": round(sum(1 for _, ok in calls if not ok) / len(calls), 3) if calls else 0.0,
+            "p50_s": round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+            "p95_s": round(float(np.percentile(latencies, 95)), 3) if latencies else None
+        }
+
+
+class ModelRouter:
+    """
+    Runs provider calls in preference order with health-based fallback
+
+    A target is unhealthy once it has enough samples and its error rate
+    or p95 latency exceeds the limits; requests then go to the fallback
+    first, except for an occasional probe so recovery is noticed. A failed
+    call is retried on the next target. With hedging enabled, the next
+    target is also started when the first has not answered within its p95.
+
+    Every call runs on its own thread rather than a shared pool: calls wait
+    for provider slots in the fair provider queues, and a pool in front of
+    those would let one provider's queued calls starve the others.
+
+    Args:
+        hedge: Start the fallback while a slow primary is still running
+    """
+
+    def __init__(self, hedge: bool = ROUTER_HEDGE_ENABLED):
+        self.hedge = hedge
+        self._stats: Dict[str, ProviderStats] = {}
+        self._stats_lock = threading.Lock()
+
+    def stats(self, target: str) -> ProviderStats:
+        with self._stats_lock:
+            if target not in self._stats:
+                self._stats[target] = ProviderStats()
+            return self._stats[target]
+
+    def is_healthy(self, target: str) -> bool:
+        """Whether a target's recent error rate and p95 latency are within limits"""
+        stats = self.stats(target)
+        snapshot = stats.snapshot()
+        if snapshot["samples"] < ROUTER_MIN_SAMPLES:
+            return True
+        if snapshot["error_rate"] <= ROUTER_MAX_ERROR_RATE and (snapshot["p95_s"] or 0) <= ROUTER_MAX_P95_SECONDS:
+            return True
+        # Let one request through now and then, or an unhealthy target never recovers
+        return time.time() - stats.last_call_at >= ROUTER_PROBE_SECONDS
+
+    def hedge_delay(self, target: str) -> float:
+        """Seconds to wait for a target before hedging: its p95, but at least the configured minimum"""
+        p95 = self.stats(target).snapshot()["p95_s"]
+        return max(ROUTER_HEDGE_MIN_SECONDS, p95 or 0)
+
+    def route(self, calls: List[Tuple[str, Callable[[], Any]]], admission: bool = False) -> Tuple[Any, str]:
+        """
+        Run a request on the first healthy target, falling back or hedging as needed
+
+        Args:
+            calls: (target, function) pairs in preference order, e.g.
+                [("openai:gpt-4", ...), ("ollama:llama3:latest", ...)]
+            admission: The calls report getting their provider slot with
+                mark_admitted(), and a call is only hedged once it has been
+                slow after admission, not while it waits in a queue
+
+        Returns:
+            tuple: The first successful result and the target that produced it
+
+        Raises:
+            Exception: The last error if every target failed
+        """
+        calls = list(calls)
+        if len(calls) > 1 and not self.is_healthy(calls[0][0]) and self.is_healthy(calls[1][0]):
+            logger.warning(f"Routing around unhealthy {calls[0][0]} to {calls[1][0]}")
+            calls[0], calls[1] = calls[1], calls[0]
+
+        pending: Dict[Future, Tuple[str, Future]] = {}
+        last_error: Optional[Exception] = None
+        remaining = list(calls)
+
+        while remaining or pending:
+            if not pending:
+                target, fn = remaining.pop(0)
+                future, admitted = self._start(target, fn, admission)
+                pending[future] = (target, admitted)
+
+            waiting_for = list(pending)
+            timeout = None
+            if self.hedge and remaining:
+                target, admitted = next(iter(pending.values()))
+                if admitted.done():
+                    timeout = max(0.0, admitted.result() + self.hedge_delay(target) - time.monotonic())
+                else:
+                    # The hedge clock starts once the oldest call is admitted
+                    waiting_for.append(admitted)
+            done, _ = wait(waiting_for, timeout=timeout, return_when=FIRST_COMPLETED)
+            done = [future for future in done if future in pending]
+
+            if not done:
+                if timeout is None:
+                    continue  # just admitted: wait again, now with the hedge clock running
+                # Still no answer: hedge with the next target and take whichever answers first
+                target, fn = remaining.pop(0)
+                logger.info(f"Hedging slow request with {target}")
+                future, admitted = self._start(target, fn, admission)
+                pending[future] = (target, admitted)
+                continue
+
+            for future in done:
+                target, _ = pending.pop(future)
+                try:
+                    return future.result(), target
+                except Exception as e:
+                    logger.warning(f"{target} failed: {e}")
+                    last_error = e
+
+        raise last_error
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Latency percentiles, error rate and health per target"""
+        with self._stats_lock:
+            targets = list(self._stats)
+        return {
+            target: dict(self.stats(target).snapshot(), healthy=self.is_healthy(target))
+            for target in targets
+        }
+
+    def _start(self, target: str, fn: Callable[[], Any], admission: bool) -> Tuple[Future, Future]:
+        """Run a call on a new thread; returns its result future and the future of its admission time"""
+        future, admitted = Future(), Future()
+        if not admission:
+            admitted.set_result(time.monotonic())
+
+        def run():
+            _admission.set(admitted)
+            try:
+                future.set_result(self._timed(target, fn, admitted))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=f"model-router-{target}", daemon=True).start()
+        return future, admitted
+
+    def _timed(self, target: str, fn: Callable[[], Any], admitted: Future) -> Any:
+        """Run a call, recording its latency from admission, so queue waits do not count as slowness"""
+        started = time.monotonic()
+        try:
+            result = fn()
+        except Exception:
+            self.stats(target).record(time.monotonic() - (admitted.result() if admitted.done() else started), False)
+            raise
+        self.stats(target).record(time.monotonic() - (admitted.result() if admitted.done() else started), True)
+        return result
+
+
+def get_model_router() -> ModelRouter:
+    """The process-wide router, shared by every session so all requests feed its statistics"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
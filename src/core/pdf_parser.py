@@ -5,8 +5,19 @@ from PIL import Image
 import pandas as pd
 import io
 import os
-from typing import List, Dict, Any
+import mmap
+from typing import List, Dict, Any, Callable, Optional
 import logging
+import threading
+import statistics
+import multiprocessing
+from .chunking import get_chunking_strategy, LIST_ITEM_PATTERN
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from ..config.config import (
+    TABLE_ROW_GROUP_SIZE, TABLE_DETECTION_MODE, TABLE_DETECTOR_MIN_RULINGS,
+    OCR_DPI, OCR_WORKERS, OCR_MIN_TEXT_CHARS, OCR_MIN_READABLE_RATIO, OCR_MIN_IMAGE_PIXELS, OCR_MIN_INK_RATIO
+)
 
 # Try to import PyMuPDF, fall back to alternatives if not available
 try:
@@ -16,31 +27,101 @@ except ImportError:
     PYMUPDF_AVAILABLE = False
     logging.warning("PyMuPDF not available. Image extraction will be limited.")
 
-try:
-    import cv2
-    CV2_AVAILABLE = True
-except ImportError:
-    CV2_AVAILABLE = False
-    logging.warning("OpenCV not available. Some image processing features will be disabled.")
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+READABLE_PUNCTUATION = set(".,;:!?'\"()[]-–—%$€£/&@#*+=<>_")
+
+_ocr_pool = None
+_ocr_pool_lock = threading.Lock()
+
+
+def has_usable_text_layer(text: str) -> bool:
+    """Whether a page's extracted text is real text rather than empty or garbage"""
+    stripped = text.strip()
+    if len(stripped) < OCR_MIN_TEXT_CHARS:
+        return False
+    # Fonts without a Unicode mapping extract as private-use glyphs, replacement characters or symbols
+    readable = sum(1 for ch in stripped if ch.isalnum() or ch.isspace() or ch in READABLE_PUNCTUATION)
+    return readable / len(stripped) >= OCR_MIN_READABLE_RATIO
+
+
+def has_visual_content(page) -> bool:
+    """Whether a PyMuPDF page has anything besides its text layer that OCR could read: images or vector drawings"""
+    return bool(page.get_images()) or bool(page.get_drawings())
+
+
+def is_blank_image(pixels: np.ndarray) -> bool:
+    """Whether a grayscale render is almost all one colour, i.e. there is nothing on it to OCR"""
+    background = np.argmax(np.bincount(pixels.ravel(), minlength=256))
+    ink = np.count_nonzero(np.abs(pixels.astype(np.int16) - background) > 32)
+    return ink < OCR_MIN_INK_RATIO * pixels.size
+
+
+def render_and_ocr_page(file_path: str, page_number: int, dpi: int) -> str:
+    """Render one page and OCR it; module-level so it can run in a process pool"""
+    doc = fitz.open(file_path)
+    try:
+        pix = doc[page_number - 1].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        pixels = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+        if is_blank_image(pixels):
+            return ""
+        image = Image.fromarray(pixels)
+        return pytesseract.image_to_string(image).strip()
+    finally:
+        doc.close()
+
+
+def get_ocr_pool() -> ProcessPoolExecutor:
+    """
+    Process pool for page OCR, shared by every document
+    
+    Workers are started by a fork server (spawn where that is unavailable):
+    forking this multi-threaded process, with torch loaded, can deadlock them.
+    """
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _ocr_pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _ocr_pool
+
+
+def reset_ocr_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool (a worker died) so the next document starts a fresh one"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is pool:
+            _ocr_pool = None
+    pool.shutdown(wait=False)
+
 class PDFParser:
-    def __init__(self):
+    def __init__(self, table_row_group_size: int = TABLE_ROW_GROUP_SIZE,
+                 table_detection: str = TABLE_DETECTION_MODE, ocr_dpi: int = OCR_DPI):
         self.supported_formats = ['.pdf']
+        self.table_row_group_size = table_row_group_size
+        self.ocr_dpi = ocr_dpi
+        if table_detection not in ("auto", "always", "diagnose"):
+            raise ValueError(f"Unknown table detection mode: {table_detection}")
+        self.table_detection = table_detection
     
-    def parse_pdf(self, file_path: str) -> Dict[str, Any]:
+    def parse_pdf(self, file_path: str, buffer: Optional[mmap.mmap] = None) -> Dict[str, Any]:
         """
         Parse PDF file and extract text, images, and tables
         
         Args:
             file_path: Path to the PDF file
+            buffer: Open read-only memory map of the file; mapped here if not given.
+                PyMuPDF and pdfplumber both read from it, so the file is read from disk once.
             
         Returns:
             dict: Parsed content with text, images, and tables
         """
+        if buffer is None:
+            with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return self.parse_pdf(file_path, mapped)
+        
         try:
             logger.info(f"Starting to parse PDF: {file_path}")
             
@@ -49,15 +130,25 @@ class PDFParser:
                 "text_content": [],
                 "images": [],
                 "tables": [],
+                "layout_blocks": [],
+                "table_detection": {},
+                "scanned_pages": [],
                 "metadata": {},
                 "total_pages": 0
             }
             
             # Extract using PyMuPDF for images and basic text
-            result.update(self._extract_with_pymupdf(file_path))
+            result.update(self._extract_with_pymupdf(file_path, buffer))
             
             # Extract using pdfplumber for better text and tables
-            result.update(self._extract_with_pdfplumber(file_path))
+            result.update(self._extract_with_pdfplumber(file_path, buffer))
+            
+            # Pages without a usable text layer are rendered and OCR'd instead
+            if result["scanned_pages"]:
+                scanned = set(result["scanned_pages"])
+                result["text_content"] = [
+                    item for item in result["text_content"] if item["page"] not in scanned
+                ] + self._ocr_scanned_pages(file_path, result["scanned_pages"])
             
             # Process images with OCR
             result["images"] = self._process_images_with_ocr(result["images"])
@@ -69,11 +160,13 @@ class PDFParser:
             logger.error(f"Error parsing PDF {file_path}: {str(e)}")
             raise
     
-    def _extract_with_pymupdf(self, file_path: str) -> Dict[str, Any]:
+    def _extract_with_pymupdf(self, file_path: str, buffer: Optional[mmap.mmap] = None) -> Dict[str, Any]:
         """Extract content using PyMuPDF"""
         result = {
             "text_content": [],
             "images": [],
+            "layout_blocks": [],
+            "scanned_pages": [],
             "metadata": {},
             "total_pages": 0
         }
@@ -82,8 +175,11 @@ class PDFParser:
             logger.warning("PyMuPDF not available, skipping advanced extraction")
             return result
         
+        # PyMuPDF takes a memoryview of the map as a stream; the view must be released before the map closes
+        view = memoryview(buffer) if buffer is not None else None
+        doc = None
         try:
-            doc = fitz.open(file_path)
+            doc = fitz.open(stream=view, filetype="pdf") if view is not None else fitz.open(file_path)
             result["total_pages"] = len(doc)
             result["metadata"] = doc.metadata
             
@@ -92,6 +188,13 @@ class PDFParser:
                 
                 # Extract text
                 text = page.get_text()
+                # Hardly any text and nothing drawn: a blank page (or just a page number), nothing to OCR
+                blank = len(text.strip()) < OCR_MIN_TEXT_CHARS and not has_visual_content(page)
+                if not blank and not has_usable_text_layer(text):
+                    # Scanned page: page-level OCR covers its text and any embedded images
+                    result["scanned_pages"].append(page_num + 1)
+                    continue
+                
                 if text.strip():
                     result["text_content"].append({
                         "page": page_num + 1,
@@ -99,6 +202,9 @@ class PDFParser:
                         "source": "pymupdf"
                     })
                 
+                # Extract layout blocks (headings, paragraphs, list items) for semantic chunking
+                result["layout_blocks"].extend(self._extract_layout_blocks(page, page_num + 1))
+                
                 # Extract images
                 image_list = page.get_images()
                 for img_index, img in enumerate(image_list):
@@ -121,22 +227,83 @@ class PDFParser:
                         logger.warning(f"Error extracting image {img_index} from page {page_num + 1}: {str(e)}")
                         continue
             
-            doc.close()
-            
         except Exception as e:
             logger.error(f"Error with PyMuPDF extraction: {str(e)}")
+        finally:
+            if doc is not None:
+                doc.close()
+            if view is not None:
+                view.release()
         
         return result
     
-    def _extract_with_pdfplumber(self, file_path: str) -> Dict[str, Any]:
+    def _extract_layout_blocks(self, page, page_number: int) -> List[Dict[str, Any]]:
+        """Classify a page's text blocks as headings, paragraphs or list items"""
+        blocks = []
+        try:
+            for block in page.get_text("dict")["blocks"]:
+                if block.get("type", 0) != 0:  # skip image blocks
+                    continue
+                
+                lines = []
+                sizes = []
+                bold_chars = 0
+                total_chars = 0
+                for line in block["lines"]:
+                    line_text = "".join(span["text"] for span in line["spans"])
+                    if line_text.strip():
+                        lines.append(line_text.strip())
+                    for span in line["spans"]:
+                        chars = len(span["text"].strip())
+                        total_chars += chars
+                        if chars:
+                            sizes.append(span["size"])
+                        if span["flags"] & 16:  # bold
+                            bold_chars += chars
+                
+                if not lines:
+                    continue
+                
+                blocks.append({
+                    "page": page_number,
+                    "text": "\n".join(lines),
+                    "font_size": max(sizes) if sizes else 0,
+                    "bold": total_chars > 0 and bold_chars == total_chars,
+                    "line_count": len(lines)
+                })
+        except Exception as e:
+            logger.warning(f"Error extracting layout blocks from page {page_number}: {str(e)}")
+            return []
+        
+        if not blocks:
+            return []
+        
+        body_size = statistics.median(block["font_size"] for block in blocks)
+        for block in blocks:
+            is_short = block["line_count"] <= 2 and len(block["text"]) <= 120
+            if is_short and (block["font_size"] >= body_size * 1.15 or block["bold"]):
+                block["kind"] = "heading"
+            elif LIST_ITEM_PATTERN.match(block["text"]):
+                block["kind"] = "list_item"
+            else:
+                block["kind"] = "paragraph"
+            del block["font_size"], block["bold"], block["line_count"]
+        
+        return blocks
+    
+    def _extract_with_pdfplumber(self, file_path: str, buffer: Optional[mmap.mmap] = None) -> Dict[str, Any]:
         """Extract content using pdfplumber for better text and tables"""
         result = {
             "text_content": [],
             "tables": []
         }
+        detection = {"mode": self.table_detection, "pages": 0, "extracted_pages": 0,
+                     "true_positives": 0, "false_positives": 0, "false_negatives": 0}
         
         try:
-            with pdfplumber.open(file_path) as pdf:
+            if buffer is not None:
+                buffer.seek(0)
+            with pdfplumber.open(buffer if buffer is not None else file_path) as pdf:
                 for page_num, page in enumerate(pdf.pages):
                     # Extract text with better formatting
                     text = page.extract_text()
@@ -147,32 +314,123 @@ class PDFParser:
                             "source": "pdfplumber"
                         })
                     
-                    # Extract tables
+                    # Extract tables, skipping pages the detector considers prose
+                    looks_tabular = self._looks_tabular(page)
+                    detection["pages"] += 1
+                    if not looks_tabular and self.table_detection == "auto":
+                        continue
+                    
+                    detection["extracted_pages"] += 1
                     tables = page.extract_tables()
+                    if self.table_detection == "diagnose":
+                        has_tables = any(table for table in tables)
+                        if looks_tabular and has_tables:
+                            detection["true_positives"] += 1
+                        elif looks_tabular:
+                            detection["false_positives"] += 1
+                        elif has_tables:
+                            detection["false_negatives"] += 1
+                    
                     for table_index, table in enumerate(tables):
                         if table and len(table) > 0:
                             # Convert table to DataFrame for better handling
                             df = pd.DataFrame(table[1:], columns=table[0])
-                            
+                            row_groups = self._table_to_text_groups(df)
+
                             result["tables"].append({
                                 "page": page_num + 1,
                                 "table_index": table_index,
                                 "data": df.to_dict('records'),
                                 "columns": df.columns.tolist(),
                                 "shape": df.shape,
-                                "text_representation": self._table_to_text(df)
+                                "row_groups": row_groups,
+                                "text_representation": "\n".join(
+                                    row_groups[:1] + [group.split("\n", 1)[1] for group in row_groups[1:]]
+                                )
                             })
         
         except Exception as e:
             logger.error(f"Error with pdfplumber extraction: {str(e)}")
         
+        if self.table_detection == "diagnose":
+            predicted = detection["true_positives"] + detection["false_positives"]
+            actual = detection["true_positives"] + detection["false_negatives"]
+            detection["precision"] = detection["true_positives"] / predicted if predicted else 1.0
+            detection["recall"] = detection["true_positives"] / actual if actual else 1.0
+            logger.info(f"Table detector precision {detection['precision']:.2f}, recall {detection['recall']:.2f} "
+                        f"over {detection['pages']} pages ({predicted} flagged, {actual} with tables)")
+        else:
+            for key in ("true_positives", "false_positives", "false_negatives"):
+                del detection[key]
+            logger.info(f"Table extraction ran on {detection['extracted_pages']} of {detection['pages']} pages")
+        
+        result["table_detection"] = detection
         return result
     
+    def _looks_tabular(self, page) -> bool:
+        """
+        Cheap check for whether a page can contain a table
+        
+        pdfplumber's default table finder builds cells from ruling lines, so a
+        page needs a grid of them for extract_tables to return anything. The
+        edges are already parsed by the time text has been extracted, so the
+        check is nearly free: at least TABLE_DETECTOR_MIN_RULINGS distinct
+        horizontal and vertical positions whose lines cross each other. A
+        single box (a frame, a callout, a figure border) has only two of each.
+        """
+        tolerance = 3  # pdfplumber's default snap tolerance, in points
+        horizontal = np.array([(e["top"], e["x0"], e["x1"]) for e in page.edges if e["orientation"] == "h"])
+        vertical = np.array([(e["x0"], e["top"], e["bottom"]) for e in page.edges if e["orientation"] == "v"])
+        if len(horizontal) < TABLE_DETECTOR_MIN_RULINGS or len(vertical) < TABLE_DETECTOR_MIN_RULINGS:
+            return False
+        
+        # crosses[i, j]: horizontal line i and vertical line j intersect
+        crosses = (
+            (vertical[None, :, 0] >= horizontal[:, None, 1] - tolerance)
+            & (vertical[None, :, 0] <= horizontal[:, None, 2] + tolerance)
+            & (horizontal[:, None, 0] >= vertical[None, :, 1] - tolerance)
+            & (horizontal[:, None, 0] <= vertical[None, :, 2] + tolerance)
+        )
+        rows = np.unique(np.round(horizontal[crosses.any(axis=1), 0] / tolerance))
+        columns = np.unique(np.round(vertical[crosses.any(axis=0), 0] / tolerance))
+        return len(rows) >= TABLE_DETECTOR_MIN_RULINGS and len(columns) >= TABLE_DETECTOR_MIN_RULINGS
+    
+    def _ocr_scanned_pages(self, file_path: str, pages: List[int]) -> List[Dict[str, Any]]:
+        """Render scanned pages and OCR them, in a process pool when there is more than one"""
+        logger.info(f"Running page-level OCR on {len(pages)} scanned pages at {self.ocr_dpi} DPI")
+        
+        try:
+            if len(pages) == 1 or OCR_WORKERS <= 1:
+                texts = [render_and_ocr_page(file_path, page, self.ocr_dpi) for page in pages]
+            else:
+                pool = get_ocr_pool()
+                try:
+                    texts = list(pool.map(render_and_ocr_page, [file_path] * len(pages), pages,
+                                          [self.ocr_dpi] * len(pages)))
+                except BrokenProcessPool:
+                    reset_ocr_pool(pool)
+                    raise
+        except Exception as e:
+            logger.error(f"Error running page-level OCR: {str(e)}")
+            return []
+        
+        return [
+            {"page": page, "text": text, "source": "page_ocr"}
+            for page, text in zip(pages, texts) if text
+        ]
+    
     def _process_images_with_ocr(self, images: List[Dict]) -> List[Dict]:
         """Process images with OCR to extract text"""
         processed_images = []
         
         for img_data in images:
+            # Icons, logos and rules rarely carry searchable text
+            if img_data["width"] * img_data["height"] < OCR_MIN_IMAGE_PIXELS:
+                img_data["ocr_text"] = ""
+                img_data["has_text"] = False
+                processed_images.append(img_data)
+                continue
+            
             try:
                 # Convert bytes to PIL Image
                 image = Image.open(io.BytesIO(img_data["data"]))
@@ -196,127 +454,73 @@ class PDFParser:
     
     def _table_to_text(self, df: pd.DataFrame) -> str:
         """Convert DataFrame to readable text format"""
+        return "\n".join(self._table_to_text_groups(df, rows_per_group=max(len(df), 1)))
+
+    def _table_to_text_groups(self, df: pd.DataFrame, rows_per_group: int = None) -> List[str]:
+        """
+        Convert DataFrame to text in row groups, each starting with the header line
+
+        Rows are built with column-wise string operations instead of iterating
+        the DataFrame row by row.
+
+        Args:
+            df: Table as a DataFrame
+            rows_per_group: Rows per group (defaults to the parser's row group size)
+
+        Returns:
+            list: One text block per row group
+        """
+        rows_per_group = rows_per_group or self.table_row_group_size
         try:
-            text_parts = []
-            
-            # Add column headers
             headers = " | ".join(str(col) for col in df.columns)
-            text_parts.append(f"Table with columns: {headers}")
-            
-            # Add rows
-            for index, row in df.iterrows():
-                row_text = " | ".join(str(val) if pd.notna(val) else "" for val in row.values)
-                text_parts.append(f"Row {index + 1}: {row_text}")
-            
-            return "\n".join(text_parts)
-            
+            header_line = f"Table with columns: {headers}"
+
+            if df.empty or len(df.columns) == 0:
+                return [header_line]
+
+            # Positional columns so repeated or empty PDF headers are handled the same way
+            # copy=True: the array may be the frame's own storage, which must stay untouched
+            values = df.to_numpy(dtype=object, copy=True)
+            values[pd.isna(values)] = ""
+            cells = pd.DataFrame(values).astype(str)
+
+            row_text = cells[0].str.cat([cells[i] for i in range(1, cells.shape[1])], sep=" | ")
+            row_numbers = pd.Series(np.arange(1, len(cells) + 1)).astype(str)
+            row_lines = ("Row " + row_numbers + ": " + row_text).tolist()
+
+            return [
+                "\n".join([header_line] + row_lines[start:start + rows_per_group])
+                for start in range(0, len(row_lines), rows_per_group)
+            ]
+
         except Exception as e:
             logger.warning(f"Error converting table to text: {str(e)}")
-            return "Table data could not be converted to text"
+            return ["Table data could not be converted to text"]
     
-    def chunk_content(self, parsed_content: Dict[str, Any], chunk_size: int = 1000, overlap: int = 200) -> List[Dict[str, Any]]:
+    def chunk_content(self, parsed_content: Dict[str, Any], chunk_size: int = 1000, overlap: int = 200,
+                      strategy: str = "fixed", max_tokens: int = 256,
+                      token_counter: Optional[Callable[[str], int]] = None) -> List[Dict[str, Any]]:
         """
         Split parsed content into chunks for embedding
         
         Args:
             parsed_content: Parsed PDF content
-            chunk_size: Maximum size of each chunk
-            overlap: Overlap between chunks
+            chunk_size: Maximum size of each chunk (fixed strategy)
+            overlap: Overlap between chunks (fixed strategy)
+            strategy: Chunking strategy name ("fixed" or "semantic")
+            max_tokens: Token budget per chunk (semantic strategy)
+            token_counter: Tokenizer-exact token counter (semantic strategy)
             
         Returns:
             list: List of content chunks
         """
-        chunks = []
-        
-        # Process text content
-        for text_item in parsed_content["text_content"]:
-            text = text_item["text"]
-            page = text_item["page"]
-            
-            # Split text into chunks
-            text_chunks = self._split_text(text, chunk_size, overlap)
-            
-            for i, chunk_text in enumerate(text_chunks):
-                chunks.append({
-                    "type": "text",
-                    "content": chunk_text,
-                    "page": page,
-                    "chunk_index": i,
-                    "source": text_item["source"]
-                })
-        
-        # Process tables
-        for table_item in parsed_content["tables"]:
-            table_text = table_item["text_representation"]
-            page = table_item["page"]
-            
-            # Split table text into chunks if needed
-            table_chunks = self._split_text(table_text, chunk_size, overlap)
-            
-            for i, chunk_text in enumerate(table_chunks):
-                chunks.append({
-                    "type": "table",
-                    "content": chunk_text,
-                    "page": page,
-                    "chunk_index": i,
-                    "table_data": table_item["data"],
-                    "columns": table_item["columns"]
-                })
-        
-        # Process images with OCR text
-        for img_item in parsed_content["images"]:
-            if img_item.get("has_text", False):
-                ocr_text = img_item["ocr_text"]
-                page = img_item["page"]
-                
-                # Split OCR text into chunks
-                ocr_chunks = self._split_text(ocr_text, chunk_size, overlap)
-                
-                for i, chunk_text in enumerate(ocr_chunks):
-                    chunks.append({
-                        "type": "image_ocr",
-                        "content": chunk_text,
-                        "page": page,
-                        "chunk_index": i,
-                        "image_info": {
-                            "width": img_item["width"],
-                            "height": img_item["height"]
-                        }
-                    })
-        
-        return chunks
-    
-    def _split_text(self, text: str, chunk_size: int, overlap: int) -> List[str]:
-        """Split text into overlapping chunks"""
-        if len(text) <= chunk_size:
-            return [text]
-        
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            end = start + chunk_size
-            
-            # Try to break at sentence boundary
-            if end < len(text):
-                # Look for sentence endings
-                for i in range(end, max(start + chunk_size // 2, end - 100), -1):
-                    if text[i] in '.!?':
-                        end = i + 1
-                        break
-            # If no sentence boundary found, look for word boundary
-            if end < len(text):
-                for i in range(end, max(start + chunk_size // 2, end - 50), -1):
-                    if text[i] == ' ':
-                        end = i
-                        break
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = end - overlap
-            if start >= len(text):
-                break
-        
+        chunker = get_chunking_strategy(
+            strategy,
+            chunk_size=chunk_size,
+            overlap=overlap,
+            max_tokens=max_tokens,
+            token_counter=token_counter
+        )
+        chunks = chunker.chunk(parsed_content)
+        logger.info(f"Created {len(chunks)} chunks with '{strategy}' strategy")
         return chunks
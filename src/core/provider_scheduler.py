@@ -0,0 +1,212 @@
+"""
+Provider-side request scheduling
+Caps concurrent requests per LLM provider, queues the rest fairly across
+sessions, coalesces identical in-flight requests and records queue waits
+"""
+
+import time
+import hashlib
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, Tuple, Callable
+from ..config.config import SCHEDULER_MAX_CONCURRENCY, SCHEDULER_QUEUE_TIMEOUT_SECONDS, SCHEDULER_WAIT_WINDOW
+from .resilience import remaining_time
+from .model_router import mark_admitted
+
+logger = logging.getLogger(__name__)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def request_key(provider: str, model: str, payload: str) -> str:
+    """Coalescing key of a request: identical model and prompt give identical keys"""
+    return hashlib.sha256(f"{provider}\0{model}\0{payload}".encode("utf-8")).hexdigest()
+
+
+class ProviderQueue:
+    """
+    Concurrency slots of one provider with a round-robin queue across sessions
+
+    A session with many queued requests gets one slot per round, so a
+    single busy session cannot starve the others.
+
+    Args:
+        limit: Concurrent requests allowed
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.active = 0
+        self.requests = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self._waiting: "OrderedDict[str, deque]" = OrderedDict()
+        self._waits: deque = deque(maxlen=SCHEDULER_WAIT_WINDOW)
+        self._condition = threading.Condition()
+
+    def acquire(self, session_id: str, timeout: float = SCHEDULER_QUEUE_TIMEOUT_SECONDS) -> None:
+        """
+        Wait for a slot
+
+        Raises:
+            TimeoutError: If no slot was granted within the timeout
+        """
+        started = time.perf_counter()
+        with self._condition:
+            self.requests += 1
+            if self.active < self.limit and not self._waiting:
+                self.active += 1
+                self._waits.append(0.0)
+                return
+
+            ticket = {"granted": False}
+            self._waiting.setdefault(session_id, deque()).append(ticket)
+            deadline = time.monotonic() + timeout
+            while not ticket["granted"]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._discard(session_id, ticket)
+                    self.timeouts += 1
+                    raise TimeoutError(f"No provider slot within {timeout:.0f}s")
+                self._condition.wait(remaining)
+
+            self._waits.append(time.perf_counter() - started)
+
+    def release(self) -> None:
+        """Free a slot and hand it to the next session in turn"""
+        with self._condition:
+            self.active -= 1
+            if self._waiting:
+                session_id, tickets = self._waiting.popitem(last=False)
+                tickets.popleft()["granted"] = True
+                self.active += 1
+                if tickets:
+                    # Back of the line until every other waiting session had its turn
+                    self._waiting[session_id] = tickets
+                self._condition.notify_all()
+
+    def record_coalesced(self) -> None:
+        """Count a request that joined an identical one instead of taking a slot"""
+        with self._condition:
+            self.requests += 1
+            self.coalesced += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Slots in use, queue depth and wait percentiles"""
+        with self._condition:
+            waits = list(self._waits)
+            queued = sum(len(tickets) for tickets in self._waiting.values())
+            return {
+                "limit": self.limit,
+                "active": self.active,
+                "queued": queued,
+                "waiting_sessions": len(self._waiting),
+                "requests": self.requests,
+                "coalesced": self.coalesced,
+                "timeouts": self.timeouts,
+                "wait_p50_s": round(float(np.percentile(waits, 50)), 3) if waits else None,
+                "wait_p95_s": round(float(np.percentile(waits, 95)), 3) if waits else None,
+                "wait_max_s": round(max(waits), 3) if waits else None
+            }
+
+    def _discard(self, session_id: str, ticket: Dict[str, bool]) -> None:
+        tickets = self._waiting.get(session_id)
+        if tickets is not None:
+            tickets.remove(ticket)
+            if not tickets:
+                del self._waiting[session_id]
+
+
+class ProviderScheduler:
+    """
+    Runs provider calls within per-provider concurrency caps
+
+    Identical requests (same key) that are in flight at the same time are
+    sent once; every caller gets the leader's result or error.
+
+    Args:
+        limits: Concurrent requests per provider
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None):
+        self.limits = dict(limits or SCHEDULER_MAX_CONCURRENCY)
+        self._queues: Dict[str, ProviderQueue] = {}
+        self._inflight: Dict[str, Tuple[Future, threading.Event]] = {}
+        self._lock = threading.Lock()
+
+    def queue(self, provider: str) -> ProviderQueue:
+        with self._lock:
+            if provider not in self._queues:
+                self._queues[provider] = ProviderQueue(self.limits.get(provider, 1))
+            return self._queues[provider]
+
+    def run(self, provider: str, session_id: str, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn in a slot of the provider, or join an identical request already in flight
+
+        Admission (a slot granted, or the joined request's slot granted) is
+        reported to the router with mark_admitted(), for its hedge clock.
+
+        Args:
+            provider: Provider whose concurrency cap applies
+            session_id: Session the request belongs to, for fair queueing
+            key: Coalescing key, see request_key()
+            fn: The provider call
+
+        Returns:
+            The call's result
+        """
+        queue = self.queue(provider)
+        with self._lock:
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = (Future(), threading.Event())
+                self._inflight[key] = inflight
+        future, admitted = inflight
+
+        if not leader:
+            queue.record_coalesced()
+            logger.info(f"Coalesced identical {provider} request")
+            # Set by the leader on admission or failure, so this never outlives it
+            admitted.wait()
+            mark_admitted()
+            return future.result()
+
+        try:
+            # Never queue past the caller's deadline
+            queue.acquire(session_id, timeout=remaining_time(SCHEDULER_QUEUE_TIMEOUT_SECONDS))
+            admitted.set()
+            mark_admitted()
+            try:
+                result = fn()
+            finally:
+                queue.release()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            admitted.set()
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue statistics per provider"""
+        with self._lock:
+            queues = dict(self._queues)
+        return {provider: queue.snapshot() for provider, queue in queues.items()}
+
+
+def get_provider_scheduler() -> ProviderScheduler:
+    """The process-wide scheduler; caps only work if every session shares it"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ProviderScheduler()
+        return _scheduler
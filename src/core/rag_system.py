@@ -1,67 +1,134 @@
-import openai
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import logging
-from ..config.config import OPENAI_API_KEY, CHUNK_SIZE, CHUNK_OVERLAP
+import time
+from ..config.config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, CHUNK_SIZE, CHUNK_OVERLAP, CHUNKING_STRATEGY, DEDUP_ENABLED, DEFAULT_TENANT,
+    UPLOAD_FOLDER, GC_ENABLED
+)
 from .embedding_system import EmbeddingSystem
+from .garbage_collector import start_garbage_collector
+from .tenancy import get_ingest_stats, ingest_slot, validate_tenant_id
+from .deduplication import ChunkDeduplicator
 from .model_manager import ModelManager
+from .conversation import page_filter
 
 logger = logging.getLogger(__name__)
 
 class RAGSystem:
-    def __init__(self):
-        self.embedding_system = EmbeddingSystem()
+    def __init__(self, tenant_id: str = DEFAULT_TENANT):
+        self.tenant_id = validate_tenant_id(tenant_id)
+        self.embedding_system = EmbeddingSystem(tenant_id=tenant_id)
         self.model_manager = ModelManager()
+        self.deduplicator = ChunkDeduplicator() if DEDUP_ENABLED else None
+        # Imported here: the uploader module itself imports from this package
+        from ..utils.pdf_uploader import PDFUploader
+        self.uploader = PDFUploader(UPLOAD_FOLDER, tenant_id=tenant_id)
+        self.garbage_collector = None
+        if GC_ENABLED:
+            self.garbage_collector = start_garbage_collector(tenant_id, self.embedding_system, self.uploader)
+        
+        self._openai_client = None
+        self.usage = self.model_manager.usage  # filled by the model manager, which sees every generation
         
         # Initialize with default OpenAI if available
         if OPENAI_API_KEY:
-            openai.api_key = OPENAI_API_KEY
-            self.openai_client = openai.OpenAI(api_key=OPENAI_API_KEY)
             # Set default model to OpenAI GPT-3.5-turbo
             self.model_manager.set_model("OpenAI GPT-3.5-turbo", OPENAI_API_KEY)
         else:
             logger.warning("OpenAI API key not found. Please configure a model in the UI.")
-            self.openai_client = None
     
-    def process_document(self, file_id: str, file_path: str) -> bool:
+    @property
+    def openai_client(self):
+        """OpenAI client for the configured API key, created on first use"""
+        if self._openai_client is None and OPENAI_API_KEY:
+            from openai import OpenAI
+            self._openai_client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+        return self._openai_client
+    
+    def process_document(self, file_id: str, file_path: str, chunking_strategy: str = None) -> bool:
         """
         Process a document: parse, chunk, and store embeddings
         
         Args:
             file_id: Unique identifier for the document
             file_path: Path to the PDF file
+            chunking_strategy: "semantic" or "fixed" (defaults to CHUNKING_STRATEGY)
             
         Returns:
             bool: Success status
         """
         try:
-            from pdf_parser import PDFParser
-            
-            # Parse the PDF
-            parser = PDFParser()
-            parsed_content = parser.parse_pdf(file_path)
-            
-            # Chunk the content
-            chunks = parser.chunk_content(
-                parsed_content, 
-                chunk_size=CHUNK_SIZE, 
-                overlap=CHUNK_OVERLAP
-            )
-            
-            # Store chunks with embeddings
-            success = self.embedding_system.store_document_chunks(file_id, chunks)
-            
-            if success:
-                logger.info(f"Successfully processed document {file_id} with {len(chunks)} chunks")
-            else:
-                logger.error(f"Failed to store embeddings for document {file_id}")
-            
-            return success
+            # Ingests queue per tenant and, fairly between tenants, globally instead of saturating the host
+            with ingest_slot(self.tenant_id):
+                return self._process_document(file_id, file_path, chunking_strategy)
             
         except Exception as e:
             logger.error(f"Error processing document {file_id}: {str(e)}")
             return False
     
-    def search_and_answer(self, query: str, file_id: str = None, top_k: int = 5) -> Dict[str, Any]:
+    def _process_document(self, file_id: str, file_path: str, chunking_strategy: str = None) -> bool:
+        """Parse, chunk and store a document while holding an ingest slot"""
+        from .pdf_parser import PDFParser
+        
+        timings = {}
+        started = time.perf_counter()
+        
+        # Parse the PDF
+        parser = PDFParser()
+        parsed_content = parser.parse_pdf(file_path)
+        timings["parse_s"] = time.perf_counter() - started
+        
+        # Chunk the content
+        step = time.perf_counter()
+        chunks = parser.chunk_content(
+            parsed_content, 
+            chunk_size=CHUNK_SIZE, 
+            overlap=CHUNK_OVERLAP,
+            strategy=chunking_strategy or CHUNKING_STRATEGY,
+            max_tokens=self.embedding_system.max_tokens,
+            token_counter=self.embedding_system.count_tokens
+        )
+        timings["chunk_s"] = time.perf_counter() - step
+        
+        # Drop near-duplicate chunks (e.g. OCR of screenshots repeating the page text)
+        dedup_stats = None
+        if self.deduplicator:
+            step = time.perf_counter()
+            chunks, dedup_stats = self.deduplicator.deduplicate(chunks)
+            timings["dedup_s"] = time.perf_counter() - step
+        
+        # Refuse a document that cannot fit even after eviction; evicting waits until it is stored
+        if not self.embedding_system.fits_quota(len(chunks)):
+            logger.error(f"Document {file_id} does not fit in tenant '{self.tenant_id}' quota")
+            return False
+        
+        # Store chunks with embeddings
+        step = time.perf_counter()
+        success = self.embedding_system.store_document_chunks(file_id, chunks)
+        timings["store_s"] = time.perf_counter() - step
+        
+        if success:
+            # Only now, so a failed ingest never costs the tenant its older documents
+            if not self.embedding_system.enforce_quota(file_id):
+                logger.warning(f"Tenant '{self.tenant_id}' is over quota until eviction succeeds")
+            timings["total_s"] = time.perf_counter() - started
+            # Summary for the sidebar, computed once here instead of on every rerun
+            self.embedding_system.save_document_manifest(file_id, {
+                "file_path": file_path,
+                "source_pages": parsed_content.get("total_pages", 0),
+                "sample_content": [self._snippet(chunk["content"]) for chunk in chunks[:3]],
+                "ingest_timings": {name: round(seconds, 3) for name, seconds in timings.items()},
+                "deduplication": dedup_stats,
+                "ingested_at": time.time()
+            })
+            logger.info(f"Successfully processed document {file_id} with {len(chunks)} chunks")
+        else:
+            logger.error(f"Failed to store embeddings for document {file_id}")
+        
+        return success
+    
+    def search_and_answer(self, query: str, file_id: str = None, top_k: int = 5,
+                          file_ids: List[str] = None, conversation=None) -> Dict[str, Any]:
         """
         Search for relevant content and generate an answer
         
@@ -69,25 +136,33 @@ class RAGSystem:
             query: User's question
             file_id: Optional file ID to limit search
             top_k: Number of relevant chunks to retrieve
+            file_ids: Optional list of file IDs to search across
+            conversation: Optional ConversationSession to answer as its next turn
             
         Returns:
             Dictionary with answer and context
         """
         try:
             # Search for similar chunks
-            similar_chunks = self.embedding_system.search_similar_chunks(
-                query, file_id, top_k
-            )
+            retrieval = None
+            if conversation is not None:
+                similar_chunks, retrieval = self._retrieve_for_conversation(query, file_id, top_k, file_ids, conversation)
+            else:
+                similar_chunks = self.embedding_system.search_similar_chunks(
+                    query, file_id, top_k, file_ids=file_ids
+                )
             
             if not similar_chunks:
                 return {
                     "answer": "I couldn't find any relevant information in the uploaded documents to answer your question.",
                     "context": [],
-                    "sources": []
+                    "sources": [],
+                    "retrieval": retrieval
                 }
             
             # Prepare context for the LLM
             context_parts = []
+            context_blocks = []
             sources = []
             
             for chunk in similar_chunks:
@@ -96,6 +171,7 @@ class RAGSystem:
                 
                 # Add source information
                 source_info = {
+                    "file_id": metadata.get("file_id"),
                     "page": metadata.get("page", "Unknown"),
                     "type": metadata.get("type", "text"),
                     "chunk_index": metadata.get("chunk_index", 0)
@@ -104,6 +180,8 @@ class RAGSystem:
                 # Add type-specific information
                 if metadata.get("type") == "table":
                     source_info["columns"] = metadata.get("columns", [])
+                    if "table_id" in metadata:
+                        source_info["table_id"] = metadata["table_id"]
                 elif metadata.get("type") == "image_ocr":
                     source_info["image_info"] = metadata.get("image_info", {})
                 
@@ -112,18 +190,27 @@ class RAGSystem:
                 # Format context with source information
                 context_text = f"[Page {metadata.get('page', 'Unknown')}, {metadata.get('type', 'text')}]: {content}"
                 context_parts.append(context_text)
+                context_blocks.append((chunk.get("id") or context_text, context_text))
             
             # Combine context
             context = "\n\n".join(context_parts)
             
             # Generate answer using the selected model
-            answer = self.model_manager.generate_response(query, context)
+            if conversation is not None:
+                result = self.model_manager.generate_conversation(conversation, query, context_blocks)
+            else:
+                result = self.model_manager.generate(query, context)
+            
+            if result["usage"]:
+                self._record_usage(result["usage"], sources)
             
             return {
-                "answer": answer,
+                "answer": result["text"],
                 "context": context_parts,
                 "sources": sources,
-                "similar_chunks": similar_chunks
+                "similar_chunks": similar_chunks,
+                "retrieval": retrieval,
+                "usage": result["usage"]
             }
             
         except Exception as e:
@@ -134,6 +221,72 @@ class RAGSystem:
                 "sources": []
             }
     
+    def _record_usage(self, usage: Dict[str, Any], sources: List[Dict[str, Any]]) -> None:
+        """Add an answer's usage, already in the session totals, to its documents by share of context chunks"""
+        counts: Dict[str, int] = {}
+        for source in sources:
+            if source.get("file_id"):
+                counts[source["file_id"]] = counts.get(source["file_id"], 0) + 1
+        if counts:
+            total = sum(counts.values())
+            try:
+                self.embedding_system.registry.record_usage(
+                    {file_id: count / total for file_id, count in counts.items()}, usage
+                )
+            except Exception as e:
+                logger.warning(f"Could not record document usage: {str(e)}")
+    
+    def _retrieve_for_conversation(self, query: str, file_id: str, top_k: int, file_ids: List[str],
+                                   conversation) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Retrieve chunks for a question asked within a conversation
+        
+        Follow-ups are condensed into a standalone query, "page N" references
+        become a metadata filter, and follow-ups the working set of recently
+        retrieved chunks covers well are answered without querying the vector store.
+        
+        Returns:
+            tuple: The chunks, and how they were retrieved
+        """
+        standalone, follow_up = conversation.standalone_query(query, rewrite=self.model_manager.rewrite_query)
+        pages = page_filter(query)
+        targets = [file_id] if file_id else file_ids
+        retrieval = {"standalone_query": standalone, "follow_up": follow_up, "pages": pages}
+        
+        similar_chunks = None
+        if follow_up:
+            # The condensed query contains the previous question, so it is always close to what
+            # that question retrieved; the working set must be close to the new question itself
+            query_embedding, question_embedding = self.embedding_system.generate_embeddings([standalone, query])
+            similar_chunks = conversation.working_set.search(question_embedding, top_k, pages=pages, file_ids=targets)
+        else:
+            query_embedding = self.embedding_system.generate_embeddings([standalone])[0]
+        
+        if similar_chunks is not None:
+            conversation.working_set_hits += 1
+            retrieval["source"] = "working_set"
+        else:
+            retrieval["source"] = "vector_store"
+            where = None
+            if pages:
+                where = {"page": pages[0]} if len(pages) == 1 else {"page": {"$in": pages}}
+            similar_chunks = self.embedding_system.search_similar_chunks(
+                standalone, file_id, top_k, file_ids=file_ids, where=where,
+                query_embedding=query_embedding, keep_embeddings=True
+            )
+            if not similar_chunks and where is not None:
+                # The referenced pages hold nothing retrievable; search the whole document instead
+                retrieval["pages"] = None
+                similar_chunks = self.embedding_system.search_similar_chunks(
+                    standalone, file_id, top_k, file_ids=file_ids,
+                    query_embedding=query_embedding, keep_embeddings=True
+                )
+            conversation.working_set.add(similar_chunks)
+        
+        conversation.remember_query(query, standalone, follow_up)
+        logger.info(f"Retrieved {len(similar_chunks)} chunks from the {retrieval['source']} for '{standalone}'")
+        return similar_chunks, retrieval
+    
     def _generate_answer_with_openai(self, query: str, context: str) -> str:
         """
         Generate answer using OpenAI GPT
@@ -194,6 +347,10 @@ Answer:"""
         """Test connection to current model"""
         return self.model_manager.test_model_connection()
     
+    def get_table(self, table_id: str) -> Dict[str, Any]:
+        """Load a table referenced by a table source"""
+        return self.embedding_system.get_table(table_id)
+    
     def get_document_summary(self, file_id: str) -> Dict[str, Any]:
         """
         Get a summary of a document
@@ -205,43 +362,30 @@ Answer:"""
             Document summary information
         """
         try:
-            chunks = self.embedding_system.get_document_chunks(file_id)
+            manifest = self.embedding_system.get_document_manifest(file_id)
             
-            if not chunks:
+            if not manifest:
                 return {"error": "Document not found or has no chunks"}
             
-            # Count different content types
-            type_counts = {}
-            total_pages = set()
-            
-            for chunk in chunks:
-                chunk_type = chunk["metadata"].get("type", "unknown")
-                type_counts[chunk_type] = type_counts.get(chunk_type, 0) + 1
-                
-                page = chunk["metadata"].get("page", 0)
-                if page:
-                    total_pages.add(page)
-            
-            # Get sample content
-            sample_texts = []
-            for chunk in chunks[:3]:  # First 3 chunks
-                content = chunk["content"][:200] + "..." if len(chunk["content"]) > 200 else chunk["content"]
-                sample_texts.append(content)
+            # Documents ingested before manifests existed: take samples once and keep them
+            if "sample_content" not in manifest:
+                chunks = self.embedding_system.get_document_chunks(file_id)
+                manifest["sample_content"] = [self._snippet(chunk["content"]) for chunk in chunks[:3]]
+                self.embedding_system.save_document_manifest(file_id, {"sample_content": manifest["sample_content"]})
             
-            return {
-                "total_chunks": len(chunks),
-                "total_pages": len(total_pages),
-                "content_types": type_counts,
-                "sample_content": sample_texts
-            }
+            return manifest
             
         except Exception as e:
             logger.error(f"Error getting document summary: {str(e)}")
             return {"error": str(e)}
     
+    def _snippet(self, content: str) -> str:
+        """First 200 characters of a chunk for summaries"""
+        return content[:200] + "..." if len(content) > 200 else content
+    
     def delete_document(self, file_id: str) -> bool:
         """
-        Delete a document and its embeddings
+        Delete a document, its embeddings and its uploaded PDF
         
         Args:
             file_id: Document file ID
@@ -250,7 +394,13 @@ Answer:"""
             bool: Success status
         """
         try:
-            return self.embedding_system.delete_document(file_id)
+            success = self.embedding_system.delete_document(file_id)
+            
+            # The stored PDF is removed once no other upload shares its content
+            if success and self.uploader.delete_file(file_id):
+                logger.info(f"Removed uploaded file for document {file_id}")
+            
+            return success
         except Exception as e:
             logger.error(f"Error deleting document: {str(e)}")
             return False
@@ -266,10 +416,15 @@ Answer:"""
             collection_stats = self.embedding_system.get_collection_stats()
             
             return {
+                "tenant_id": self.tenant_id,
                 "embedding_model": "all-MiniLM-L6-v2",
                 "chunk_size": CHUNK_SIZE,
                 "chunk_overlap": CHUNK_OVERLAP,
-                "openai_configured": self.openai_client is not None,
+                "chunking_strategy": CHUNKING_STRATEGY,
+                "openai_configured": bool(OPENAI_API_KEY),
+                "garbage_collection": self.garbage_collector.last_report if self.garbage_collector else None,
+                "usage": self.usage.summary(),
+                "ingest_queue": get_ingest_stats(),
                 **collection_stats
             }
             
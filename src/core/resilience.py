@@ -0,0 +1,259 @@
+"""
+Retries, deadlines and circuit breakers for remote calls
+Transient failures (rate limits, 5xx responses, dropped connections) are
+retried with jittered exponential backoff within the caller's deadline,
+honouring Retry-After; a provider that keeps failing has its circuit
+opened so requests fail fast instead of piling up retries
+"""
+
+import time
+import random
+import logging
+import threading
+import contextvars
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Callable
+from ..config.config import (
+    LLM_MAX_RETRIES, LLM_RETRY_BASE_SECONDS, LLM_RETRY_MAX_SECONDS,
+    BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Exception classes of requests, httpx, openai and ollama that mean the call never got a real answer
+RETRYABLE_ERROR_NAMES = {
+    "ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout", "ConnectError", "ReadError",
+    "WriteError", "RemoteProtocolError", "PoolTimeout", "APIConnectionError", "APITimeoutError"
+}
+
+_current_deadline: contextvars.ContextVar = contextvars.ContextVar("deadline", default=None)
+_breakers: Dict[str, "CircuitBreaker"] = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a call's deadline leaves no time for another attempt"""
+
+
+class Deadline:
+    """
+    Point in time by which a request must be answered
+
+    Args:
+        seconds: Time budget from now
+    """
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left, never negative"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline of the call running in this thread, if any"""
+    return _current_deadline.get()
+
+
+def remaining_time(default: float) -> float:
+    """Time left before the current deadline, or the default without one; used as a per-call timeout"""
+    deadline = current_deadline()
+    return min(default, deadline.remaining()) if deadline else default
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an error is transient: a retryable HTTP status or a dropped or timed-out connection"""
+    if isinstance(error, (CircuitOpenError, DeadlineExceededError)):
+        return False
+    status = getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return isinstance(error, ConnectionError) or any(
+        cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__
+    )
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds the server asked to wait (Retry-After / retry-after-ms headers), if any
+
+    openai and requests errors carry the HTTP response. ollama.ResponseError
+    does not, but it is raised while handling httpx's HTTPStatusError, which
+    keeps the response and stays reachable as __context__. Errors without a
+    response (connection failures) return None and get plain backoff.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        response = getattr(error.__context__, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = LLM_RETRY_BASE_SECONDS, cap: float = LLM_RETRY_MAX_SECONDS) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^attempt)]"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one provider
+
+    Closed: calls pass. After ``failure_threshold`` consecutive transient
+    failures it opens and calls fail fast. After ``reset_timeout`` it is
+    half-open: one trial call passes, and its outcome closes or reopens it.
+
+    Args:
+        name: Provider name, for logs and status
+        failure_threshold: Consecutive failures that open the circuit
+        reset_timeout: Seconds an open circuit waits before a trial call
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> None:
+        """
+        Admit a call
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with its trial call running
+        """
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "open" or (self.state == "half_open" and self._trial_in_flight):
+                raise CircuitOpenError(f"Circuit for {self.name} is open")
+            if self.state == "half_open":
+                self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                logger.warning(f"Circuit for {self.name} opened after {self.failures} consecutive failures")
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            status = {"state": self.state, "consecutive_failures": self.failures, "times_opened": self.times_opened}
+            if self.state == "open":
+                status["retry_in_s"] = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+            return status
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """The process-wide circuit breaker of a provider"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def get_breaker_status() -> Dict[str, Dict[str, Any]]:
+    """State of every provider's circuit breaker"""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.get_status() for name, breaker in breakers.items()}
+
+
+def call_with_retries(fn: Callable[[], Any], deadline: Optional[Deadline] = None,
+                      breaker: Optional[CircuitBreaker] = None, max_retries: int = LLM_MAX_RETRIES,
+                      retryable: Callable[[Exception], bool] = is_retryable) -> Any:
+    """
+    Call fn, retrying transient failures with jittered backoff
+
+    The deadline is visible to fn through current_deadline(), so it can
+    bound its own timeouts. A retry is only made if its wait, the larger of
+    the backoff and the server's Retry-After, still fits the deadline.
+
+    Args:
+        fn: The call
+        deadline: Time by which the call must have succeeded
+        breaker: Circuit breaker admitting each attempt and recording its outcome
+        max_retries: Retries after the first attempt
+        retryable: Predicate selecting the errors worth retrying
+
+    Returns:
+        fn's result
+
+    Raises:
+        The last error, CircuitOpenError or DeadlineExceededError
+    """
+    token = _current_deadline.set(deadline)
+    try:
+        attempt = 0
+        while True:
+            if deadline and deadline.expired():
+                raise DeadlineExceededError("Deadline exceeded before the call could be made")
+            if breaker:
+                breaker.allow()
+            try:
+                result = fn()
+            except Exception as e:
+                transient = retryable(e)
+                if breaker:
+                    # Only transient failures say something about the provider's health
+                    if transient:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success()
+                if not transient or attempt >= max_retries:
+                    raise
+                delay = max(backoff_delay(attempt), retry_after(e) or 0)
+                if deadline and delay >= deadline.remaining():
+                    raise
+                logger.warning(f"Transient failure ({e}), retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            if breaker:
+                breaker.record_success()
+            return result
+    finally:
+        _current_deadline.reset(token)
@@ -0,0 +1,137 @@
+"""
+Side store for extracted tables
+Tables are written once per document, referenced by ID from chunk metadata
+and only loaded when a table source is expanded
+"""
+
+import os
+import glob
+import gzip
+import json
+import logging
+from importlib.util import find_spec
+from typing import List, Dict, Any, Optional
+from ..config.config import TABLES_FOLDER
+
+# Parquet is preferred; fall back to gzipped JSON if pyarrow is not installed.
+# Only looked up here: pyarrow itself is imported when a table is first written or read
+PYARROW_AVAILABLE = find_spec("pyarrow") is not None
+if not PYARROW_AVAILABLE:
+    logging.warning("pyarrow not available. Tables will be stored as gzipped JSON.")
+
+logger = logging.getLogger(__name__)
+
+class TableStore:
+    """Stores table data outside the vector store, one file per table"""
+
+    def __init__(self, directory: str = TABLES_FOLDER):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+        self.extension = ".parquet" if PYARROW_AVAILABLE else ".json.gz"
+
+    @staticmethod
+    def make_table_id(file_id: str, page: int, table_index: int) -> str:
+        """Deterministic table ID for a document's table"""
+        return f"{file_id}_table_{page}_{table_index}"
+
+    def put(self, table_id: str, data: List[Dict[str, Any]], columns: List[Any]) -> None:
+        """
+        Store a table
+
+        Args:
+            table_id: Table identifier
+            data: Table rows as records (column -> value)
+            columns: Column names in order
+        """
+        path = self._path(table_id)
+        tmp_path = f"{path}.tmp"
+        rows = [[record.get(col) for col in columns] for record in data]
+
+        if PYARROW_AVAILABLE:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            # Columns are stored positionally; PDF headers may be empty or repeated
+            arrays = {
+                str(i): [None if row[i] is None else str(row[i]) for row in rows]
+                for i in range(len(columns))
+            }
+            table = pa.table(arrays).replace_schema_metadata(
+                {b"columns": json.dumps(columns, default=str).encode("utf-8")}
+            )
+            pq.write_table(table, tmp_path, compression="zstd")
+        else:
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump({"columns": columns, "rows": rows}, f, default=str)
+
+        os.replace(tmp_path, path)
+
+    def get(self, table_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a table
+
+        Args:
+            table_id: Table identifier
+
+        Returns:
+            dict with "columns" and "data" (records), or None if not found
+        """
+        path = self._path(table_id)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            if PYARROW_AVAILABLE:
+                import pyarrow.parquet as pq
+
+                table = pq.read_table(path)
+                columns = json.loads(table.schema.metadata[b"columns"])
+                rows = zip(*(table.column(str(i)).to_pylist() for i in range(len(columns))))
+            else:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    stored = json.load(f)
+                columns, rows = stored["columns"], stored["rows"]
+
+            return {
+                "columns": columns,
+                "data": [dict(zip(columns, row)) for row in rows]
+            }
+        except Exception as e:
+            logger.error(f"Error loading table {table_id}: {str(e)}")
+            return None
+
+    def exists(self, table_id: str) -> bool:
+        """Whether a table is stored"""
+        return os.path.exists(self._path(table_id))
+
+    def delete(self, table_id: str) -> None:
+        """Delete one table if it is stored"""
+        if self.exists(table_id):
+            os.remove(self._path(table_id))
+
+    def delete_document(self, file_id: str) -> int:
+        """Delete all tables of a document, returning the number removed"""
+        removed = 0
+        for path in glob.glob(os.path.join(self.directory, f"{glob.escape(file_id)}_table_*")):
+            os.remove(path)
+            removed += 1
+        return removed
+
+    def list_documents(self) -> Dict[str, Dict[str, float]]:
+        """Stored bytes and newest modification time per document file ID"""
+        documents: Dict[str, Dict[str, float]] = {}
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and "_table_" in entry.name:
+                stat = entry.stat()
+                usage = documents.setdefault(entry.name.rsplit("_table_", 1)[0], {"bytes": 0, "modified_at": 0})
+                usage["bytes"] += stat.st_size
+                usage["modified_at"] = max(usage["modified_at"], stat.st_mtime)
+        return documents
+
+    def clear(self) -> None:
+        """Delete all stored tables"""
+        for path in glob.glob(os.path.join(self.directory, "*")):
+            os.remove(path)
+
+    def _path(self, table_id: str) -> str:
+        return os.path.join(self.directory, f"{table_id}{self.extension}")
@@ -0,0 +1,120 @@
+"""
+Tenant isolation helpers
+Each tenant gets its own upload folder and vector index, quotas with
+oldest-first eviction, and a cap on concurrent ingests; a global cap,
+shared fairly between tenants, bounds the ingests of all tenants together
+"""
+
+import os
+import re
+import logging
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any
+from ..config.config import (
+    DEFAULT_TENANT, TENANT_MAX_DOCUMENTS, TENANT_MAX_CHUNKS, TENANT_MAX_CONCURRENT_INGESTS,
+    INGEST_MAX_CONCURRENT, INGEST_QUEUE_TIMEOUT_SECONDS
+)
+from .provider_scheduler import ProviderQueue
+
+logger = logging.getLogger(__name__)
+
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_ingest_slots: Dict[str, threading.BoundedSemaphore] = {}
+_ingest_slots_lock = threading.Lock()
+# Round-robin by tenant, so a tenant with a bulk upload cannot starve the others
+_global_ingest_slots = ProviderQueue(INGEST_MAX_CONCURRENT)
+
+
+class QuotaExceededError(Exception):
+    """Raised when a request cannot fit in a tenant's quota even after eviction"""
+
+
+def validate_tenant_id(tenant_id: str) -> str:
+    """Return the tenant ID if it is safe to use in paths, raise ValueError otherwise"""
+    if not tenant_id or not TENANT_ID_PATTERN.match(tenant_id):
+        raise ValueError(f"Invalid tenant ID: {tenant_id!r}")
+    return tenant_id
+
+
+def tenant_directory(base_directory: str, tenant_id: str) -> str:
+    """
+    Storage directory of a tenant under a base directory
+
+    The default tenant keeps using the base directory itself so existing
+    single-tenant deployments keep their data.
+    """
+    validate_tenant_id(tenant_id)
+    if tenant_id == DEFAULT_TENANT:
+        return base_directory
+    return os.path.join(base_directory, "tenants", tenant_id)
+
+
+@contextmanager
+def ingest_slot(tenant_id: str):
+    """
+    Hold one of the tenant's ingest slots and one of the global ones for the duration of the block
+
+    Raises:
+        TimeoutError: If no global slot was granted within INGEST_QUEUE_TIMEOUT_SECONDS
+    """
+    with _ingest_slots_lock:
+        if tenant_id not in _ingest_slots:
+            _ingest_slots[tenant_id] = threading.BoundedSemaphore(TENANT_MAX_CONCURRENT_INGESTS)
+        slot = _ingest_slots[tenant_id]
+
+    slot.acquire()
+    try:
+        _global_ingest_slots.acquire(tenant_id, timeout=INGEST_QUEUE_TIMEOUT_SECONDS)
+        try:
+            yield
+        finally:
+            _global_ingest_slots.release()
+    finally:
+        slot.release()
+
+
+def get_ingest_stats() -> Dict[str, Any]:
+    """Global ingest slots in use, queued ingests and queue waits"""
+    return _global_ingest_slots.snapshot()
+
+
+class TenantQuota:
+    """Document and chunk limits for a tenant's vector index"""
+
+    def __init__(self, max_documents: int = TENANT_MAX_DOCUMENTS, max_chunks: int = TENANT_MAX_CHUNKS):
+        self.max_documents = max_documents
+        self.max_chunks = max_chunks
+
+    def plan_eviction(self, documents: List[Dict[str, Any]], incoming_chunks: int) -> List[str]:
+        """
+        Choose documents to evict so a new document fits, oldest first
+
+        Args:
+            documents: Stored documents as dicts with "file_id", "chunks" and "created_at"
+            incoming_chunks: Chunk count of the document about to be stored
+
+        Returns:
+            list: File IDs to evict (empty if the document already fits)
+
+        Raises:
+            QuotaExceededError: If the document alone exceeds the chunk quota
+        """
+        if incoming_chunks > self.max_chunks:
+            raise QuotaExceededError(
+                f"Document has {incoming_chunks} chunks, tenant quota is {self.max_chunks}"
+            )
+
+        document_count = len(documents)
+        chunk_count = sum(document["chunks"] for document in documents)
+        evict = []
+
+        for document in sorted(documents, key=lambda d: d["created_at"]):
+            if document_count + 1 <= self.max_documents and chunk_count + incoming_chunks <= self.max_chunks:
+                break
+            evict.append(document["file_id"])
+            document_count -= 1
+            chunk_count -= document["chunks"]
+
+        return evict
@@ -0,0 +1,99 @@
+"""
+Token usage, timing and cost accounting for LLM generations
+Every generation reports its prompt and completion tokens, time to first
+token, latency, model and estimated cost; ledgers aggregate them per session
+"""
+
+import time
+import threading
+import numpy as np
+from collections import deque
+from typing import Dict, Any, Optional
+from ..config.config import MODEL_PRICING, USAGE_LATENCY_WINDOW
+
+
+def estimate_cost(provider: str, model: str, prompt_tokens: Optional[int],
+                  completion_tokens: Optional[int]) -> Optional[float]:
+    """Estimated USD cost of a generation; 0 for local models, None if unpriced or tokens unknown"""
+    if provider == "ollama":
+        return 0.0
+    if model not in MODEL_PRICING or prompt_tokens is None or completion_tokens is None:
+        return None
+    prompt_price, completion_price = MODEL_PRICING[model]
+    return round((prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000, 6)
+
+
+def make_usage(provider: str, model: str, started: float, first_token_at: Optional[float],
+               prompt_tokens: Optional[int], completion_tokens: Optional[int], **extra: Any) -> Dict[str, Any]:
+    """
+    Usage record of one generation
+
+    Args:
+        provider: "openai" or "ollama"
+        model: Provider model name
+        started: time.perf_counter() when the request was sent
+        first_token_at: time.perf_counter() when the first answer token arrived
+        prompt_tokens: Tokens the provider evaluated for the prompt
+        completion_tokens: Tokens generated
+        extra: Provider-specific fields (cached tokens, load time, ...); None values are dropped
+
+    Returns:
+        dict: provider, model, token counts, ttft_s, latency_s, cost_usd and extras
+    """
+    usage = {
+        "provider": provider,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": (prompt_tokens or 0) + (completion_tokens or 0),
+        "ttft_s": round(first_token_at - started, 3) if first_token_at else None,
+        "latency_s": round(time.perf_counter() - started, 3),
+        "cost_usd": estimate_cost(provider, model, prompt_tokens, completion_tokens)
+    }
+    usage.update({key: value for key, value in extra.items() if value is not None})
+    return usage
+
+
+def _percentile(values, q: float) -> Optional[float]:
+    return round(float(np.percentile(values, q)), 3) if values else None
+
+
+class UsageLedger:
+    """Running usage totals, per model, with TTFT and latency percentiles over recent generations"""
+
+    def __init__(self, window: int = USAGE_LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._totals = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+        self._by_model: Dict[str, Dict[str, Any]] = {}
+        self._ttft: deque = deque(maxlen=window)
+        self._latency: deque = deque(maxlen=window)
+
+    def add(self, usage: Dict[str, Any]) -> None:
+        """Add one generation's usage record"""
+        with self._lock:
+            model = self._by_model.setdefault(
+                usage["model"], {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+            )
+            for totals in (self._totals, model):
+                totals["requests"] += 1
+                totals["prompt_tokens"] += usage.get("prompt_tokens") or 0
+                totals["completion_tokens"] += usage.get("completion_tokens") or 0
+                totals["cost_usd"] = round(totals["cost_usd"] + (usage.get("cost_usd") or 0), 6)
+            if usage.get("ttft_s") is not None:
+                self._ttft.append(usage["ttft_s"])
+            self._latency.append(usage.get("total_s", usage["latency_s"]))
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals, per-model totals and TTFT/latency percentiles"""
+        with self._lock:
+            ttft = list(self._ttft)
+            latency = list(self._latency)
+            return {
+                **self._totals,
+                "total_tokens": self._totals["prompt_tokens"] + self._totals["completion_tokens"],
+                "ttft_p50_s": _percentile(ttft, 50),
+                "ttft_p95_s": _percentile(ttft, 95),
+                "latency_p50_s": _percentile(latency, 50),
+                "latency_p95_s": _percentile(latency, 95),
+                "by_model": {name: dict(totals) for name, totals in self._by_model.items()}
+            }
@@ -0,0 +1,105 @@
+"""
+Process warm-up and readiness signalling
+Loads the embedding model, opens the vector store and pages the Ollama
+model into memory before the first user arrives, then writes a readiness
+file that the container health check waits for
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, Any
+from ..config.config import (
+    DEFAULT_TENANT, READY_FILE, WARMUP_OLLAMA_MODEL, OLLAMA_KEEP_ALIVE
+)
+
+logger = logging.getLogger(__name__)
+
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+
+
+def clear_ready() -> None:
+    """Remove a readiness file left over from a previous process"""
+    if os.path.exists(READY_FILE):
+        os.remove(READY_FILE)
+
+
+def mark_ready(report: Dict[str, Any]) -> None:
+    """Write the readiness file with the warm-up report"""
+    os.makedirs(os.path.dirname(READY_FILE) or ".", exist_ok=True)
+    with open(READY_FILE, "w") as f:
+        json.dump(report, f)
+
+
+def is_ready() -> bool:
+    """Whether warm-up has completed in this deployment"""
+    return os.path.exists(READY_FILE)
+
+
+def warm_up() -> Dict[str, Any]:
+    """
+    Run one dummy encode, one vector search and one Ollama request
+
+    The embedding steps must succeed for the process to be marked ready:
+    every shard of the default tenant is queried and any error fails
+    warm-up. The Ollama step is skipped if Ollama is not reachable.
+
+    Returns:
+        dict: Seconds spent per step, shards searched and whether the process is ready
+    """
+    report: Dict[str, Any] = {"steps": {}, "ready": False}
+    started = time.perf_counter()
+
+    try:
+        from .embedding_system import EmbeddingSystem, load_embedding_model
+
+        # Model weights and torch kernels
+        step = time.perf_counter()
+        load_embedding_model().encode(["warm-up"], convert_to_numpy=True)
+        report["steps"]["embedding_model_s"] = round(time.perf_counter() - step, 3)
+
+        # Chroma client and the HNSW indexes of the default tenant; any failing shard fails warm-up
+        step = time.perf_counter()
+        report["shards_searched"] = EmbeddingSystem(tenant_id=DEFAULT_TENANT).check_search()
+        report["steps"]["vector_search_s"] = round(time.perf_counter() - step, 3)
+        if not report["shards_searched"]:
+            logger.info("No documents stored yet: the vector store opened, but no index was searched")
+
+        report["ready"] = True
+    except Exception as e:
+        logger.error(f"Embedding warm-up failed: {str(e)}")
+        report["error"] = str(e)
+
+    if WARMUP_OLLAMA_MODEL:
+        step = time.perf_counter()
+        try:
+            from .model_manager import ollama_client, ollama_options
+            # An empty prompt loads the model without generating; keep_alive keeps it resident.
+            # The runner options match what answers use, so the first answer does not reload it.
+            ollama_client().generate(model=WARMUP_OLLAMA_MODEL, prompt="",
+                                     options=ollama_options(WARMUP_OLLAMA_MODEL),
+                                     keep_alive=OLLAMA_KEEP_ALIVE)
+            report["steps"]["ollama_s"] = round(time.perf_counter() - step, 3)
+        except Exception as e:
+            logger.warning(f"Skipping Ollama warm-up: {str(e)}")
+
+    report["total_s"] = round(time.perf_counter() - started, 3)
+
+    if report["ready"]:
+        mark_ready(report)
+        logger.info(f"Warm-up complete in {report['total_s']}s: {report['steps']}")
+
+    return report
+
+
+def start_warmup() -> threading.Thread:
+    """Run warm-up once per process in a background thread"""
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+            _warmup_thread.start()
+        return _warmup_thread
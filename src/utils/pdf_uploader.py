@@ -1,18 +1,39 @@
-import streamlit as st
 import os
 import uuid
 from datetime import datetime
-import shutil
+import hashlib
+import logging
+from ..config.config import DEFAULT_TENANT, TENANT_MAX_UPLOAD_MB, UPLOAD_CHUNK_BYTES, UPLOAD_INDEX_NAME
+from ..core.tenancy import tenant_directory
+from .upload_index import UploadIndex
+
+logger = logging.getLogger(__name__)
 
 class PDFUploader:
-    def __init__(self, upload_folder="uploads"):
-        self.upload_folder = upload_folder
+    """
+    Stores uploaded PDFs content-addressed under hash-sharded directories
+    
+    A file with SHA-256 ``abcd...`` lives at ``objects/ab/cd/abcd....pdf``,
+    so no directory grows past a few hundred entries and identical uploads
+    share one file. The upload index records which file ID points at which
+    content, and serves listing, age-based cleanup and size accounting.
+    """
+    
+    def __init__(self, upload_folder="uploads", tenant_id=DEFAULT_TENANT, max_upload_mb=TENANT_MAX_UPLOAD_MB):
+        self.tenant_id = tenant_id
+        self.upload_folder = tenant_directory(upload_folder, tenant_id)
+        self.objects_folder = os.path.join(self.upload_folder, "objects")
+        self.incoming_folder = os.path.join(self.upload_folder, "incoming")
+        self.max_upload_bytes = max_upload_mb * 1024 * 1024
         self.ensure_upload_folder()
+        self.index = UploadIndex(os.path.join(self.upload_folder, UPLOAD_INDEX_NAME))
+        if self.index.is_empty():
+            self._import_flat_files()
     
     def ensure_upload_folder(self):
         """Create upload folder if it doesn't exist"""
-        if not os.path.exists(self.upload_folder):
-            os.makedirs(self.upload_folder)
+        for folder in (self.upload_folder, self.objects_folder, self.incoming_folder):
+            os.makedirs(folder, exist_ok=True)
     
     def upload_pdf(self, uploaded_file):
         """
@@ -26,25 +47,33 @@ class PDFUploader:
         """
         if uploaded_file is None:
             return None
+        
+        # Keep the tenant's uploads within its storage quota
+        if not self._make_room(uploaded_file.size):
+            logger.error(f"Upload of {uploaded_file.size} bytes exceeds tenant '{self.tenant_id}' storage quota")
+            return None
             
-        # Generate unique filename
+        # Generate unique file ID; the stored file is named after its content hash
         file_id = str(uuid.uuid4())
-        file_extension = uploaded_file.name.split('.')[-1]
-        filename = f"{file_id}.{file_extension}"
+        tmp_path = os.path.join(self.incoming_folder, f"{file_id}.part")
         
-        # Save file
-        file_path = os.path.join(self.upload_folder, filename)
+        sha256 = self._stream_to_disk(uploaded_file, tmp_path)
+        if sha256 is None:
+            return None
         
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        # Deleting the last upload of the same content checks and unlinks under the same lock
+        with self.index.lock:
+            file_path = self._store_object(tmp_path, sha256)
+            self.index.add(file_id, sha256, file_path, uploaded_file.size, uploaded_file.name)
         
         # Return file information
         file_info = {
             "id": file_id,
             "original_name": uploaded_file.name,
-            "filename": filename,
+            "filename": os.path.basename(file_path),
             "file_path": file_path,
             "size": uploaded_file.size,
+            "sha256": sha256,
             "upload_time": datetime.now().isoformat(),
             "type": uploaded_file.type
         }
@@ -52,41 +81,143 @@ class PDFUploader:
         return file_info
     
     def get_uploaded_files(self):
-        """Get list of all uploaded files"""
-        if not os.path.exists(self.upload_folder):
-            return []
+        """Get list of all uploaded files, oldest first, from the upload index"""
+        return [
+            {
+                "id": record["file_id"],
+                "filename": record["original_name"],
+                "file_path": record["path"],
+                "size": record["size"],
+                "sha256": record["sha256"],
+                "modified_time": datetime.fromtimestamp(record["uploaded_at"]).isoformat()
+            }
+            for record in self.index.list()
+        ]
+    
+    def get_storage_usage(self):
+        """Bytes used by this tenant's uploads (shared content counted once)"""
+        return self.index.total_bytes()
+    
+    def _object_path(self, sha256):
+        return os.path.join(self.objects_folder, sha256[:2], sha256[2:4], f"{sha256}.pdf")
+    
+    def _store_object(self, tmp_path, sha256):
+        """Move a validated upload into its content-addressed location"""
+        file_path = self._object_path(sha256)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        if os.path.exists(file_path):
+            # Same content already stored: keep one copy
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, file_path)
+        return file_path
+    
+    def _import_flat_files(self):
+        """Move uploads from the former flat layout into the hash-sharded layout (runs once)"""
+        imported = 0
+        for entry in os.scandir(self.upload_folder):
+            if not (entry.is_file() and entry.name.endswith(".pdf")):
+                continue
+            digest = hashlib.sha256()
+            with open(entry.path, "rb") as f:
+                for chunk in iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b""):
+                    digest.update(chunk)
+            stat = entry.stat()
+            with self.index.lock:
+                file_path = self._store_object(entry.path, digest.hexdigest())
+                self.index.add(entry.name[:-len(".pdf")], digest.hexdigest(), file_path,
+                               stat.st_size, entry.name, stat.st_mtime)
+            imported += 1
+        if imported:
+            logger.info(f"Moved {imported} uploads into the hash-sharded layout")
+    
+    def _stream_to_disk(self, uploaded_file, file_path):
+        """
+        Copy an upload to disk in fixed-size chunks, hashing and validating it in the same pass
         
-        files = []
-        for filename in os.listdir(self.upload_folder):
-            if filename.endswith('.pdf'):
-                file_path = os.path.join(self.upload_folder, filename)
-                file_info = {
-                    "filename": filename,
-                    "file_path": file_path,
-                    "size": os.path.getsize(file_path),
-                    "modified_time": datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
-                }
-                files.append(file_info)
+        The file is kept only if it looks like a complete PDF (``%PDF-``
+        header, ``%%EOF`` trailer); otherwise it is removed again.
         
-        return files
+        Args:
+            uploaded_file: File-like object with read()
+            file_path: Destination path
+            
+        Returns:
+            str: SHA-256 hex digest, or None if the upload is not a valid PDF
+        """
+        digest = hashlib.sha256()
+        head = b""
+        tail = b""
+        
+        try:
+            if hasattr(uploaded_file, "seek"):
+                uploaded_file.seek(0)
+            with open(file_path, "wb") as f:
+                while True:
+                    chunk = uploaded_file.read(UPLOAD_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    if len(head) < 5:
+                        head += chunk[:5 - len(head)]
+                    # The trailer may be followed by whitespace or a little junk
+                    tail = (tail + chunk[-1024:])[-1024:]
+                    f.write(chunk)
+            
+            if not head.startswith(b"%PDF-") or b"%%EOF" not in tail:
+                logger.error(f"Rejected upload {getattr(uploaded_file, 'name', file_path)}: not a complete PDF")
+                os.remove(file_path)
+                return None
+            
+            return digest.hexdigest()
+            
+        except Exception as e:
+            logger.error(f"Error saving upload: {str(e)}")
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            return None
     
-    def delete_file(self, filename):
-        """Delete uploaded file"""
-        file_path = os.path.join(self.upload_folder, filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            return True
-        return False
+    def _make_room(self, incoming_bytes):
+        """Delete the tenant's oldest uploads until the incoming file fits the quota"""
+        if incoming_bytes > self.max_upload_bytes:
+            return False
+        
+        used = self.index.total_bytes()
+        for record in self.index.list():
+            if used + incoming_bytes <= self.max_upload_bytes:
+                break
+            logger.info(f"Evicting upload {record['file_id']} to stay within tenant '{self.tenant_id}' quota")
+            if self.delete_file(record["file_id"]):
+                used -= record["size"]
+        
+        return True
+    
+    def delete_file(self, file_id):
+        """
+        Delete an uploaded file
+        
+        Returns:
+            bool: True if stored bytes were freed (no other upload shares the content)
+        """
+        # An upload of the same content stores and indexes under the same lock,
+        # so it cannot slip in between the reference count and the unlink
+        with self.index.lock:
+            record = self.index.remove(file_id)
+            if record is None:
+                return False
+            if record["last_reference"] and os.path.exists(record["path"]):
+                os.remove(record["path"])
+                return True
+            return False
     
     def cleanup_old_files(self, days=7):
-        """Clean up files older than specified days"""
-        if not os.path.exists(self.upload_folder):
-            return
+        """Clean up files older than specified days (the garbage collector then drops their vectors)"""
+        cutoff_time = datetime.now().timestamp() - (days * 24 * 60 * 60)
         
-        current_time = datetime.now().timestamp()
-        cutoff_time = current_time - (days * 24 * 60 * 60)
+        for record in self.index.list(older_than=cutoff_time):
+            self.delete_file(record["file_id"])
         
-        for filename in os.listdir(self.upload_folder):
-            file_path = os.path.join(self.upload_folder, filename)
-            if os.path.getmtime(file_path) < cutoff_time:
-                os.remove(file_path)
+        # Leftovers of interrupted uploads
+        for entry in os.scandir(self.incoming_folder):
+            if entry.is_file() and entry.stat().st_mtime < cutoff_time:
+                os.remove(entry.path)
@@ -0,0 +1,127 @@
+"""
+Metadata index for uploaded PDFs
+Uploads are stored content-addressed under hash-sharded directories; this
+SQLite index answers listing, age and size queries without directory scans
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    file_id TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    original_name TEXT,
+    uploaded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploads_uploaded_at ON uploads (uploaded_at);
+CREATE INDEX IF NOT EXISTS uploads_sha256 ON uploads (sha256);
+"""
+
+_locks: Dict[str, threading.RLock] = {}
+_locks_lock = threading.Lock()
+
+
+def index_lock(path: str) -> threading.RLock:
+    """Lock shared by every UploadIndex of the same file in this process"""
+    with _locks_lock:
+        return _locks.setdefault(os.path.abspath(path), threading.RLock())
+
+
+class UploadIndex:
+    """
+    File ID -> content hash, path, size and upload time for one upload folder
+
+    ``lock`` is shared by every index of the same folder: callers hold it
+    to pair a stored object's file operations with the index change, so an
+    upload of content being deleted never ends up pointing at a removed file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = index_lock(path)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def add(self, file_id: str, sha256: str, path: str, size: int,
+            original_name: Optional[str] = None, uploaded_at: Optional[float] = None) -> None:
+        """Record an upload"""
+        with self.lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO uploads (file_id, sha256, path, size, original_name, uploaded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (file_id, sha256, path, size, original_name, uploaded_at or time.time())
+            )
+
+    def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """One upload's record, or None"""
+        with self.lock:
+            row = self._conn.execute(
+                "SELECT file_id, sha256, path, size, original_name, uploaded_at FROM uploads WHERE file_id = ?",
+                (file_id,)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def remove(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Delete an upload's record
+
+        Returns:
+            dict: The removed record with "last_reference" set if no other
+            upload shares its content, or None if it was not indexed
+        """
+        with self.lock, self._conn:
+            row = self._conn.execute(
+                "SELECT file_id, sha256, path, size, original_name, uploaded_at FROM uploads WHERE file_id = ?",
+                (file_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("DELETE FROM uploads WHERE file_id = ?", (file_id,))
+            others = self._conn.execute(
+                "SELECT COUNT(*) FROM uploads WHERE sha256 = ?", (row[1],)
+            ).fetchone()[0]
+
+        record = self._to_dict(row)
+        record["last_reference"] = others == 0
+        return record
+
+    def list(self, older_than: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Uploads oldest first, optionally only those uploaded before a timestamp"""
+        query = "SELECT file_id, sha256, path, size, original_name, uploaded_at FROM uploads"
+        params = ()
+        if older_than is not None:
+            query += " WHERE uploaded_at < ?"
+            params = (older_than,)
+        with self.lock:
+            rows = self._conn.execute(query + " ORDER BY uploaded_at", params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def total_bytes(self) -> int:
+        """Bytes on disk; identical uploads share one stored file and count once"""
+        with self.lock:
+            row = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM uploads GROUP BY sha256)"
+            ).fetchone()
+        return row[0]
+
+    def is_empty(self) -> bool:
+        with self.lock:
+            return self._conn.execute("SELECT 1 FROM uploads LIMIT 1").fetchone() is None
+
+    def _to_dict(self, row) -> Dict[str, Any]:
+        return {
+            "file_id": row[0],
+            "sha256": row[1],
+            "path": row[2],
+            "size": row[3],
+            "original_name": row[4],
+            "uploaded_at": row[5]
+        }
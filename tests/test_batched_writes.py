@@ -0,0 +1,89 @@
+"""
+Tests for batched vector store writes
+Run with: python -m pytest tests
+"""
+
+import numpy as np
+import pytest
+
+from src.core import embedding_system
+from src.core.embedding_system import EmbeddingSystem, chunk_ids
+
+
+class FakeShard:
+    """Collection stand-in that fails a set number of upserts, or rejects ndarray embeddings"""
+
+    def __init__(self, failures=0, reject_ndarrays=False):
+        self.failures = failures
+        self.reject_ndarrays = reject_ndarrays
+        self.calls = []
+
+    def upsert(self, embeddings, documents, metadatas, ids):
+        self.calls.append(type(embeddings))
+        if self.reject_ndarrays and isinstance(embeddings, np.ndarray):
+            raise TypeError("expected a list")
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("store unavailable")
+
+
+class FakeModel:
+    def get_sentence_embedding_dimension(self):
+        return 384
+
+
+class FakeClient:
+    def get_max_batch_size(self):
+        return 3
+
+
+@pytest.fixture
+def system(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_system.time, "sleep", lambda seconds: None)
+    monkeypatch.setattr(EmbeddingSystem, "embedding_model", property(lambda self: FakeModel()))
+    system = EmbeddingSystem(str(tmp_path))
+    system._client = FakeClient()
+    return system
+
+
+def write(system, shard):
+    system._write_batch(shard, ["a_chunk_0"], np.zeros((1, 4), dtype=np.float32), ["text"], [{"page": 1}])
+
+
+def test_chunk_ids_are_deterministic():
+    assert chunk_ids("doc", 2, 4) == ["doc_chunk_2", "doc_chunk_3"]
+
+
+def test_transient_write_failures_are_retried(system):
+    shard = FakeShard(failures=2)
+    write(system, shard)
+    assert len(shard.calls) == 3
+
+
+def test_write_gives_up_after_max_retries(system):
+    shard = FakeShard(failures=100)
+    with pytest.raises(ConnectionError):
+        write(system, shard)
+    assert len(shard.calls) == embedding_system.WRITE_MAX_RETRIES + 1
+
+
+def test_ndarray_rejection_falls_back_to_lists_in_the_same_attempt(system):
+    shard = FakeShard(reject_ndarrays=True)
+    write(system, shard)
+    assert shard.calls == [np.ndarray, list]
+    assert system._ndarray_writes is False
+
+
+def test_batches_respect_client_batch_size(system):
+    texts = [f"chunk {i}" for i in range(7)]
+    metadatas = [{"page": 1}] * 7
+    assert system._plan_write_batches(texts, metadatas, FakeShard()) == [(0, 3), (3, 6), (6, 7)]
+
+
+def test_batches_respect_byte_budget(system, monkeypatch):
+    monkeypatch.setattr(embedding_system, "WRITE_BATCH_BYTES", 4000)
+    system._client = object()  # no batch size limit to report
+    texts = ["x" * 1000] * 4
+    metadatas = [{"page": 1}] * 4
+    # Each chunk is about 2.5 KB (a 384-dimension vector plus 1 KB of text), so one fits per batch
+    assert system._plan_write_batches(texts, metadatas, FakeShard()) == [(0, 1), (1, 2), (2, 3), (3, 4)]
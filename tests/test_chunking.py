@@ -0,0 +1,65 @@
+"""
+Tests for the layout-aware chunker
+Run with: python -m pytest tests
+"""
+
+from src.core.chunking import SemanticChunker
+
+
+def parsed(blocks):
+    return {"layout_blocks": blocks, "text_content": [], "tables": [], "images": []}
+
+
+def contents(chunks):
+    return "\n\n".join(chunk["content"] for chunk in chunks)
+
+
+def test_every_heading_and_paragraph_is_embedded():
+    blocks = [
+        {"page": 1, "kind": "heading", "text": "Chapter 3 Revenue Recognition"},
+        {"page": 1, "kind": "heading", "text": "3.1 Introduction"},
+        {"page": 1, "kind": "paragraph", "text": "Revenue is recognised when control transfers."},
+        {"page": 1, "kind": "list_item", "text": "- Identify the contract."},
+        {"page": 1, "kind": "heading", "text": "Appendix Zebra Unicorn"},
+        {"page": 2, "kind": "paragraph", "text": "The appendix lists every contract type."},
+        {"page": 2, "kind": "heading", "text": "Glossary"},
+    ]
+    text = contents(SemanticChunker(max_tokens=64).chunk(parsed(blocks)))
+
+    for block in blocks:
+        assert block["text"] in text
+
+
+def test_heading_at_page_end_leads_next_page():
+    blocks = [
+        {"page": 1, "kind": "paragraph", "text": "Closing remarks for the chapter."},
+        {"page": 1, "kind": "heading", "text": "Appendix Zebra Unicorn"},
+        {"page": 2, "kind": "paragraph", "text": "The appendix lists every contract type."},
+    ]
+    chunks = SemanticChunker(max_tokens=64).chunk(parsed(blocks))
+
+    page_two = [chunk for chunk in chunks if chunk["page"] == 2]
+    assert page_two[0]["content"].startswith("Appendix Zebra Unicorn")
+    assert page_two[0]["section"] == "Appendix Zebra Unicorn"
+
+
+def test_section_heading_prefixes_later_chunks():
+    paragraph = "Sentence about revenue recognition and contracts. " * 6
+    blocks = [{"page": 1, "kind": "heading", "text": "Revenue"}] + [
+        {"page": 1, "kind": "paragraph", "text": paragraph} for _ in range(4)
+    ]
+    chunks = SemanticChunker(max_tokens=80).chunk(parsed(blocks))
+
+    assert len(chunks) > 1
+    assert all(chunk["content"].startswith("Revenue") for chunk in chunks)
+
+
+def test_chunks_stay_within_token_budget():
+    blocks = [
+        {"page": 1, "kind": "heading", "text": "Long section"},
+        {"page": 1, "kind": "paragraph", "text": "word " * 500},
+    ]
+    chunker = SemanticChunker(max_tokens=50)
+
+    for chunk in chunker.chunk(parsed(blocks)):
+        assert chunker.count_tokens(chunk["content"]) <= 50
@@ -0,0 +1,60 @@
+"""
+Tests for follow-up detection and the conversation working set
+Run with: python -m pytest tests
+"""
+
+import numpy as np
+
+from src.core.conversation import ConversationSession, WorkingSet, is_follow_up, page_filter
+
+
+def chunk(chunk_id, vector, page=1, file_id="doc"):
+    return {"id": chunk_id, "content": chunk_id, "metadata": {"page": page, "file_id": file_id},
+            "embedding": vector}
+
+
+def test_short_standalone_questions_are_not_follow_ups():
+    assert not is_follow_up("What is the refund policy?")
+    assert not is_follow_up("Revenue in 2023?")
+
+
+def test_pronouns_and_connectives_mark_follow_ups():
+    assert is_follow_up("What does it cost?")
+    assert is_follow_up("And the second quarter?")
+    assert is_follow_up("What about the appendix?")
+
+
+def test_standalone_query_condenses_follow_ups_only():
+    session = ConversationSession()
+    session.remember_query("What was revenue in 2023?", "What was revenue in 2023?")
+
+    assert session.standalone_query("Who signed the contract?") == ("Who signed the contract?", False)
+    query, follow_up = session.standalone_query("And how did it change?")
+    assert follow_up
+    assert query == "What was revenue in 2023? And how did it change?"
+
+
+def test_page_filter():
+    assert page_filter("What is on page 12?") == [12]
+    assert page_filter("Summarise pages 3-5") == [3, 4, 5]
+    assert page_filter("pages 1 to 500") is None
+
+
+def test_working_set_answers_only_when_every_chunk_is_close():
+    working_set = WorkingSet()
+    working_set.add([chunk("a", [1.0, 0.0, 0.0]), chunk("b", [0.9, 0.1, 0.0]), chunk("c", [0.0, 0.0, 1.0])])
+
+    hits = working_set.search(np.array([1.0, 0.0, 0.0]), top_k=2, min_similarity=0.5)
+    assert [hit["id"] for hit in hits] == ["a", "b"]
+    assert "embedding" not in hits[0]
+
+    assert working_set.search(np.array([1.0, 0.0, 0.0]), top_k=3, min_similarity=0.5) is None
+
+
+def test_working_set_filters_and_evicts():
+    working_set = WorkingSet(max_chunks=2)
+    working_set.add([chunk("a", [1.0, 0.0], page=1), chunk("b", [1.0, 0.0], page=2), chunk("c", [1.0, 0.0], page=2)])
+
+    assert len(working_set) == 2
+    assert working_set.search(np.array([1.0, 0.0]), top_k=1, pages=[1]) is None
+    assert working_set.search(np.array([1.0, 0.0]), top_k=1, pages=[2], file_ids=["other"]) is None
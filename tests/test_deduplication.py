@@ -0,0 +1,50 @@
+"""
+Tests for MinHash near-duplicate elimination
+Run with: python -m pytest tests
+"""
+
+from src.core.deduplication import ChunkDeduplicator
+
+BOILERPLATE = ("This document is confidential and intended solely for the use of the individual "
+               "or entity to whom it is addressed. Any distribution or copying is prohibited.")
+
+
+def text_chunk(content, page=1):
+    return {"type": "text", "content": content, "page": page, "source": "pymupdf"}
+
+
+def test_repeated_boilerplate_is_merged_into_first_occurrence():
+    chunks = [text_chunk(BOILERPLATE, page) for page in range(1, 6)]
+    kept, stats = ChunkDeduplicator().deduplicate(chunks)
+
+    assert len(kept) == 1
+    assert [source["page"] for source in kept[0]["merged_sources"]] == [2, 3, 4, 5]
+    assert stats == {"input_chunks": 5, "output_chunks": 1, "removed": 4, "reduction_pct": 80.0}
+
+
+def test_near_duplicate_is_merged_and_distinct_text_kept():
+    near = BOILERPLATE.replace("prohibited.", "strictly prohibited.")
+    other = "Quarterly revenue rose twelve percent while operating costs grew five percent."
+    kept, _ = ChunkDeduplicator().deduplicate([text_chunk(BOILERPLATE), text_chunk(near, 2), text_chunk(other, 3)])
+
+    assert [chunk["content"] for chunk in kept] == [BOILERPLATE, other]
+
+
+def test_tables_and_empty_text_are_never_merged():
+    table = {"type": "table", "content": BOILERPLATE, "page": 1}
+    chunks = [dict(table), dict(table, page=2), text_chunk("   "), text_chunk("   ")]
+    kept, stats = ChunkDeduplicator().deduplicate(chunks)
+
+    assert len(kept) == 4
+    assert stats["removed"] == 0
+
+
+def test_signatures_are_deterministic():
+    first, second = ChunkDeduplicator(seed=7), ChunkDeduplicator(seed=7)
+    assert (first._signature(BOILERPLATE) == second._signature(BOILERPLATE)).all()
+
+
+def test_band_threshold_sits_below_similarity_threshold():
+    deduplicator = ChunkDeduplicator(threshold=0.8, num_perm=64)
+    assert deduplicator.bands * deduplicator.rows == 64
+    assert (1.0 / deduplicator.bands) ** (1.0 / deduplicator.rows) <= 0.8
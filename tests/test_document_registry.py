@@ -0,0 +1,57 @@
+"""
+Tests for the document registry's maintained counters and manifests
+Run with: python -m pytest tests
+"""
+
+from src.core.document_registry import DocumentRegistry
+
+
+def metadata(chunk_type, page):
+    return {"type": chunk_type, "page": page}
+
+
+def test_totals_follow_record_and_remove(tmp_path):
+    registry = DocumentRegistry(str(tmp_path))
+    registry.record_document("a", [metadata("text", 1), metadata("text", 2), metadata("table", 2)], created_at=1.0)
+    registry.record_document("b", [metadata("text", 1)], created_at=2.0)
+
+    assert registry.totals() == {
+        "total_chunks": 4, "unique_documents": 2, "total_pages": 3,
+        "content_types": {"text": 3, "table": 1}
+    }
+    assert registry.get_document("a")["content_types"] == {"text": 2, "table": 1}
+    assert [document["file_id"] for document in registry.list_documents()] == ["a", "b"]
+
+    registry.remove_document("a")
+    assert registry.totals() == {
+        "total_chunks": 1, "unique_documents": 1, "total_pages": 1, "content_types": {"text": 1}
+    }
+    assert registry.get_document("a") is None
+
+
+def test_re_recording_replaces_counters(tmp_path):
+    registry = DocumentRegistry(str(tmp_path))
+    registry.record_document("a", [metadata("text", 1)] * 5)
+    registry.record_document("a", [metadata("image_ocr", 1)] * 2)
+
+    assert registry.totals()["total_chunks"] == 2
+    assert registry.totals()["content_types"] == {"image_ocr": 2}
+
+
+def test_manifest_and_usage_round_trip(tmp_path):
+    registry = DocumentRegistry(str(tmp_path))
+    registry.record_document("a", [metadata("text", 1)])
+    registry.put_manifest("a", {"samples": ["first chunk"]})
+    registry.record_usage({"a": 0.5}, {"prompt_tokens": 100, "completion_tokens": 20, "cost_usd": 0.01})
+
+    assert registry.get_manifest("a") == {"samples": ["first chunk"]}
+    assert registry.get_usage("a") == {"answers": 0.5, "prompt_tokens": 50, "completion_tokens": 10, "cost_usd": 0.005}
+
+    registry.remove_document("a")
+    assert registry.get_manifest("a") is None
+    assert registry.get_usage("a")["answers"] == 0
+
+
+def test_counters_persist_across_instances(tmp_path):
+    DocumentRegistry(str(tmp_path)).record_document("a", [metadata("text", 1)])
+    assert DocumentRegistry(str(tmp_path)).totals()["unique_documents"] == 1
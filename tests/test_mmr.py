@@ -0,0 +1,29 @@
+"""
+Tests for maximal marginal relevance re-ranking
+Run with: python -m pytest tests
+"""
+
+import numpy as np
+
+from src.core.embedding_system import maximal_marginal_relevance
+
+QUERY = np.array([1.0, 0.0, 0.0])
+CANDIDATES = np.array([
+    [0.9, 0.44, 0.0],    # most relevant
+    [0.89, 0.46, 0.0],   # near copy of the first
+    [0.85, -0.53, 0.0],  # about as relevant, different direction
+    [0.0, 0.0, 1.0],     # irrelevant
+])
+
+
+def test_pure_relevance_keeps_similarity_order():
+    assert maximal_marginal_relevance(QUERY, CANDIDATES, 3, lambda_mult=1.0) == [0, 1, 2]
+
+
+def test_diversity_skips_near_copies():
+    assert maximal_marginal_relevance(QUERY, CANDIDATES, 2, lambda_mult=0.5) == [0, 2]
+
+
+def test_never_selects_more_than_available():
+    assert sorted(maximal_marginal_relevance(QUERY, CANDIDATES, 10)) == [0, 1, 2, 3]
+    assert maximal_marginal_relevance(QUERY, np.empty((0, 3)), 5) == []
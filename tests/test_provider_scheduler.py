@@ -0,0 +1,142 @@
+"""
+Tests for per-provider concurrency limits, fair queueing and coalescing
+Run with: python -m pytest tests
+"""
+
+import threading
+import time
+
+import pytest
+
+from src.core.provider_scheduler import ProviderQueue, ProviderScheduler, request_key
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_request_key_depends_on_model_and_payload():
+    assert request_key("ollama", "llama3", "hi") == request_key("ollama", "llama3", "hi")
+    assert request_key("ollama", "llama3", "hi") != request_key("ollama", "mistral", "hi")
+    assert request_key("ollama", "llama3", "hi") != request_key("ollama", "llama3", "hello")
+
+
+def test_slots_are_granted_round_robin_across_sessions():
+    queue = ProviderQueue(limit=1)
+    queue.acquire("holder")
+    order = []
+
+    def wait(session, label):
+        queue.acquire(session)
+        order.append(label)
+        queue.release()
+
+    # Session "busy" queues three requests before "quiet" queues one
+    threads = []
+    for session, label in [("busy", "busy-1"), ("busy", "busy-2"), ("busy", "busy-3"), ("quiet", "quiet-1")]:
+        thread = threading.Thread(target=wait, args=(session, label))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: queue.snapshot()["queued"] == len(threads))
+
+    queue.release()
+    for thread in threads:
+        thread.join()
+
+    assert order[:2] == ["busy-1", "quiet-1"]
+    assert queue.snapshot()["active"] == 0
+
+
+def test_acquire_times_out():
+    queue = ProviderQueue(limit=1)
+    queue.acquire("a")
+    with pytest.raises(TimeoutError):
+        queue.acquire("b", timeout=0.05)
+    assert queue.snapshot()["timeouts"] == 1
+    assert queue.snapshot()["queued"] == 0
+
+
+def test_concurrency_never_exceeds_limit():
+    scheduler = ProviderScheduler({"ollama": 2})
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return "ok"
+
+    threads = [threading.Thread(target=scheduler.run, args=("ollama", f"s{i}", f"key-{i}", call)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak[0] == 2
+    assert scheduler.get_stats()["ollama"]["requests"] == 8
+
+
+def test_identical_requests_in_flight_are_sent_once():
+    scheduler = ProviderScheduler({"openai": 4})
+    release = threading.Event()
+    calls = []
+
+    def call():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(scheduler.run("openai", "s", "same", call)))
+        for _ in range(3)
+    ]
+    threads[0].start()
+    wait_until(lambda: calls)
+    for thread in threads[1:]:
+        thread.start()
+    wait_until(lambda: scheduler.get_stats()["openai"]["coalesced"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["answer"] * 3
+    assert len(calls) == 1
+
+
+def test_followers_get_the_leaders_error():
+    scheduler = ProviderScheduler({"openai": 1})
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ConnectionError("provider down")
+
+    errors = []
+
+    def run():
+        try:
+            scheduler.run("openai", "s", "same", fail)
+        except ConnectionError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=run)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=run)
+    follower.start()
+    wait_until(lambda: scheduler.get_stats()["openai"]["coalesced"] == 1)
+    release.set()
+    leader.join()
+    follower.join()
+
+    assert len(errors) == 2
@@ -0,0 +1,133 @@
+"""
+Tests for retries, Retry-After parsing and circuit breakers
+Run with: python -m pytest tests
+"""
+
+import time
+from email.utils import format_datetime
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from src.core import resilience
+from src.core.resilience import (
+    CircuitBreaker, CircuitOpenError, Deadline, call_with_retries, is_retryable, retry_after
+)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    slept = []
+    monkeypatch.setattr(resilience.time, "sleep", slept.append)
+    return slept
+
+
+def test_retryable_errors():
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(503))
+    assert not is_retryable(StatusError(400))
+    assert is_retryable(ConnectionResetError())
+    assert not is_retryable(ValueError("bad prompt"))
+    assert not is_retryable(CircuitOpenError("open"))
+
+
+def test_retry_after_seconds_milliseconds_and_dates():
+    assert retry_after(StatusError(429, {"retry-after": "7"})) == 7.0
+    assert retry_after(StatusError(429, {"retry-after": "1.5"})) == 1.5
+    assert retry_after(StatusError(429, {"retry-after-ms": "250"})) == 0.25
+
+    date = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 < retry_after(StatusError(503, {"retry-after": date})) <= 30
+
+    assert retry_after(StatusError(429, {"retry-after": "soon"})) is None
+    assert retry_after(ConnectionError()) is None
+
+
+def test_retry_after_from_the_wrapped_http_error():
+    # ollama raises ResponseError while handling httpx's HTTPStatusError, which has the response
+    try:
+        try:
+            raise StatusError(429, {"retry-after": "3"})
+        except StatusError:
+            raise RuntimeError("too many requests")
+    except RuntimeError as e:
+        assert retry_after(e) == 3.0
+
+
+def test_transient_failures_are_retried_honouring_retry_after(no_sleep):
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise StatusError(429, {"retry-after": "2"})
+        return "ok"
+
+    assert call_with_retries(flaky, max_retries=3) == "ok"
+    assert len(attempts) == 3
+    assert all(delay >= 2 for delay in no_sleep)
+
+
+def test_permanent_failures_are_not_retried():
+    attempts = []
+
+    def bad_request():
+        attempts.append(1)
+        raise StatusError(400)
+
+    with pytest.raises(StatusError):
+        call_with_retries(bad_request, max_retries=3)
+    assert len(attempts) == 1
+
+
+def test_retry_is_skipped_when_it_would_miss_the_deadline():
+    attempts = []
+
+    def slow_down():
+        attempts.append(1)
+        raise StatusError(429, {"retry-after": "60"})
+
+    with pytest.raises(StatusError):
+        call_with_retries(slow_down, deadline=Deadline(5), max_retries=3)
+    assert len(attempts) == 1
+
+
+def test_breaker_opens_fails_fast_and_recovers():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+
+    def down():
+        raise ConnectionError("refused")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            call_with_retries(down, breaker=breaker, max_retries=0)
+    assert breaker.get_status()["state"] == "open"
+
+    with pytest.raises(CircuitOpenError):
+        call_with_retries(lambda: "ok", breaker=breaker, max_retries=3)
+
+    deadline = time.monotonic() + 1
+    while time.monotonic() - breaker.opened_at < breaker.reset_timeout:
+        assert time.monotonic() < deadline
+    assert call_with_retries(lambda: "ok", breaker=breaker) == "ok"
+    assert breaker.get_status() == {"state": "closed", "consecutive_failures": 0, "times_opened": 1}
+
+
+def test_half_open_admits_a_single_trial():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record_failure()
+    assert breaker.get_status()["state"] == "open"
+    assert breaker.get_status()["times_opened"] == 2
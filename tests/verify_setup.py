@@ -6,10 +6,29 @@ This script verifies that all components are properly installed and configured.
 
 import sys
 import os
+import json
 import subprocess
 import importlib
 from pathlib import Path
 
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Importing the application packages must stay cheap: heavy libraries load on first use
+IMPORT_BUDGET_SECONDS = 1.0
+HEAVY_MODULES = [
+    'torch', 'sentence_transformers', 'chromadb', 'pandas', 'cv2',
+    'pytesseract', 'fitz', 'pdfplumber', 'openai', 'ollama', 'pyarrow'
+]
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import src.core
+import src.utils
+from src.core import RAGSystem
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+"""
+
 def print_header(title):
     """Print a formatted header"""
     print(f"\n{'='*60}")
@@ -47,7 +66,6 @@ def check_dependencies():
         'PyPDF2',
         'pdfplumber',
         'fitz',  # PyMuPDF
-        'cv2',   # OpenCV
         'openai',
         'numpy',
         'sklearn',
@@ -66,9 +84,6 @@ def check_dependencies():
             if package == 'fitz':
                 import fitz
                 print_status("PyMuPDF (fitz)", True)
-            elif package == 'cv2':
-                import cv2
-                print_status("OpenCV (cv2)", True)
             elif package == 'PIL':
                 from PIL import Image
                 print_status("Pillow (PIL)", True)
@@ -81,6 +96,31 @@ def check_dependencies():
     
     return all_installed
 
+def check_import_time():
+    """Check that importing the application stays within the startup budget"""
+    print_header("Import Time Budget Check")
+    
+    try:
+        result = subprocess.run([sys.executable, '-c', IMPORT_PROBE % HEAVY_MODULES],
+                                capture_output=True, text=True, timeout=60, cwd=PROJECT_ROOT)
+        if result.returncode != 0:
+            print_status("Application import", False, result.stderr.strip().splitlines()[-1])
+            return False
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+    except (subprocess.TimeoutExpired, ValueError, IndexError) as e:
+        print_status("Application import", False, str(e))
+        return False
+    
+    within_budget = probe["seconds"] <= IMPORT_BUDGET_SECONDS
+    print_status(f"Import time: {probe['seconds']:.2f}s", within_budget,
+                 "" if within_budget else f"Budget: {IMPORT_BUDGET_SECONDS:.1f}s")
+    
+    no_heavy = not probe["loaded"]
+    print_status("Heavy dependencies deferred", no_heavy,
+                 "" if no_heavy else f"Imported eagerly: {', '.join(probe['loaded'])}")
+    
+    return within_budget and no_heavy
+
 def check_tesseract():
     """Check if Tesseract OCR is installed"""
     print_header("Tesseract OCR Check")
@@ -196,6 +236,7 @@ def main():
     checks = [
         ("Python Version", check_python_version),
         ("Dependencies", check_dependencies),
+        ("Import Time", check_import_time),
         ("Tesseract OCR", check_tesseract),
         ("Environment", check_environment),
         ("Directories", check_directories),
@@ -239,4 +280,7 @@ def main():
     print(f"🌐 For portfolio integration, see PORTFOLIO_INTEGRATION_GUIDE.md")
 
 if __name__ == "__main__":
+    # CI entry point: fail the build when startup imports regress
+    if "--import-budget" in sys.argv:
+        sys.exit(0 if check_import_time() else 1)
     main()